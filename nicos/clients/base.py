@@ -38,6 +38,7 @@ from nicos.protocols.daemon import ACTIVE_COMMANDS, DAEMON_EVENTS, \
 from nicos.protocols.daemon.classic import COMPATIBLE_PROTO_VERSIONS, \
     PROTO_VERSION
 from nicos.utils import createThread
+from nicos.utils.compression import blobCodecs, decompressBlob
 
 BUFSIZE = 8192
 
@@ -88,6 +89,8 @@ class NicosClient:
         self.viewonly = True
         self.user_level = None
         self.last_action_at = 0
+        # live data options in effect, as returned by the daemon
+        self.liveopts = None
 
         self.transport = ClientTransport()
 
@@ -95,13 +98,17 @@ class NicosClient:
         # must be overwritten
         raise NotImplementedError
 
-    def connect(self, conndata, eventmask=None):
+    def connect(self, conndata, eventmask=None, liveopts=None):
         """Connect to a NICOS daemon.
 
         *conndata* is a ConnectionData object.
 
         *eventmask* is a tuple of event names that should not be sent to this
         client.
+
+        *liveopts* is a dictionary of options for the transfer of live data,
+        see the ``liveopts`` daemon command.  If ``'compress'`` is true but
+        not a list, all codecs supported by this client are offered.
         """
         self.disconnecting = False
         if self.isconnected:
@@ -172,6 +179,12 @@ class NicosClient:
 
         if eventmask:
             self.tell('eventmask', eventmask)
+        if liveopts and not self.compat_proto:
+            liveopts = dict(liveopts)
+            if liveopts.get('compress') and \
+               not isinstance(liveopts['compress'], (list, tuple)):
+                liveopts['compress'] = blobCodecs()
+            self.liveopts = self.ask('liveopts', liveopts, noerror=True)
 
         try:
             self.transport.connect_events(conndata)
@@ -203,6 +216,11 @@ class NicosClient:
                 return
             try:
                 if DAEMON_EVENTS[event][1]:
+                    if event == 'livedata' and 'blobcodec' in data:
+                        data = dict(data)
+                        codec = data.pop('blobcodec')
+                        blobs = [decompressBlob(codec, blob)
+                                 for blob in blobs]
                     self.signal(event, data, blobs)
                 else:
                     self.signal(event, data)
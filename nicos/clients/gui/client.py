@@ -61,7 +61,9 @@ class NicosGuiClient(NicosClient, QObject):
         getattr(self, name).emit(*args)
 
     def connect(self, conndata, eventmask=None):
-        NicosClient.connect(self, conndata, self._event_mask)
+        # the daemon does not compress for clients on the same host
+        NicosClient.connect(self, conndata, self._event_mask,
+                            {'compress': True, 'dropframes': True})
 
     # key-notify registry
 
@@ -51,9 +51,14 @@ class config:
     setup_subdirs = []  # setup groups to be used, as a list
     pid_path = 'pid'
     logging_path = 'log'
+    setup_cache_path = ''  # e.g. 'setupcache' to cache setup info
     systemd_props = []  # additional systemd Service properties
 
+    device_creation_threads = 0  # > 1 to create devices in parallel
+    readout_threads = 0  # > 1 to read out scan environment in parallel
+    readout_timeout = 10.0  # timeout for parallel readout of one device
     sandbox_simulation = False
+    simulation_zygote = False
     sandbox_simulation_debug = False
     services = ['cache', 'poller']
     keystorepaths = ['/etc/nicos/keystore', '~/.config/nicos/keystore']
@@ -34,9 +34,9 @@ from nicos.core.errors import AccessError, CacheError, CacheLockError, \
     CommunicationError, ComputationError, ConfigurationError, HardwareError, \
     InvalidValueError, LimitError, ModeError, MoveError, NicosError, \
     NicosTimeoutError, PositionError, ProgrammingError, UsageError
-from nicos.core.mixins import AutoDevice, CanDisable, DeviceMixinBase, \
-    HasAutoDevices, HasCommunication, HasLimits, HasMapping, HasOffset, \
-    HasPrecision, HasTimeout, HasWindowTimeout, IsController
+from nicos.core.mixins import AutoDevice, CanDisable, CanReadBatch, \
+    DeviceMixinBase, HasAutoDevices, HasCommunication, HasLimits, HasMapping, \
+    HasOffset, HasPrecision, HasTimeout, HasWindowTimeout, IsController
 from nicos.core.params import INFO_CATEGORIES, ArrayDesc, Attach, Override, \
     Param, Value, absolute_path, anytype, dictof, dictwith, floatrange, host, \
     intrange, limits, listof, mailaddress, nicosdev, none_or, nonemptylistof, \
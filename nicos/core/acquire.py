@@ -30,7 +30,7 @@ from nicos import session
 from nicos.core.constants import FINAL, INTERRUPTED, SIMULATION
 from nicos.core.errors import NicosError
 from nicos.core.params import Value
-from nicos.core.utils import waitForCompletion
+from nicos.core.utils import multiRead, waitForCompletion
 from nicos.protocols.daemon import BREAK_NOW
 
 
@@ -73,7 +73,7 @@ def _wait_for_continuation(delay, only_pause=False):
     return True
 
 
-def acquire(point, preset, iscompletefunc=None):
+def acquire(point, preset, iscompletefunc=None, finishedfunc=None):
     """Low-level acquisition function.
 
     The loop delay is configurable in the instrument object, and defaults to
@@ -89,12 +89,19 @@ def acquire(point, preset, iscompletefunc=None):
     synchronisation, e.g. stopping of the detector when the movement of
     the scanned axis has been finished although the preset has not yet
     been fulfilled.
+
+    If *finishedfunc* is given, the final results are only read out when all
+    detectors have finished measuring, and *finishedfunc* is called just
+    before that.  This allows to start the next actions, e.g. moving to the
+    next scan point, while the results are read out.
     """
     if iscompletefunc is None:  # do not influence count loop using callback
         def iscompletefunc():
             return False
     # put detectors in a set and discard them when completed
     detset = set(point.detectors)
+    # finished detectors whose final results have not been read yet
+    deferred = []
     delay = (session.instrument and session.instrument.countloopdelay or 0.025
              if session.mode != SIMULATION else 0.0)
 
@@ -130,6 +137,11 @@ def acquire(point, preset, iscompletefunc=None):
                 if det.isCompleted():
                     det.finish()
                     quality = FINAL
+                    if finishedfunc is not None:
+                        deferred.append(det)
+                        detset.discard(det)
+                        quality = None
+                        continue
                 if quality:
                     try:
                         res = det.readResults(quality)
@@ -158,6 +170,16 @@ def acquire(point, preset, iscompletefunc=None):
                 for det in detset:
                     det.stop()
             session.delay(delay)
+        if deferred:
+            finishedfunc()
+            while deferred:
+                det = deferred.pop(0)
+                try:
+                    res = det.readResults(FINAL)
+                except Exception:
+                    det.log.exception('error reading measurement data')
+                    res = None
+                dataman.putResults(FINAL, {det.name: res})
     except BaseException as err:
         point.finished = currenttime()
         if err.__class__.__name__ != 'ControlStop':
@@ -174,6 +196,12 @@ def acquire(point, preset, iscompletefunc=None):
                 dataman.putResults(INTERRUPTED, {det.name: res})
             except Exception:
                 det.log.exception('error saving measurement data')
+        for det in deferred:
+            try:
+                res = det.readResults(FINAL)
+                dataman.putResults(FINAL, {det.name: res})
+            except Exception:
+                det.log.exception('error saving measurement data')
         raise err
     finally:
         point.finished = currenttime()
@@ -182,22 +210,33 @@ def acquire(point, preset, iscompletefunc=None):
 
 def read_environment(envlist):
     """Read out environment devices to get entries in the dataset."""
+    started = currenttime()
+    devices = []
+    for dev in envlist:
+        if isinstance(dev, DevStatistics):
+            # only read to get a fresh value into the statistics
+            if dev.dev:
+                devices.append(dev.dev)
+        else:
+            devices.append(dev)
+    results = iter(multiRead(devices))
     values = {}
     for dev in envlist:
         if isinstance(dev, DevStatistics):
-            try:
-                if dev.dev:
-                    dev.dev.read(0)
-            except NicosError:
-                pass
+            if dev.dev:
+                exc = next(results)[2]
+                if exc is not None and not isinstance(exc, NicosError):
+                    raise exc
             continue
-        try:
-            val = dev.read(0)
-        except Exception as err:
-            dev.log.warning('error reading for scan data', exc=err)
+        timestamp, val, exc = next(results)
+        if exc is not None:
+            dev.log.warning('error reading for scan data', exc=exc)
             val = [None] * len(dev.valueInfo())
-        values[dev.name] = (currenttime(), val)
-    session.experiment.data.putValues(values)
+        values[dev.name] = (timestamp, val)
+    dataman = session.experiment.data
+    if dataman._current:
+        dataman._current.timing['environment'] = currenttime() - started
+    dataman.putValues(values)
 
 
 def stop_acquire_thread():
@@ -115,6 +115,10 @@ class BaseDataset:
         # A user-defined "info string" for this dataset.
         self.info = ''
 
+        # Time spent on steps of taking this dataset, e.g. 'position' and
+        # 'environment' for reading out the devices, in seconds.
+        self.timing = {}
+
         # A lock to suppress updates to valuestats from the cacheCallback in
         # the datamanager
         self._statslock = Lock()
@@ -185,7 +189,7 @@ class BaseDataset:
     def dispatch(self, method, *args):
         """Dispatch calling 'method' to all sink handlers."""
         for handler in self.handlers:
-            getattr(handler, method)(*args)
+            handler.sink.callHandler(handler, method, args)
 
     def trimResult(self):
         """Trim objects that are not required to be kept after finish()."""
@@ -25,6 +25,7 @@
 
 import logging
 import os
+import threading
 from os import path
 from time import time as currenttime
 
@@ -53,6 +54,16 @@ class DataManager:
         # Last finished scans.  Stored for analysis purposes.
         self._last_scans = []
 
+        # Snapshot of device metainfo for updateMetainfo(), as a dictionary
+        # of lowercased devname -> (device, info).  It only contains devices
+        # whose info is derived from cached values.
+        self._metainfo = {}
+        # Lowercased names of devices with changed cache keys since the last
+        # updateMetainfo().
+        self._metainfo_dirty = set()
+        self._metainfo_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+
     @lazy_property
     def log(self):
         logger = session.getLogger('nicos-data')
@@ -208,6 +219,21 @@ class DataManager:
         if self._stack:
             self._stack[-1].dispatch('addSubset', dataset)
         dataset.trimResult()
+        if dataset.settype != POINT or not self._stack:
+            # make sure that asynchronous sinks have written everything
+            self.flushSinks()
+
+    def flushSinks(self):
+        """Wait for all asynchronous sinks to finish their pending work."""
+        first_err = None
+        for sink in session.datasinks:
+            try:
+                sink.flush()
+            except Exception as err:
+                if first_err is None:
+                    first_err = err
+        if first_err is not None:
+            raise first_err
 
     #
     # Filling datasets with data
@@ -257,24 +283,71 @@ class DataManager:
         self._current.results.update(results)
         self._current.dispatch('putResults', quality, results)
 
-    def updateMetainfo(self):
+    def updateMetainfo(self, refresh=False):
         """Utility function to gather metainfo from all relevant devices and
         write it to the current dataset with `putMetainfo`.
 
         Relevant devices are selected by the "metadata" entry in the
         visibility parameter.
+
+        The info of devices that is derived only from cached values is taken
+        from a snapshot, and only collected again if one of the device's
+        cache keys has changed since, or if *refresh* is true.
         """
-        devices = [dev for (_, dev) in
-                   sorted(session.devices.items(),
-                          key=lambda name_dev: name_dev[0].lower())]
+        started = currenttime()
+        with self._metainfo_lock:
+            dirty, self._metainfo_dirty = self._metainfo_dirty, set()
+        snapshot = {}
         newinfo = {}
-        for device in devices:
+        for devname, device in sorted(session.devices.items(),
+                                      key=lambda name_dev: name_dev[0].lower()):
             if 'metadata' not in device.visibility:
                 continue
-            for key, info in device.info():
-                newinfo[device.name, key] = info
+            lname = devname.lower()
+            entry = self._metainfo.get(lname)
+            if refresh or entry is None or entry[0] is not device or \
+               lname in dirty:
+                info = device.info()
+                if self._canSnapshotInfo(device) and \
+                   not self._infoHasErrors(info):
+                    snapshot[lname] = (device, info)
+            else:
+                info = entry[1]
+                snapshot[lname] = entry
+            for key, value in info:
+                newinfo[device.name, key] = value
+        self._metainfo = snapshot
+        if self._current:
+            self._current.timing['metainfo'] = currenttime() - started
         self.putMetainfo(newinfo)
 
+    def _canSnapshotInfo(self, device):
+        """Return true if the device info only depends on cached values,
+        which means that it is up to date as long as the cache keys of the
+        device do not change.
+        """
+        from nicos.core.device import Device, Measurable, Readable
+        if type(device).info not in (Device.info, Readable.info,
+                                     Measurable.info):
+            return False
+        if session.mode == SIMULATION or device._cache is None:
+            return False
+        if hasattr(device, 'doInfo'):
+            return False
+        return not any(device.parameters[name].volatile
+                       for (_, name, _) in device._infoparams)
+
+    def _infoHasErrors(self, info):
+        """Return true if reading the value or status failed while collecting
+        the device info; then the info must be collected again next time.
+        """
+        return any(str(pinfo[1]).startswith('Error: ') for (_, pinfo) in info)
+
+    def metainfoCallback(self, key):
+        """Called by the cache client for every updated key."""
+        with self._metainfo_lock:
+            self._metainfo_dirty.add(key.split('/', 1)[0])
+
     def cacheCallback(self, key, value, time):
         if (not self._current or self._current.settype != POINT
            or self._current.finished is not None):
@@ -306,9 +379,13 @@ class DataManager:
             raise ProgrammingError('assignCounter should not be called in '
                                    'simulation mode')
 
-        new_counters = self.incrementCounters(dataset.countertype)
-        for (attr, value) in new_counters:
-            setattr(dataset, attr, value)
+        # asynchronous sinks can call this from their worker threads
+        with self._counter_lock:
+            if dataset.counter != 0:
+                return
+            new_counters = self.incrementCounters(dataset.countertype)
+            for (attr, value) in new_counters:
+                setattr(dataset, attr, value)
 
         # push special counters into parameters for display
         if dataset.settype == SCAN:
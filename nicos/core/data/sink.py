@@ -23,6 +23,7 @@
 
 """Base classes for NICOS data sinks."""
 
+import queue
 from gzip import GzipFile as StdGzipFile
 from io import TextIOWrapper
 from os import path
@@ -31,10 +32,11 @@ from nicos import session
 from nicos.core.constants import POINT, SIMULATION
 from nicos.core.data.dataset import SETTYPES
 from nicos.core.device import Device
-from nicos.core.errors import ProgrammingError
-from nicos.core.params import INFO_CATEGORIES, Override, Param, listof, setof
+from nicos.core.errors import ConfigurationError, ProgrammingError
+from nicos.core.params import INFO_CATEGORIES, Override, Param, intrange, \
+    listof, setof
 from nicos.core.status import statuses
-from nicos.utils import File, enableDisableFileItem
+from nicos.utils import File, createThread, enableDisableFileItem
 
 
 class DataFileBase:
@@ -91,6 +93,11 @@ class DataSinkHandler:
     Conventional range: 1 - 100
     Default: 50"""
 
+    async_safe: bool = False
+    """Set to true in handlers that can be called on the worker thread of an
+    asynchronous sink (see `DataSink`).  Otherwise, the sink does not accept
+    the ``asynchronous`` parameter."""
+
     def __init__(self, sink, dataset, detector):
         """Prepare `DataSinkHandler` for writing this `dataset`."""
         self.log = sink.log
@@ -287,6 +294,16 @@ class DataSink(Device):
        simulation mode.  This should only be true for sinks that write no data,
        such as a "write scan data to the console" sink.
 
+    If the `asynchronous` parameter is set, all handler methods except
+    `~.DataSinkHandler.prepare` are called on a worker thread of the sink, in
+    the same order as they would have been called directly.  The data manager
+    waits for the pending calls at the end of every scan and block, and of
+    points that are not part of a scan.  Since the measurement continues in
+    the meantime, this is only suitable for sinks whose handlers use the
+    method arguments, and the dataset only as far as it is final when the
+    method is called (e.g. in ``end()``).  Handler classes declare this by
+    setting `~.DataSinkHandler.async_safe`.
+
     .. automethod:: isActive
     """
 
@@ -296,6 +313,13 @@ class DataSink(Device):
         'settypes':  Param('List of dataset types to activate this sink '
                            '(default is for all settypes the sink supports)',
                            type=setof(*SETTYPES)),
+        'asynchronous': Param('Call the handlers on a separate thread, so '
+                              'that writing data does not delay the '
+                              'measurement', type=bool, default=False),
+        'asyncqueue': Param('Maximum number of pending handler calls in '
+                            'asynchronous mode, before the measurement '
+                            'waits for the sink',
+                            type=intrange(1, 10000), default=100),
     }
 
     parameter_overrides = {
@@ -308,6 +332,60 @@ class DataSink(Device):
     # Set this to the corresponding Handler class.
     handlerclass = None
 
+    _async_queue = None
+    _async_error = None
+
+    def doUpdateAsynchronous(self, value):
+        if value and not getattr(self.handlerclass, 'async_safe', False):
+            raise ConfigurationError(self, 'the handlers of this sink cannot '
+                                     'be called asynchronously')
+
+    def doShutdown(self):
+        if self._async_queue is not None:
+            self._async_queue.put(None)
+            self._async_queue = None
+
+    def callHandler(self, handler, method, args):
+        """Call *method* of the sink *handler*, on the worker thread if the
+        sink is asynchronous.
+        """
+        if not self.asynchronous or method == 'prepare':
+            getattr(handler, method)(*args)
+            return
+        if self._async_queue is None:
+            self._async_queue = queue.Queue(self.asyncqueue)
+            createThread('sink %s' % self, self._asyncWorker,
+                         (self._async_queue,))
+        # blocks if the worker is too far behind
+        self._async_queue.put((handler, method, args))
+
+    def _asyncWorker(self, callqueue):
+        while True:
+            item = callqueue.get()
+            if item is None:
+                return
+            handler, method, args = item
+            try:
+                getattr(handler, method)(*args)
+            except Exception as err:
+                self.log.exception('error in %s() of sink handler', method)
+                if self._async_error is None:
+                    self._async_error = err
+            finally:
+                callqueue.task_done()
+
+    def flush(self):
+        """Wait until all pending asynchronous handler calls are done.
+
+        The first error raised by one of these calls since the last flush is
+        re-raised here.
+        """
+        if self._async_queue is not None:
+            self._async_queue.join()
+        err, self._async_error = self._async_error, None
+        if err is not None:
+            raise err
+
     def isActive(self, dataset):
         """Should return True if the sink can and should process this dataset.
 
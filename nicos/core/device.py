@@ -348,6 +348,12 @@ class Device(metaclass=DeviceMeta):
     # should have their actions simulated.
     hardware_access = True
 
+    # Set this to True on devices that may already be moved to the next point
+    # of a step scan while the results of the current point are read out, and
+    # on detectors whose results are not affected by such a move (see
+    # `Scan.canPipeline`).
+    pipeline_safe = False
+
     # This is set by NICOS to indicate that do-methods should be intercepted
     # and their result simulated.  Combines hardware_access and device mode
     # at runtime.
@@ -2600,6 +2606,10 @@ class DeviceAlias(Device):
         v.extend(Device.version(self))
         return v
 
+    @property
+    def pipeline_safe(self):
+        return getattr(self._obj, 'pipeline_safe', False)
+
     # these methods must not be proxied
 
     def __eq__(self, other):
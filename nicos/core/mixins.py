@@ -769,6 +769,88 @@ class HasCommunication(DeviceMixinBase):
         raise CommunicationError(self, str(err))
 
 
+class CanReadBatch(DeviceMixinBase):
+    """
+    Mixin class for controllers that can read the status and value of several
+    devices sharing their hardware connection in one go.
+
+    Devices of such a "poll group" get their hardware status and value from
+    :meth:`readBatch` in their ``doStatus`` and ``doRead`` methods.  If the
+    last batch result is too old, the status and value of all devices of the
+    group are read with one call of :meth:`doReadBatch`, and the values of
+    the other devices are put into the cache right away.  When these devices
+    are polled in the same poll cycle, their values are then found in the
+    cache, and their status is taken from the same batch result, so that
+    only one hardware round trip per cycle is needed for the whole group.
+
+    Devices join the group with :meth:`addBatchMember`, usually in their
+    ``doInit``, or at the latest with their first call of :meth:`readBatch`.
+    """
+
+    parameters = {
+        'batchwindow': Param('Time during which the result of a batch read '
+                             'is also used for requests of fresh values',
+                             unit='s', type=floatrange(0), default=0.1),
+    }
+
+    @lazy_property
+    def _batch_lock(self):
+        return threading.Lock()
+
+    @lazy_property
+    def _batch_members(self):
+        # maps member name -> device, in the order of joining
+        return {}
+
+    @lazy_property
+    def _batch_results(self):
+        # maps member name -> (time, status, value) of the last batch read
+        return {}
+
+    def addBatchMember(self, dev):
+        """Add a device to the group read by :meth:`doReadBatch`."""
+        with self._batch_lock:
+            self._batch_members.setdefault(dev.name, dev)
+
+    def readBatch(self, dev, maxage=0):
+        """Return the hardware status and value of the member *dev*.
+
+        A batch result is used if it is at most *maxage* seconds old, or
+        the *batchwindow*, whatever is longer.  Otherwise, all members are
+        read again.
+        """
+        with self._batch_lock:
+            self._batch_members.setdefault(dev.name, dev)
+            result = self._batch_results.get(dev.name)
+            if result is not None and currenttime() - result[0] <= \
+                    max(maxage or 0, self.batchwindow):
+                return result[1:]
+            members = list(self._batch_members.values())
+            results = self.doReadBatch(members)
+            now = currenttime()
+            for member in members:
+                if member.name not in results:
+                    continue
+                stvalue, value = results[member.name]
+                self._batch_results[member.name] = (now, stvalue, value)
+                if member is not dev and member._cache:
+                    member._cache.put(member, 'value', value, now,
+                                      member.maxage)
+            if dev.name not in self._batch_results:
+                raise CommunicationError(self, 'batch read did not return '
+                                         'a result for %s' % dev)
+            return self._batch_results[dev.name][1:]
+
+    def doReadBatch(self, devices):
+        """Read the hardware status and value of all given devices.
+
+        This method must be implemented and return a dictionary mapping the
+        names of the devices to their ``(status, value)`` tuples, as their
+        ``doStatus`` and ``doRead`` methods would return them.
+        """
+        raise NotImplementedError('Please implement the doReadBatch method')
+
+
 class CanDisable(DeviceMixinBase):
     """Mixin class for devices that can be disabled and enabled."""
 
@@ -37,8 +37,8 @@ from nicos.core.constants import FINAL, INTERMEDIATE, SIMULATION, SLAVE
 from nicos.core.errors import LimitError, ModeError, NicosError, UsageError
 from nicos.core.mixins import HasLimits
 from nicos.core.params import Value
-from nicos.core.utils import CONTINUE_EXCEPTIONS, SKIP_EXCEPTIONS, multiWait, \
-    waitForCompletion
+from nicos.core.utils import CONTINUE_EXCEPTIONS, SKIP_EXCEPTIONS, \
+    completion_notifier, multiRead, multiWait, waitForCompletion
 from nicos.protocols.daemon import BREAK_AFTER_LINE, BREAK_AFTER_STEP
 from nicos.utils import Repeater, number_types
 
@@ -129,6 +129,14 @@ class Scan:
             self._npoints = len(startpositions)  # can be zero if not known
         except TypeError:
             self._npoints = 0
+        # state of pipelined scans, see _inner_run
+        self._pipelined = False
+        self._nextpoint = None
+        self._premoved = None
+        # end of the last acquisitions, and dead times between them
+        self._acqfinished = None
+        self._lastacq = None
+        self._deadtimes = []
 
     def _guessPlotIndex(self, xindex):
         if xindex is not None:
@@ -271,7 +279,13 @@ class Scan:
         This is intended to be given to `DataManager.putValues` which expects
         ``{devname: (timestamp or None, value)}``.  Else ``None``.
         """
-        skip = None
+        waitdevs, skip = self._startDevices(devices, positions)
+        if not wait:
+            return None
+        return self._waitDevices(waitdevs, skip)
+
+    def _startDevices(self, devices, positions):
+        skip = False
         waitdevs = []
         for dev, val in zip(devices, positions):
             try:
@@ -285,8 +299,9 @@ class Scan:
                     skip = True
             else:
                 waitdevs.append(dev)
-        if not wait:
-            return None
+        return waitdevs, skip
+
+    def _waitDevices(self, waitdevs, skip):
         waitresults = {}
 
         try:
@@ -314,14 +329,21 @@ class Scan:
 
     def readPosition(self):
         actualpos = {}
-        try:
-            # remember the read values so that they can be used for the
-            # data point
-            for dev in self._devices:
-                actualpos[dev.name] = (None, dev.read(0))
-        except NicosError as err:
-            self.handleError('read', err)
-            # XXX(dataapi): at least read the remaining devs?
+        started = currenttime()
+        # remember the read values so that they can be used for the
+        # data point
+        for dev, (_, value, exc) in zip(self._devices,
+                                        multiRead(self._devices)):
+            if exc is not None:
+                if not isinstance(exc, NicosError):
+                    raise exc
+                self.handleError('read', exc)
+                # XXX(dataapi): at least read the remaining devs?
+                break
+            actualpos[dev.name] = (None, value)
+        dataman = session.experiment.data
+        if dataman._current:
+            dataman._current.timing['position'] = currenttime() - started
         return actualpos
 
     def shortDesc(self):
@@ -330,6 +352,25 @@ class Scan:
                                     self.dataset.counter)
         return 'Scan %s' % ','.join(map(str, self._devices))
 
+    def canPipeline(self):
+        """Return true if the scan may start moving to the next point as soon
+        as the detectors have finished counting, while the results of the
+        current point are read out and written.
+
+        This is only done if all scanned devices and all detectors declare it
+        safe with their ``pipeline_safe`` attribute, and the scan class does
+        not override `preparePoint` (which would then be called while the
+        current point is still being finished).  Note that a break after the
+        current point then takes effect after the move to the next point has
+        been started.
+        """
+        if session.mode == SIMULATION or self._endpositions or \
+           not self._devices:
+            return False
+        if type(self).preparePoint is not Scan.preparePoint:
+            return False
+        return all(dev.pipeline_safe for dev in self._devices + self._detlist)
+
     def run(self):
         if not self._subscan and (getattr(session, '_currentscan', None) or
                                   getattr(session, '_manualscan', None)):
@@ -340,11 +381,21 @@ class Scan:
         session._currentscan = self
         # XXX(dataapi): this is too early, dataset has no number yet
         session.beginActionScope(self.shortDesc())
+        saved = completion_notifier.saved
         try:
             self._inner_run()
         finally:
             session.endActionScope()
             session._currentscan = None
+            saved = completion_notifier.saved - saved
+            if saved >= 0.05 and not self._subscan:
+                session.log.info('waiting on completion events instead of '
+                                 'polling saved %.1f s', saved)
+            if self._deadtimes and not self._subscan:
+                session.log.info('dead time between points: %.2f s on '
+                                 'average%s', sum(self._deadtimes) /
+                                 len(self._deadtimes),
+                                 ' (pipelined)' if self._pipelined else '')
         return self.dataset
 
     def readEnvironment(self):
@@ -360,7 +411,45 @@ class Scan:
 
     def acquire(self, point, preset):
         preset.pop('live', None)
-        acquire(point, preset, iscompletefunc=self.acquireCompleted)
+        # only defer the readout when there is something to do meanwhile
+        finishedfunc = self._acquisitionFinished if self._pipelined else None
+        acquire(point, preset, iscompletefunc=self.acquireCompleted,
+                finishedfunc=finishedfunc)
+
+    def _acquisitionFinished(self):
+        # called by acquire() when all detectors have finished counting, but
+        # before their results are read out
+        self._acqfinished = currenttime()
+        if self._nextpoint is None:
+            return
+        num, position = self._nextpoint
+        self._nextpoint = None
+        # the scanned devices stayed at their positions until now, but the
+        # values while moving on must not go into the current point
+        dataman = session.experiment.data
+        point = dataman._current
+        dataman.putValues({dev.name: (self._acqfinished,
+                                      point.canonical_values[dev.name])
+                           for dev in self._devices
+                           if dev.name in point.canonical_values})
+        point.finished = self._acqfinished
+        try:
+            self.preparePoint(num, position)
+            self._premoved = self._startDevices(self._devices, position) + \
+                (None,)
+        except BaseException as err:
+            # raised again when the next point is processed
+            self._premoved = ([], False, err)
+
+    def _recordDeadtime(self, point):
+        # the dead time of a point is the time between the end of the previous
+        # acquisition and the start of this one
+        if self._lastacq is not None and point.started >= self._lastacq:
+            deadtime = point.started - self._lastacq
+            point.timing['deadtime'] = deadtime
+            self._deadtimes.append(deadtime)
+        self._lastacq = self._acqfinished or point.finished
+        self._acqfinished = None
 
     def _inner_run(self):
         dataman = session.experiment.data
@@ -375,15 +464,28 @@ class Scan:
                 skip_first_point = True
         # if the scan was already aborted, we haven't started writing
         self.beginScan()
+        # if possible, start moving to the next point while the results of the
+        # current point are read out and written
+        self._pipelined = self.canPipeline()
+        if self._pipelined:
+            session.log.debug('pipelining scan points')
         try:
             for i, position in enumerate(self._startpositions):
                 with self.pointScope(i + 1):
                     try:
-                        self.preparePoint(i + 1, position)
-                        if i == 0 and skip_first_point:
-                            continue
-                        waitresults = self.moveDevices(self._devices, position,
-                                                       wait=True)
+                        if self._premoved:
+                            # preparePoint and start were done already
+                            waitdevs, skip, err = self._premoved
+                            self._premoved = None
+                            if err is not None:
+                                raise err
+                            waitresults = self._waitDevices(waitdevs, skip)
+                        else:
+                            self.preparePoint(i + 1, position)
+                            if i == 0 and skip_first_point:
+                                continue
+                            waitresults = self.moveDevices(self._devices,
+                                                           position, wait=True)
                         # start moving to end positions
                         if self._endpositions:
                             self.moveDevices(self._devices,
@@ -404,9 +506,15 @@ class Scan:
                                                    preset=self._preset)
                         dataman.putValues(waitresults)
                         self.readEnvironment()
+                        if self._pipelined and \
+                           i + 1 < len(self._startpositions):
+                            self._nextpoint = (i + 2,
+                                               self._startpositions[i + 1])
                         try:
                             self.acquire(point, self._preset)
                         finally:
+                            self._nextpoint = None
+                            self._recordDeadtime(point)
                             dataman.finishPoint()
                     except NicosError as err:
                         self.handleError('count', err)
@@ -417,6 +525,8 @@ class Scan:
         except StopScan:
             pass
         finally:
+            if self._deadtimes:
+                self.dataset.timing['deadtime'] = sum(self._deadtimes)
             self.endScan()
 
 
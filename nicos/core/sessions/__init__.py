@@ -36,6 +36,7 @@ import logging
 import os
 import stat
 import sys
+import threading
 from os import path
 from shutil import which
 from time import sleep, time as currenttime
@@ -49,7 +50,8 @@ from nicos.core.data import DataSink
 from nicos.core.device import Device, DeviceAlias, DeviceMeta
 from nicos.core.errors import AccessError, CacheError, ConfigurationError, \
     ModeError, NicosError, ProgrammingError, UsageError
-from nicos.core.sessions.setups import readSetups
+from nicos.core.sessions.setups import readSetups, setupCacheFile, \
+    setupFileStamps
 from nicos.core.sessions.utils import EXECUTIONMODES, MAINTENANCE, MASTER, \
     SIMULATION, SLAVE, AttributeRaiser, NicosNamespace, SimClock, \
     guessCorrectCommand, makeSessionId, sessionInfo
@@ -59,8 +61,8 @@ from nicos.devices.cacheclient import CacheClient, CacheLockError, \
 from nicos.devices.instrument import Instrument
 from nicos.devices.notifiers import Notifier
 from nicos.protocols.cache import FLAG_NO_STORE
-from nicos.utils import fixupScript, formatArgs, formatDocstring, \
-    formatScriptError
+from nicos.utils import createThread, fixupScript, formatArgs, \
+    formatDocstring, formatScriptError
 from nicos.utils.loggers import ColoredConsoleHandler, NicosLogfileHandler, \
     NicosLogger, get_facility_log_handlers, initLoggers
 
@@ -131,6 +133,11 @@ class Session:
         self._failed_devices = None
         self._success_devices = None
         self._multi_level = 0
+        # parallel device creation: idents of the worker threads, and
+        # devname -> (thread ident, event) for devices being created
+        self._create_workers = set()
+        self._creating = {}
+        self._creating_lock = threading.Lock()
         # info about all loadable setups
         self._setup_info = {}
         # namespace to place user-accessible items in
@@ -155,6 +162,8 @@ class Session:
         self._script_text = ''
         # will be filled with the path to the sandbox helper if necessary
         self._sandbox_helper = None
+        # zygote process for forking dry runs
+        self._sim_zygote = None
 
         # cache connection
         self.cache = None
@@ -442,9 +451,15 @@ class Session:
         """Read information of all existing setups, and validate them.
 
         Setup modules are looked for in subdirectories of the configured
-        "setup_package".
+        "setup_package".  If enabled in the configuration, unchanged setups
+        are taken from the persistent setup cache.
         """
-        return readSetups(self._setup_paths, self.log)
+        cachefile = None
+        if config.setup_cache_path:
+            cachefile = setupCacheFile(
+                path.join(config.nicos_root, config.setup_cache_path),
+                self._setup_paths)
+        return readSetups(self._setup_paths, self.log, cachefile)
 
     def getSetupInfo(self):
         """Return information about all existing setups.
@@ -700,20 +715,7 @@ class Session:
         if autocreate_devices is None:
             autocreate_devices = self.autocreate_devices
         if autocreate_devices:
-            self.log.debug('autocreating devices...')
-            for devname, (_, devconfig) in sorted(devlist.items()):
-                try:
-                    explicit = 'namespace' in devconfig.get('visibility',
-                                                            set())
-                    dev = self.createDevice(devname, explicit=explicit)
-                    if not explicit and ('namespace' in dev.visibility):
-                        self.explicit_devices.add(devname)
-                        self.export(devname, dev)
-                except Exception:
-                    if raise_failed:
-                        raise
-                    self.log.exception("device '%s' failed to create", devname)
-                    failed_devs.append(devname)
+            failed_devs.extend(self._autocreateDevices(devlist, raise_failed))
 
         # validate and try to attach sysconfig devices
         self.log.debug('creating sysconfig devices...')
@@ -849,6 +851,9 @@ class Session:
             except CacheError:
                 self.log.warning('could not release master lock', exc=1)
         self.unloadSetup()
+        if self._sim_zygote:
+            self._sim_zygote.shutdown()
+            self._sim_zygote = None
 
     def export(self, name, obj):
         """Export an object *obj* into the NICOS namespace with given *name*.
@@ -1065,6 +1070,8 @@ class Session:
         If *dev* does not exists in the setup, a ConfigurationError is raised.
         """
         if isinstance(dev, str):
+            if self._creating:
+                self._waitForCreation(dev)
             if dev in self.devices:
                 dev = self.devices[dev]
             elif dev in self.dynamic_devices:
@@ -1153,6 +1160,18 @@ class Session:
                 return self.devices[devname]
             self.destroyDevice(devname)
 
+        entry = None
+        if self._create_workers:
+            with self._creating_lock:
+                other = self._creating.get(devname)
+                if other is None:
+                    entry = self._creating[devname] = (threading.get_ident(),
+                                                       threading.Event())
+            if other and other[0] != threading.get_ident():
+                # created by another thread: wait for the result
+                other[1].wait()
+                return self.createDevice(devname, explicit=explicit)
+
         try:
             devcls, devconfig = self.importDevice(devname, replace_classes)
             if 'description' in devconfig:
@@ -1170,6 +1189,11 @@ class Session:
                 self.deviceCallback('failed', {devname: str(err)})
             self.device_failures[devname] = str(err)
             raise
+        finally:
+            if entry:
+                with self._creating_lock:
+                    del self._creating[devname]
+                entry[1].set()
         self.device_failures.pop(devname, None)
         if self._success_devices is not None:
             self._success_devices.append(devname)
@@ -1180,6 +1204,125 @@ class Session:
             self.export(devname, dev)
         return dev
 
+    def _autocreateDevices(self, devlist, raise_failed):
+        """Create the devices of the loaded setups, in parallel if configured.
+
+        Return the names of the devices that failed to create.
+        """
+        self.log.debug('autocreating devices...')
+        failed_devs = []
+        nthreads = config.device_creation_threads
+        parallel = nthreads > 1 and self._mode != SIMULATION and \
+            len(devlist) > 1
+        if parallel:
+            # keep failed devices from being tried again below
+            self.startMultiCreate()
+        try:
+            if parallel:
+                self._createDevicesParallel(sorted(devlist), nthreads)
+            for devname, (_, devconfig) in sorted(devlist.items()):
+                try:
+                    explicit = 'namespace' in devconfig.get('visibility',
+                                                            set())
+                    dev = self.createDevice(devname, explicit=explicit)
+                    if not explicit and ('namespace' in dev.visibility):
+                        self.explicit_devices.add(devname)
+                        self.export(devname, dev)
+                except Exception:
+                    if raise_failed:
+                        raise
+                    self.log.exception("device '%s' failed to create",
+                                       devname)
+                    failed_devs.append(devname)
+        finally:
+            if parallel:
+                self.endMultiCreate()
+        return failed_devs
+
+    def _createDevicesParallel(self, devnames, nthreads):
+        """Create the given devices on a pool of *nthreads* threads.
+
+        A device is only created once all its attached devices have been
+        created, so that independent subtrees of the attached device graph
+        are created concurrently.  Errors are recorded like for `createDevice`
+        and must be reported by the caller, which should be within
+        `startMultiCreate`.
+        """
+        # build the graph of attached devices that still need to be created
+        waiting = {}
+        users = {}
+        todo = list(devnames)
+        while todo:
+            devname = todo.pop()
+            if devname in waiting or devname in self.devices:
+                continue
+            waiting[devname] = set()
+            users.setdefault(devname, set())
+            try:
+                devcls, devconfig = self.importDevice(devname)
+            except Exception:
+                # will fail again, and be reported, when creating it
+                continue
+            devconfig = {k.lower(): v for (k, v) in devconfig.items()}
+            for aname in devcls.attached_devices:
+                value = devconfig.get(aname.lower())
+                if not isinstance(value, (list, tuple)):
+                    value = [value]
+                for adevname in value:
+                    if isinstance(adevname, str) and adevname != devname and \
+                       adevname in self.configured_devices and \
+                       adevname not in self.devices:
+                        waiting[devname].add(adevname)
+                        users.setdefault(adevname, set()).add(devname)
+                        todo.append(adevname)
+        ready = sorted((name for (name, deps) in waiting.items() if not deps),
+                       reverse=True)
+        cond = threading.Condition()
+        running = [0]
+
+        def worker():
+            self._create_workers.add(threading.get_ident())
+            while True:
+                with cond:
+                    while not ready and running[0]:
+                        cond.wait()
+                    if not ready:
+                        # done, or only devices with cyclic dependencies left
+                        cond.notify_all()
+                        return
+                    devname = ready.pop()
+                    running[0] += 1
+                try:
+                    self.createDevice(devname)
+                except Exception:
+                    pass
+                with cond:
+                    running[0] -= 1
+                    for user in users[devname]:
+                        waiting[user].discard(devname)
+                        if not waiting[user]:
+                            ready.append(user)
+                    cond.notify_all()
+
+        nthreads = min(nthreads, len(waiting))
+        self.log.debug('creating %d devices on %d threads',
+                       len(waiting), nthreads)
+        threads = [createThread('device creation %d' % i, worker, start=False)
+                   for i in range(nthreads)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            self._create_workers.clear()
+
+    def _waitForCreation(self, devname):
+        """Wait until another thread has finished creating the device."""
+        entry = self._creating.get(devname)
+        if entry and entry[0] != threading.get_ident():
+            entry[1].wait()
+
     def kickDevicePoller(self, devname):
         """Send a message to the poller to try creating or polling the given
         device immediately, instead of waiting for a backoff to cool down after
@@ -1534,15 +1677,43 @@ class Session:
                   setup in self.explicit_setups or
                   self._setup_info[setup]['extended'].get('dynamic_loaded')]
         user = self.getExecutingUser()
+        zygote = db = None
+        if config.simulation_zygote and not self._sandbox_helper and \
+           self.cache:
+            zygote, db = self._getSimulationZygote()
         supervisor = SimulationSupervisor(self._sandbox_helper, uuid, code,
                                           setups, user, emitter, quiet=quiet,
-                                          cache=self.current_sysconfig.get('cache'))
+                                          cache=self.current_sysconfig.get('cache'),
+                                          zygote=zygote, db=db)
         supervisor.start()
         if wait:
             supervisor.join()
             return supervisor.results
         return supervisor
 
+    def _getSimulationZygote(self):
+        """Return the zygote for dry runs, and the current cache values.
+
+        A new zygote is started if there is none yet, or if the setups have
+        changed.  Until it is ready, dry runs are started as new processes.
+        If the zygote failed to start, it is not retried until the setups
+        change, and the zygote returned is None.
+        """
+        from nicos.core.sessions.simulation import SimulationZygote
+        db = self.cache.get_values()
+        stamps = setupFileStamps(self._setup_info)
+        zygote = self._sim_zygote
+        if zygote is not None and zygote.matches(db, stamps) and \
+           zygote.failed():
+            return None, db
+        if zygote is None or not zygote.usable(db, stamps):
+            if zygote:
+                zygote.shutdown()
+            zygote = self._sim_zygote = SimulationZygote(
+                self.current_sysconfig['cache'], db,
+                config.sandbox_simulation_debug, stamps)
+        return zygote, db
+
     # -- Session-specific behavior --------------------------------------------
 
     def updateLiveData(self, parameters, databuffers, labelbuffers=None):
@@ -1607,10 +1778,16 @@ class Session:
         """
         raise ProgrammingError('this session does not implement user input')
 
-    def delay(self, secs):
-        """Sleep for a short time, allow immediate stop before and after."""
+    def delay(self, secs, event=None):
+        """Sleep for a short time, allow immediate stop before and after.
+
+        If *event* is given, return early when it is set.
+        """
         self.breakpoint(5)
-        sleep(secs)
+        if event is None:
+            sleep(secs)
+        else:
+            event.wait(secs)
         self.breakpoint(5)
 
     def checkAccess(self, required):
@@ -23,6 +23,13 @@
 
 """Setup file handling."""
 
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from os import path
+
 from nicos.core.params import nicosdev_re
 from nicos.utils import Device, Secret
 from nicos.utils.files import iterSetups
@@ -125,12 +132,145 @@ class SetupBlock(MonitorElement):
         return 'SetupBlock<%s:%s>' % (self._setupname, self._blockname)
 
 
-def readSetups(paths, logger):
-    """Read all setups on the given paths."""
+class SetupInfoCache:
+    """Persistent cache for the info read from setup files.
+
+    Entries are keyed on the setup file name and are valid as long as the
+    modification time and size of the setup file and of all files consulted
+    via ``configdata()`` are unchanged.  Setups with errors are not cached,
+    so that the errors are reported every time.
+
+    Other dependencies of a setup, such as environment variables or imported
+    modules, are not tracked, so the cache must not be used for such setups.
+    """
+
+    version = 1
+
+    def __init__(self, filename, logger):
+        self.filename = filename
+        self.log = logger
+        self.hits = self.misses = 0
+        self._entries = {}
+        self._changed = False
+        try:
+            with open(filename, 'rb') as fp:
+                data = pickle.load(fp)
+            if data['version'] == (self.version, sys.version_info[:2]):
+                self._entries = data['entries']
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            logger.warning('could not read setup cache %s: %s', filename, err)
+
+    @staticmethod
+    def _stamp(filepath):
+        st = os.stat(filepath)
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, filepath, all_setups):
+        """Return a fresh copy of the cached info for the setup file, or None
+        if the entry is missing or outdated.
+        """
+        entry = self._entries.get(filepath)
+        if entry is not None:
+            stamps, data = entry
+            try:
+                for (depfile, stamp) in stamps:
+                    if depfile != filepath:
+                        # configdata() must still find the same file
+                        depname = path.splitext(path.basename(depfile))[0]
+                        if all_setups.get(depname) != depfile:
+                            break
+                    if self._stamp(depfile) != stamp:
+                        break
+                else:
+                    info = pickle.loads(data)
+                    self.hits += 1
+                    return info
+            except Exception:
+                pass
+            del self._entries[filepath]
+            self._changed = True
+        self.misses += 1
+        return None
+
+    def put(self, filepath, info):
+        """Store the info for a successfully read setup file."""
+        try:
+            stamps = [(fn, self._stamp(fn)) for fn in info['_filenames_']]
+            self._entries[filepath] = (stamps, pickle.dumps(info, -1))
+        except Exception as err:
+            self.log.debug('not caching setup %s: %s', filepath, err)
+            self._entries.pop(filepath, None)
+        self._changed = True
+
+    def save(self, filepaths):
+        """Write the cache to disk if it changed, keeping only entries for
+        the given setup files.
+        """
+        for filepath in set(self._entries) - set(filepaths):
+            del self._entries[filepath]
+            self._changed = True
+        if not self._changed:
+            return
+        data = {'version': (self.version, sys.version_info[:2]),
+                'entries': self._entries}
+        dirname = path.dirname(self.filename)
+        try:
+            os.makedirs(dirname, exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.setupcache')
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    pickle.dump(data, fp, -1)
+                # atomic replace, in case several services start at once
+                os.replace(tmpname, self.filename)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+        except OSError as err:
+            self.log.debug('could not write setup cache %s: %s',
+                           self.filename, err)
+        self._changed = False
+
+
+def setupFileStamps(setup_info):
+    """Return the stamps of all files that the given setups were read from,
+    to detect changes of the setups on disk.
+    """
+    stamps = {}
+    for info in setup_info.values():
+        if info is None:
+            continue
+        for filepath in info['_filenames_']:
+            if filepath not in stamps:
+                try:
+                    stamps[filepath] = SetupInfoCache._stamp(filepath)
+                except OSError:
+                    stamps[filepath] = None
+    return stamps
+
+
+def setupCacheFile(cachedir, paths):
+    """Return the name of the setup cache file for the given setup paths."""
+    key = hashlib.sha1('\0'.join(map(str, paths)).encode()).hexdigest()
+    return path.join(cachedir, 'setupinfo-%s.pickle' % key[:16])
+
+
+def readSetups(paths, logger, cachefile=None):
+    """Read all setups on the given paths.
+
+    If *cachefile* is given, unchanged setups are taken from the
+    `SetupInfoCache` stored there instead of executing them again.
+    """
     infodict = {}
     all_setups = dict(iterSetups(paths))
+    cache = SetupInfoCache(cachefile, logger) if cachefile else None
     for (setupname, filename) in all_setups.items():
-        readSetup(infodict, setupname, filename, all_setups, logger)
+        readSetup(infodict, setupname, filename, all_setups, logger, cache)
+    if cache:
+        cache.save(all_setups.values())
+        logger.debug('setup cache: %d setups cached, %d read',
+                     cache.hits, cache.misses)
     # check if all includes exist
     for name, info in infodict.items():
         if info is None:
@@ -232,7 +372,12 @@ def fixup_stacked_devices(logger, devdict):
     return devdict
 
 
-def readSetup(infodict, modname, filepath, all_setups, logger):
+def readSetup(infodict, modname, filepath, all_setups, logger, cache=None):
+    if cache and modname not in infodict:
+        info = cache.get(filepath, all_setups)
+        if info is not None:
+            infodict[modname] = info
+            return
     try:
         with open(filepath, 'rb') as modfile:
             code = modfile.read()
@@ -303,4 +448,6 @@ def readSetup(infodict, modname, filepath, all_setups, logger):
         logger.debug('%r setup partially merged with version '
                      'from parent directory', modname)
     else:
+        if cache:
+            cache.put(filepath, info)
         infodict[modname] = info
@@ -26,12 +26,13 @@
 import logging
 import os
 import pickle
+import signal
 import subprocess
 import sys
 import tempfile
 from os import path
-from threading import Thread
-from time import sleep
+from threading import Lock, Thread
+from time import monotonic, sleep
 
 import zmq
 
@@ -55,6 +56,13 @@ SIM_END_RES = 0x03
 # a "result" (simulation defined) to emit
 SIM_RESULT = 0x04
 
+# zygote is ready to fork dry runs
+ZYGOTE_READY = 0x10
+# zygote has forked a dry run, with the process id
+ZYGOTE_STARTED = 0x11
+# zygote could not be initialized
+ZYGOTE_FAILED = 0x12
+
 
 def serialize(data):
     return pickle.dumps(data, 2)
@@ -77,6 +85,19 @@ class SimLogSender(logging.Handler):
         self.simuuid = uuid
         self.devices = []
         self.aliases = []
+        # messages emitted by a zygote, before there is a socket to send to
+        self.pending = []
+
+    def connect(self, socket, uuid, quiet):
+        """Start sending to the given socket, in a forked dry run."""
+        self.socket = socket
+        self.simuuid = uuid
+        self.quiet = quiet
+        if not quiet:
+            for msg in self.pending:
+                msg[-1] = uuid
+                socket.send(serialize((SIM_MESSAGE, msg)))
+        self.pending = []
 
     def begin_exec(self):
         from nicos.core import Readable
@@ -96,7 +117,9 @@ class SimLogSender(logging.Handler):
     def emit(self, record):
         if record.levelno == ACTION:
             return
-        if not self.quiet:
+        if self.socket is None:
+            self.pending.append(recordToMessage(record, self.simuuid))
+        elif not self.quiet:
             msg = recordToMessage(record, self.simuuid)
             self.socket.send(serialize((SIM_MESSAGE, msg)))
 
@@ -211,6 +234,10 @@ class SimulationSession(Session):
             session.shutdown()
             return 1
 
+        return cls._execute(code)
+
+    @classmethod
+    def _execute(cls, code):
         # Set up log handlers to output everything.
         session.log_sender.begin_exec()
         # Execute the script code.
@@ -236,6 +263,87 @@ class SimulationSession(Session):
         # Shut down.
         session.shutdown()
 
+    @classmethod
+    def runZygote(cls, sock, debug=False):
+        """Run a zygote: a process with the setups loaded and the devices
+        synchronized, that forks a new process for each dry run.
+
+        The supervisor sends the cache address and all cache values first,
+        and then a request for each dry run, with only the cache values that
+        changed since then.
+        """
+        session.__class__ = cls
+        session._is_sandboxed = False
+        session._debug_log = debug
+
+        socket = nicos_zmq_ctx.socket(zmq.DEALER)
+        socket.connect(sock)
+        cache, db = unserialize(socket.recv())
+
+        # keep log messages until a dry run can send them
+        session.log_sender = SimLogSender(None, session, '')
+        session._user = User('zygote', 0)
+
+        try:
+            # pylint: disable=unnecessary-dunder-call
+            session.__init__(SIMULATION)
+            session.begin_setup()
+            sys.stdout = LoggingStdout()
+            session._mode = SIMULATION
+            session.current_sysconfig['cache'] = cache
+            session.simulationSync(db)
+            session.experiment.errorbehavior = 'abort'
+        except BaseException as err:
+            print('Fatal error while initializing:', err, file=sys.stderr)
+            socket.send(serialize((ZYGOTE_FAILED, str(err))))
+            return 1
+        socket.send(serialize((ZYGOTE_READY, None)))
+
+        parent = os.getppid()
+        while os.getppid() == parent:
+            # reap finished dry runs
+            try:
+                while os.waitpid(-1, os.WNOHANG)[0]:
+                    pass
+            except ChildProcessError:
+                pass
+            if not socket.poll(100):
+                continue
+            request = unserialize(socket.recv())
+            if request is None:
+                break
+            pid = os.fork()
+            if pid == 0:
+                os._exit(cls._runForked(*request))
+            socket.send(serialize((ZYGOTE_STARTED, pid)))
+        return 0
+
+    @classmethod
+    def _runForked(cls, sock, uuid, user, code, quiet, delta):
+        # the zmq context of the zygote must not be used after forking
+        ctx = zmq.Context()
+        socket = ctx.socket(zmq.DEALER)
+        socket.connect(sock)
+        if hasattr(signal, 'alarm'):
+            signal.alarm(600)
+        session.log_sender.connect(socket, uuid, quiet)
+        username, level = user.rsplit(',', 1)
+        session._user = User(username, int(level))
+        try:
+            try:
+                session._simulationSync_applyValues(delta)
+            except BaseException:
+                session.log.exception('Exception in dry run setup')
+                session.log_sender.finish()
+                session.shutdown()
+                return 1
+            return cls._execute(code) or 0
+        except BaseException:
+            return 1
+        finally:
+            socket.close(linger=5000)
+            ctx.term()
+
     def _initLogging(self, prefix=None, console=True):
         Session._initLogging(self, prefix, console=False,
                              logfile=not self._is_sandboxed)
@@ -246,7 +354,7 @@ class SimulationSession(Session):
     def getExecutingUser(self):
         return self._user
 
-    def delay(self, _secs):
+    def delay(self, _secs, event=None):
         # TODO: this sleep shouldn't be necessary
         sleep(0.0001)
 
@@ -259,14 +367,148 @@ class SimulationSession(Session):
         raise NicosError('cannot dry-run userinput() without a default value')
 
 
+class ForkedSimulation:
+    """Stands in for the `subprocess.Popen` object of a dry run that was
+    forked by the zygote.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                # the zygote reaps the process when it has finished
+                os.kill(self.pid, 0)
+            except ProcessLookupError:
+                self.returncode = 0
+            except OSError:
+                pass
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and monotonic() > deadline:
+                raise subprocess.TimeoutExpired('dry run', timeout)
+            sleep(0.05)
+        return self.returncode
+
+
+class SimulationZygote:
+    """A warm simulation process for starting dry runs quickly.
+
+    The zygote loads the current setups and synchronizes all cache values
+    once.  Afterwards, each dry run is forked from it and only gets the
+    cache values that changed in the meantime.
+
+    If the master setups or the setup files (given by their *stamps*)
+    change, the zygote must be replaced by a new one.
+    """
+
+    def __init__(self, cache, db, debug=False, stamps=None):
+        self._lock = Lock()
+        self._ready = False
+        self._failed = False
+        self._base = db
+        self._setups = db.get('session/mastersetupexplicit')
+        self._stamps = stamps
+        self._socket = nicos_zmq_ctx.socket(zmq.DEALER)
+        port = self._socket.bind_to_random_port('tcp://127.0.0.1')
+        scriptname = path.join(config.nicos_root, 'bin', 'nicos-simulate')
+        options = ['--zygote'] + (['--debug'] if debug else [])
+        self._proc = createSubprocess([sys.executable, scriptname] + options +
+                                      ['tcp://127.0.0.1:%s' % port],
+                                      stdin=subprocess.DEVNULL)
+        self._socket.send(serialize((cache, db)))
+
+    def matches(self, db, stamps=None):
+        """Return true if the zygote was started with the setups given by the
+        cache values and setup file stamps.
+        """
+        return db.get('session/mastersetupexplicit') == self._setups and \
+            stamps == self._stamps
+
+    def usable(self, db, stamps=None):
+        """Return true if dry runs for the given cache values can be forked
+        from this zygote, now or once it is ready.
+        """
+        return self._proc.poll() is None and self.matches(db, stamps)
+
+    def ready(self):
+        """Return true if the zygote is ready to fork dry runs."""
+        with self._lock:
+            return self._isReady()
+
+    def failed(self):
+        """Return true if the zygote could not be initialized."""
+        with self._lock:
+            self._isReady()
+            return self._failed
+
+    def _isReady(self):
+        if not self._ready and not self._failed and self._socket.poll(0):
+            msgtype, msg = unserialize(self._socket.recv())
+            if msgtype == ZYGOTE_READY:
+                self._ready = True
+            else:
+                session.log.warning('could not start dry run zygote: %s', msg)
+                self._failed = True
+        if self._proc.poll() is not None:
+            if not self._ready:
+                self._failed = True
+            return False
+        return self._ready
+
+    def spawn(self, sock, uuid, user, code, quiet, db):
+        """Fork a dry run that connects to *sock*.
+
+        Returns a `ForkedSimulation`, or None if the zygote is not (yet)
+        ready; then a new simulation process must be started instead.
+        """
+        delta = {}
+        for key, value in db.items():
+            old = self._base.get(key, Ellipsis)
+            try:
+                if old is value or old == value:
+                    continue
+            except Exception:
+                pass
+            delta[key] = value
+        with self._lock:
+            if not self._isReady():
+                return None
+            self._socket.send(serialize((sock, uuid, user, code, quiet,
+                                         delta)))
+            if not self._socket.poll(5000):
+                return None
+            _, pid = unserialize(self._socket.recv())
+        return ForkedSimulation(pid)
+
+    def shutdown(self):
+        with self._lock:
+            if self._proc.poll() is None:
+                try:
+                    self._socket.send(serialize(None), zmq.NOBLOCK)
+                    self._proc.wait(2)
+                except Exception:
+                    self._proc.kill()
+            self._socket.close(linger=0)
+
+
 class SimulationSupervisor(Thread):
     """Thread for starting a simulation process, receiving messages from a zmq
     socket and displaying/sending them to the client.
     """
 
     def __init__(self, sandbox, uuid, code, setups, user, emitter,
-                 more_args=None, quiet=False, cache=None):
+                 more_args=None, quiet=False, cache=None, zygote=None,
+                 db=None):
         self.results = []
+        # if given, try to fork the dry run from the zygote first
+        self._zygote = zygote
+        self._db = db
         Thread.__init__(self, target=self._run,
                         name='SimulationSupervisor',
                         args=(sandbox, uuid, code, setups, user, emitter,
@@ -302,13 +544,21 @@ class SimulationSupervisor(Thread):
         if cache:
             options.append(f'--cache={cache}')
 
-        proc = createSubprocess(prefixargs + [sys.executable, scriptname] +
-                                options + [
-                                    sockname, uuid, ','.join(setups), userstr]
-                                + args, stdin=subprocess.PIPE)
-        proc.stdin.write(code.encode())
-        proc.stdin.close()
-        if sandbox:
+        proc = None
+        if self._zygote:
+            proc = self._zygote.spawn(sockname, uuid, userstr, code, quiet,
+                                      self._db)
+        if proc is None:
+            proc = createSubprocess(prefixargs + [sys.executable, scriptname]
+                                    + options + [sockname, uuid,
+                                                 ','.join(setups), userstr]
+                                    + args, stdin=subprocess.PIPE)
+            proc.stdin.write(code.encode())
+            proc.stdin.close()
+        if isinstance(proc, ForkedSimulation):
+            # the forked process is already synchronized
+            pass
+        elif sandbox:
             if not session.current_sysconfig.get('cache'):
                 raise NicosError('no cache is configured')
             socket.send(pickle.dumps(session.cache.get_values()))
@@ -25,11 +25,14 @@
 
 """NICOS core utility functions."""
 
+import queue
+import threading
 from collections import namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from functools import wraps
 from time import localtime, time as currenttime
 
-from nicos import nicos_version, session
+from nicos import config, nicos_version, session
 from nicos.core import status
 from nicos.core.constants import SIMULATION
 from nicos.core.errors import CommunicationError, ComputationError, \
@@ -161,6 +164,104 @@ def devIter(devices, baseclass=None, onlydevs=True, allwaiters=False):
                 yield dev if onlydevs else (devname, dev)
 
 
+class ReadoutPool:
+    """A fixed number of threads that read out devices concurrently.
+
+    The threads are daemon threads, so that a device read that never returns
+    does not block the process from exiting.
+
+    A running read can't be cancelled.  To keep a hanging device from using
+    up all threads, no new read is queued while a read of the device is still
+    running; the running read is waited for instead.
+    """
+
+    def __init__(self, nthreads):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # device -> future of its currently running read
+        self._running = {}
+        for i in range(nthreads):
+            createThread('readout %d' % (i + 1), self._worker)
+
+    def _worker(self):
+        while True:
+            future, dev, maxage = self._queue.get()
+            with self._lock:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._running[dev] = future
+            try:
+                value = dev.read(maxage)
+            except BaseException as err:
+                future.set_exception(err)
+            else:
+                future.set_result((currenttime(), value))
+            finally:
+                with self._lock:
+                    if self._running.get(dev) is future:
+                        del self._running[dev]
+
+    def read(self, dev, maxage):
+        """Return a future for ``(timestamp, value)`` of reading *dev*."""
+        with self._lock:
+            future = self._running.get(dev)
+            if future is not None:
+                return future
+        future = Future()
+        self._queue.put((future, dev, maxage))
+        return future
+
+
+_readout_pool = None
+_readout_pool_lock = threading.Lock()
+
+
+def multiRead(devices, maxage=0):
+    """Read the values of the *devices*.
+
+    Returns a list of ``(timestamp, value, exc)`` tuples in the order of
+    *devices*, where *exc* is the exception raised by `read()`, if any.
+    The timestamp is taken when the read is finished.
+
+    If ``readout_threads`` is configured, the devices are read concurrently,
+    and a device that takes longer than ``readout_timeout`` seconds to read
+    gets a `NicosTimeoutError` (its read continues in the background).
+    Exceptions that are not derived from `Exception` are re-raised.
+    """
+    global _readout_pool  # pylint: disable=global-statement
+
+    nthreads = config.readout_threads
+    if nthreads <= 1 or len(devices) <= 1 or session.mode == SIMULATION:
+        results = []
+        for dev in devices:
+            try:
+                value = dev.read(maxage)
+            except Exception as err:
+                results.append((currenttime(), None, err))
+            else:
+                results.append((currenttime(), value, None))
+        return results
+
+    with _readout_pool_lock:
+        if _readout_pool is None:
+            _readout_pool = ReadoutPool(nthreads)
+        pool = _readout_pool
+    futures = [pool.read(dev, maxage) for dev in devices]
+    results = []
+    for dev, future in zip(devices, futures):
+        try:
+            timestamp, value = future.result(config.readout_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            results.append((currenttime(), None, NicosTimeoutError(
+                dev, 'readout timed out after %s s' % config.readout_timeout)))
+        except Exception as err:
+            results.append((currenttime(), None, err))
+        else:
+            results.append((timestamp, value, None))
+    return results
+
+
 def multiStatus(devices, maxage=None):
     """Combine the status of multiple devices to form a single status value.
 
@@ -192,6 +293,63 @@ def multiStatus(devices, maxage=None):
                            'implemented?)'
 
 
+class CompletionNotifier:
+    """Wakes up `multiWait` early when a waited-on device has (probably)
+    finished.
+
+    Devices that know when a movement ends, e.g. from a movement thread or a
+    hardware callback, should call `notify`.  Also, status updates of the
+    waited-on devices that arrive from the cache (e.g. from the poller) wake
+    up the waiters.  Devices that do neither are still polled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # device name -> list of events to set on completion
+        self._waiters = {}
+        # total polling latency that early wakeups have saved, in seconds
+        self.saved = 0.
+
+    def register(self, devices, event):
+        """Set *event* whenever one of the *devices* signals completion."""
+        def callback(key, value, time):
+            if value and value[0] != status.BUSY:
+                event.set()
+        with self._lock:
+            for dev in devices:
+                self._waiters.setdefault(dev.name, []).append(event)
+        if session.cache:
+            for dev in devices:
+                session.cache.addCallback(dev, 'status', callback)
+        return callback
+
+    def unregister(self, devices, event, callback):
+        with self._lock:
+            for dev in devices:
+                events = self._waiters.get(dev.name)
+                if events and event in events:
+                    events.remove(event)
+                    if not events:
+                        del self._waiters[dev.name]
+        if session.cache:
+            for dev in devices:
+                session.cache.removeCallback(dev, 'status', callback)
+
+    def notify(self, dev):
+        """Notify waiters that *dev* has finished its current action.
+
+        Must be called only when the device status already reflects this,
+        otherwise the waiters just check once more and continue polling.
+        """
+        with self._lock:
+            events = tuple(self._waiters.get(dev.name, ()))
+        for event in events:
+            event.set()
+
+
+completion_notifier = CompletionNotifier()
+
+
 def multiWait(devices):
     """Wait for the *devices*.
 
@@ -205,6 +363,9 @@ def multiWait(devices):
     (exception in `CONTINUE_EXECPTIONS` < `SKIP_EXCEPTIONS` < other exceptions)
     is re-raised at the end.
 
+    Between checks, it sleeps until the polling delay is over or one of the
+    devices signals completion via the `completion_notifier`.
+
     *baseclass* allows to restrict the devices waited on.
     """
     from nicos.core.device import Waitable
@@ -219,6 +380,13 @@ def multiWait(devices):
     devlist = list(devIter(devices, baseclass=Waitable, allwaiters=True))
     session.log.debug('multiWait: initial devices %s, all waiters %s',
                       devices, devlist)
+    waitdevs = list(devlist)
+    wakeup = threading.Event()
+    callback = None
+    if session.mode != SIMULATION:
+        callback = completion_notifier.register(waitdevs, wakeup)
+    # polling delay saved by the last early wakeup
+    saved = 0
     values = {}
     loops = -2  # wait 2 iterations for full loop
     eta_update = 1 if session.mode != SIMULATION else 0
@@ -257,6 +425,9 @@ def multiWait(devices):
                     # every 10 loops, go through everything to get an accurate
                     # display in the action line
                     continue
+                if saved:
+                    completion_notifier.saved += saved
+                    saved = 0
                 if dev in devices:
                     # populate the results dictionary, but only with the values
                     # of explicitly given devices
@@ -275,11 +446,22 @@ def multiWait(devices):
                     eta_str = ('Estimated %s left / ' % formatDuration(max(eta))
                                if eta else '')
                     session.action(eta_str + target_str)
-                session.delay(delay)
-                eta_update += delay
+                if callback is None:
+                    session.delay(delay)
+                    eta_update += delay
+                else:
+                    started = currenttime()
+                    session.delay(delay, wakeup)
+                    slept = currenttime() - started
+                    if wakeup.is_set():
+                        wakeup.clear()
+                        saved = max(delay - slept, 0)
+                    eta_update += slept
         if final_exc:
             raise final_exc
     finally:
+        if callback is not None:
+            completion_notifier.unregister(waitdevs, wakeup, callback)
         session.endActionScope()
         session.log.debug('multiWait: finished')
     return values
@@ -30,17 +30,30 @@ import threading
 from time import sleep, time as currenttime
 
 from nicos import session
-from nicos.core import CacheError, CacheLockError, Device, Param, host
+from nicos.core import CacheError, CacheLockError, Device, Param, host, \
+    intrange, none_or
 from nicos.protocols.cache import BUFSIZE, CYCLETIME, DEFAULT_CACHE_PORT, \
     END_MARKER, OP_ASK, OP_LOCK, OP_LOCK_LOCK, OP_LOCK_UNLOCK, OP_REWRITE, \
     OP_SUBSCRIBE, OP_TELL, OP_TELLOLD, OP_UNSUBSCRIBE, OP_WILDCARD, \
-    SYNC_MARKER, cache_dump, cache_load, line_pattern, msg_pattern
+    SYNC_MARKER, CacheLoader, cache_dump, cache_load, line_pattern, \
+    msg_pattern
 from nicos.utils import closeSocket, createThread, getSysInfo, tcpSocket
 
+# time after which an unreachable replica is tried again
+REPLICA_RETRY_DELAY = 30
+
 
 class BaseCacheClient(Device):
     """
     An extensible read/write client for the NICOS cache.
+
+    If a *replica* of the cache server is given, explicit queries that only
+    read (like history queries) are sent there, relieving the primary server.
+    If the replica cannot be reached, they go to the primary server, until
+    the replica is tried again after some time.
+
+    By default, the client gets all keys below its prefix.  Subclasses that
+    only need certain keys can restrict this with `_set_subscriptions`.
     """
 
     parameters = {
@@ -48,6 +61,10 @@ class BaseCacheClient(Device):
                         type=host(defaultport=DEFAULT_CACHE_PORT),
                         mandatory=True),
         'prefix': Param('Cache key prefix', type=str, mandatory=True),
+        'replica': Param('"host[:port]" of a read replica of the cache, '
+                         'used for explicit read queries',
+                         type=none_or(host(defaultport=DEFAULT_CACHE_PORT)),
+                         default=None),
     }
 
     remote_callbacks = True
@@ -67,6 +84,10 @@ class BaseCacheClient(Device):
         self._socket = None
         self._secsocket = None
         self._sec_lock = threading.RLock()
+        self._repsocket = None
+        self._rep_lock = threading.Lock()
+        # replica is not used before this time after it failed
+        self._rep_retry = 0
         self._prefix = self.prefix.strip('/')
         if self._prefix:
             self._prefix += '/'
@@ -78,6 +99,9 @@ class BaseCacheClient(Device):
         # maps oldprefix -> set of new prefixes without self._prefix prepended
         self._rewrites = {}
         self._prefixcallbacks = {}
+        # keys below the prefix to get, None for all keys
+        self._subscriptions = None
+        self._sub_lock = threading.Lock()
 
         self._stoprequest = False
         self._queue = queue.Queue()
@@ -132,6 +156,10 @@ class BaseCacheClient(Device):
             if self._secsocket:
                 closeSocket(self._secsocket)
                 self._secsocket = None
+        with self._rep_lock:
+            if self._repsocket:
+                closeSocket(self._repsocket)
+                self._repsocket = None
         self._disconnect_action()
 
     def _wait_retry(self):
@@ -141,10 +169,14 @@ class BaseCacheClient(Device):
         pass
 
     def _connect_action(self):
+        with self._sub_lock:
+            subkeys = [''] if self._subscriptions is None \
+                else sorted(self._subscriptions)
         # send request for all keys and updates....
         # (send a single request for a non-existing key afterward to
         # determine the end of data)
-        msg = f'@{self._prefix}{OP_WILDCARD}\n{END_MARKER}{OP_ASK}\n'
+        msg = ''.join(f'@{self._prefix}{key}{OP_WILDCARD}\n'
+                      for key in subkeys) + f'{END_MARKER}{OP_ASK}\n'
         self._socket.sendall(msg.encode())
 
         # read response
@@ -155,8 +187,10 @@ class BaseCacheClient(Device):
             n += 1
 
         # send request for all updates
-        msg = f'@{self._prefix}{OP_SUBSCRIBE}\n'
-        self._socket.sendall(msg.encode())
+        msg = ''.join(f'@{self._prefix}{key}{OP_SUBSCRIBE}\n'
+                      for key in subkeys)
+        if msg:
+            self._socket.sendall(msg.encode())
         for prefix in self._prefixcallbacks:
             msg = f'@{prefix}{OP_SUBSCRIBE}\n'
             self._socket.sendall(msg.encode())
@@ -166,6 +200,29 @@ class BaseCacheClient(Device):
     def _disconnect_action(self):
         pass
 
+    def _set_subscriptions(self, keys):
+        """Get only the given keys below the prefix, or all if *keys* is
+        None.
+
+        Like all subscriptions, the keys match all cache keys that contain
+        them.  When connected, subscriptions are changed right away, and the
+        current values of newly subscribed keys are requested.
+        """
+        keys = None if keys is None else set(keys)
+        with self._sub_lock:
+            old, self._subscriptions = self._subscriptions, keys
+            if old == keys or not self._connected:
+                return
+            old = {''} if old is None else old
+            new = {''} if keys is None else keys
+            msg = ''.join(f'@{self._prefix}{key}{OP_UNSUBSCRIBE}\n'
+                          for key in sorted(old - new))
+            msg += ''.join(f'@{self._prefix}{key}{OP_SUBSCRIBE}\n'
+                           f'@{self._prefix}{key}{OP_WILDCARD}\n'
+                           for key in sorted(new - old))
+        if msg:
+            self._queue.put(msg)
+
     def _handle_msg(self, time, ttlop, ttl, tsop, key, op, value):
         raise NotImplementedError('implement _handle_msg in subclasses')
 
@@ -315,8 +372,13 @@ class BaseCacheClient(Device):
         # end of while loop
         self._disconnect()
 
-    def _single_request(self, tosend, sentinel=b'\n', retry=2, sync=False):
-        """Communicate over the secondary socket."""
+    def _single_request(self, tosend, sentinel=b'\n', retry=2, sync=False,
+                        replica=False):
+        """Communicate over the secondary socket.
+
+        If *replica* is true and a replica is configured, the request is sent
+        to the replica instead, if it can be reached.
+        """
         if not self._socket:
             self._disconnect('single request: no socket')
             if not self._socket:
@@ -324,6 +386,11 @@ class BaseCacheClient(Device):
         if sync:
             # sync has to be false for lock requests, as these occur during startup
             self._queue.join()
+        if replica and self.replica:
+            data = self._replica_request(tosend, sentinel)
+            if data is not None:
+                yield from self._iter_reply(data)
+                return
         with self._sec_lock:
             if not self._secsocket:
                 try:
@@ -362,6 +429,39 @@ class BaseCacheClient(Device):
                     return
                 raise
 
+        yield from self._iter_reply(data)
+
+    def _replica_request(self, tosend, sentinel):
+        """Send a request to the replica and return the reply data, or None
+        if the replica could not be queried.
+        """
+        with self._rep_lock:
+            if currenttime() < self._rep_retry:
+                return None
+            try:
+                if not self._repsocket:
+                    self._repsocket = tcpSocket(self.replica,
+                                                DEFAULT_CACHE_PORT, timeout=5)
+                self._repsocket.sendall(tosend.encode())
+                timeout = currenttime() + 10
+                data = b''
+                while not data.endswith(sentinel):
+                    newdata = self._repsocket.recv(BUFSIZE)
+                    if not newdata:
+                        raise OSError('replica closed connection')
+                    if currenttime() > timeout:
+                        raise OSError('getting response took too long')
+                    data += newdata
+                return data
+            except OSError as err:
+                self.log.debug('query to replica %s failed, using primary: %s',
+                               self.replica, err)
+                closeSocket(self._repsocket)
+                self._repsocket = None
+                self._rep_retry = currenttime() + REPLICA_RETRY_DELAY
+                return None
+
+    def _iter_reply(self, data):
         lmatch = line_pattern.match
         mmatch = msg_pattern.match
         i = 0
@@ -459,12 +559,23 @@ class BaseCacheClient(Device):
 
 class CacheClient(BaseCacheClient):
 
+    parameters = {
+        'loadcachesize': Param('Number of distinct received values whose '
+                               'parsed form is kept, so that repeated '
+                               'updates need not be parsed again',
+                               type=intrange(0, 1000000), default=1024),
+        'loadcachestats': Param('Hits and misses of the parsed value cache',
+                                type=dict, volatile=True),
+    }
+
     temporary = True
     _dblock = None
+    _load = None
 
     def doInit(self, mode):
         BaseCacheClient.doInit(self, mode)
         self._db = {}
+        self._load = CacheLoader(self.loadcachesize)
         self._dblock = threading.Lock()
         self._callbacks = {}
 
@@ -477,6 +588,9 @@ class CacheClient(BaseCacheClient):
 
     def doShutdown(self):
         BaseCacheClient.doShutdown(self)
+        if self._load:
+            self.log.debug('parsed value cache: %(hits)d hits, '
+                           '%(misses)d misses', self._load.stats())
         # make sure the interface is still usable but has no values to return
         if self._dblock:
             with self._dblock:
@@ -524,7 +638,7 @@ class CacheClient(BaseCacheClient):
             for cbkey, callback in self._prefixcallbacks.items():
                 if key.startswith(cbkey):
                     if value is not None:
-                        value = cache_load(value)
+                        value = self._load(value)
                     time = time and float(time)
                     try:
                         callback(key, value, time, op != OP_TELL)
@@ -547,7 +661,7 @@ class CacheClient(BaseCacheClient):
             with self._dblock:
                 self._db.pop(key, None)
         else:
-            value = cache_load(value)
+            value = self._load(value)
             with self._dblock:
                 self._db[key] = (value, time)
             if self._do_callbacks:
@@ -555,6 +669,14 @@ class CacheClient(BaseCacheClient):
                     self._call_callbacks(key, value, time)
                 if key.endswith('/value') and session.experiment:
                     session.experiment.data.cacheCallback(key, value, time)
+        # using session._experiment to avoid creating it in this thread
+        if self._do_callbacks and session._experiment:
+            session._experiment.data.metainfoCallback(key)
+
+    def doReadLoadcachestats(self):
+        if self._load is None:  # not initialized yet
+            return {}
+        return self._load.stats()
 
     def _call_callbacks(self, key, value, time):
         with self._dblock:
@@ -679,6 +801,8 @@ class CacheClient(BaseCacheClient):
         self._propagate((time, dbkey, OP_TELL, dvalue))
         if key == 'value' and session.experiment:
             session.experiment.data.cacheCallback(dbkey, value, time)
+        if session._experiment:
+            session._experiment.data.metainfoCallback(dbkey)
         # we have to check rewrites here, since the cache server won't send
         # us updates for a rewritten key if we sent the original key
         if str(dev).lower() in self._rewrites:
@@ -689,6 +813,8 @@ class CacheClient(BaseCacheClient):
                 self._propagate((time, rdbkey, OP_TELL, dvalue))
                 if key == 'value' and session.experiment:
                     session.experiment.data.cacheCallback(rdbkey, value, time)
+                if session._experiment:
+                    session._experiment.data.metainfoCallback(rdbkey)
 
     def delete(self, dev, key, time=None):
         """Delete a given device's subkey."""
@@ -700,12 +826,16 @@ class CacheClient(BaseCacheClient):
         msg = f'{time}@{self._prefix}{dbkey}{OP_TELL}\n'
         self._queue.put(msg)
         self._propagate((time, dbkey, OP_TELL, ''))
+        if session._experiment:
+            session._experiment.data.metainfoCallback(dbkey)
         if str(dev).lower() in self._rewrites:
             for newprefix in self._rewrites[str(dev).lower()]:
                 rdbkey = f'{newprefix}/{key}'.lower()
                 with self._dblock:
                     self._db.pop(rdbkey, None)
                 self._propagate((time, rdbkey, OP_TELL, ''))
+                if session._experiment:
+                    session._experiment.data.metainfoCallback(rdbkey)
 
     def put_raw(self, key, value, time=None, ttl=None, flag=''):
         """Put a key given by full name.
@@ -793,7 +923,8 @@ class CacheClient(BaseCacheClient):
         tosend = f'{fromtime}-{totime}@{self._prefix}{key}{OP_ASK}{interval}' \
             f'\n{END_MARKER}{OP_ASK}\n'
         ret = []
-        for msgmatch in self._single_request(tosend, b'###!\n', sync=False):
+        for msgmatch in self._single_request(tosend, b'###!\n', sync=False,
+                                             replica=True):
             # process data
             time, value = msgmatch.group('time'), msgmatch.group('value')
             if time is None:
@@ -528,6 +528,10 @@ class Detector(Measurable):
         self._presetkeys = presetkeys
         self._collectControllers()
 
+    @property
+    def pipeline_safe(self):
+        return all(ch.pipeline_safe for ch in self._channels)
+
     def _collectControllers(self):
         """Internal method to collect all controllers."""
         controllers = []
@@ -39,6 +39,7 @@ from nicos.core import MASTER, POLLER, SIMULATION, ArrayDesc, Attach, \
     SubscanMeasurable, Value, floatrange, intrange, listof, none_or, oneof, \
     status, tupleof
 from nicos.core.scan import Scan
+from nicos.core.utils import completion_notifier
 from nicos.devices.abstract import CanReference, Coder, Motor
 from nicos.devices.generic.detector import ActiveChannel, ImageChannelMixin, \
     PassiveChannel
@@ -57,6 +58,8 @@ class VirtualMotor(HasOffset, CanDisable, Motor):
     # during the "dry run"
     hardware_access = True
 
+    pipeline_safe = True
+
     parameters = {
         'speed':     Param('Virtual speed of the device', settable=True,
                            type=floatrange(0, 1e6), unit='main/s'),
@@ -146,6 +149,7 @@ class VirtualMotor(HasOffset, CanDisable, Motor):
         finally:
             self._stop = False
             self._setROParam('curstatus', (status.OK, 'idle'))
+            completion_notifier.notify(self)
 
     def doReadRamp(self):
         return self.speed * 60.
@@ -236,6 +240,8 @@ class VirtualChannel(ActiveChannel):
     # See comment in Virtualmotor class
     hardware_access = True
 
+    pipeline_safe = True
+
     parameters = {
         'curvalue':  Param('Current value', settable=True, unit='main'),
         'curstatus': Param('Current status', type=tupleof(int, str),
@@ -788,6 +794,9 @@ class VirtualImage(ImageChannelMixin, PassiveChannel):
     # See comment in VirtualMotor class
     hardware_access = True
 
+    # the image is generated from the device positions while counting
+    pipeline_safe = True
+
     parameters = {
         'size': Param('Detector size in pixels (x, y)',
                       settable=False,
@@ -197,9 +197,11 @@ Works only with the "set a key" operator.  This flag makes no sense otherwise.
 
 import pickle
 import re
+import threading
 from ast import Add, BinOp, Call, Constant, Dict, List, Name, Set, Sub, \
     Tuple, UnaryOp, USub, parse
 from base64 import b64decode, b64encode
+from collections import OrderedDict
 
 from nicos.utils import number_types, readonlydict, readonlylist
 
@@ -256,10 +258,23 @@ line_pattern = re.compile(br'([^\r\n]*)\r?\n')
 repr_types = number_types + (str, bytes)
 
 
+def _all_repr_types(seq):
+    for item in seq:
+        if not isinstance(item, repr_types):
+            return False
+    return True
+
+
 def cache_dump(obj):
     res = []
     if isinstance(obj, repr_types):
         res.append(repr(obj))
+    elif isinstance(obj, (list, tuple)) and _all_repr_types(obj):
+        # fast path for flat sequences, e.g. of numbers
+        opening, closing = ('[', ']') if isinstance(obj, list) else ('(', ')')
+        if not obj:
+            return opening + closing
+        return opening + ','.join(map(repr, obj)) + ',' + closing
     elif isinstance(obj, list):
         res.append('[')
         for item in obj:
@@ -349,7 +364,64 @@ def ast_eval(node):
     return _convert(node)
 
 
-def cache_load(entry):
+# patterns for values that can be converted without a Python parser
+_int_pattern = re.compile(r'-?(?:0|[1-9]\d*)$')
+_float_pattern = re.compile(
+    r'-?(?:\d+\.\d*|\.\d+|\d+(?=[eE]))(?:[eE][+-]?\d+)?$')
+_simple_names = dict(_safe_names, **{'-inf': float('-inf'),
+                                     '-nan': float('nan')})
+_nomatch = object()
+
+
+def _load_simple(entry):
+    """Convert numbers and the constants in _safe_names, return _nomatch for
+    other values.
+    """
+    if entry in _simple_names:
+        return _simple_names[entry]
+    try:
+        if _int_pattern.match(entry):
+            return int(entry)
+        if _float_pattern.match(entry):
+            return float(entry)
+    except ValueError:
+        pass
+    return _nomatch
+
+
+def _load_simple_seq(inner):
+    """Convert the inner part of a list or tuple literal consisting only of
+    simple values, return None for other values.
+    """
+    items = inner.split(',')
+    if not items[-1].strip():
+        # trailing comma (always written by cache_dump) or empty sequence
+        items.pop()
+    result = []
+    for item in items:
+        value = _load_simple(item.strip())
+        if value is _nomatch:
+            return None
+        result.append(value)
+    return result
+
+
+def _cache_load_complex(entry):
+    if entry[:1] == '[' and entry[-1:] == ']':
+        result = _load_simple_seq(entry[1:-1])
+        if result is not None:
+            return readonlylist(result)
+    elif entry[:1] == '(' and entry[-1:] == ')':
+        inner = entry[1:-1]
+        # "(1)" is not a tuple
+        if ',' in inner or not inner.strip():
+            result = _load_simple_seq(inner)
+            if result is not None:
+                return tuple(result)
+    return _cache_load_ast(entry)
+
+
+def _cache_load_ast(entry):
     try:
         # parsing with 'eval' always gives an ast.Expression node
         expr = parse(entry, mode='eval').body
@@ -357,3 +429,89 @@ def cache_load(entry):
     except Exception as err:
         raise ValueError(
             'corrupt cache entry: %r (%s)' % (entry, err)) from err
+
+
+def _immutable(value):
+    if isinstance(value, (tuple, frozenset)):
+        return all(_immutable(item) for item in value)
+    return value is None or isinstance(value, (str, bytes, complex) +
+                                       number_types)
+
+
+def _memoizable(value):
+    # lists and dicts are copied on every lookup, but only at the top level
+    if isinstance(value, readonlylist):
+        return all(_immutable(item) for item in value)
+    if isinstance(value, readonlydict):
+        return all(_immutable(item) for item in value.items())
+    return _immutable(value)
+
+
+class CacheLoader:
+    """Converts PyON strings to Python objects like `cache_load`, memoizing
+    the results for the last *maxsize* different strings.
+
+    Numbers are converted directly and not memoized.  Only values that cannot
+    be modified by the caller are memoized; lists and dicts are returned as
+    copies, since readonlylist can still be extended with +=, and only if they
+    contain no further mutable containers.  Values with pickled objects are
+    never memoized.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, entry):
+        try:
+            value = self._memo[entry]
+            self._memo.move_to_end(entry)
+            # not exact with concurrent calls, but good enough for statistics
+            self.hits += 1
+        except KeyError:
+            value = _nomatch
+        if value is _nomatch:
+            if not isinstance(entry, str):
+                return _cache_load_ast(entry)
+            value = _load_simple(entry)
+            if value is not _nomatch:
+                return value
+            value = _cache_load_complex(entry)
+            if 'cache_unpickle' in entry or self.maxsize <= 0 or \
+               not _memoizable(value):
+                return value
+            with self._lock:
+                self.misses += 1
+                self._memo[entry] = value
+                if len(self._memo) > self.maxsize:
+                    self._memo.popitem(last=False)
+        if isinstance(value, readonlylist):
+            return readonlylist(value)
+        if isinstance(value, readonlydict):
+            return readonlydict(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Return a dictionary with the number of memo hits and misses and the
+        current number of memoized values.
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._memo)}
+
+
+_loader = CacheLoader()
+
+
+def cache_load(entry):
+    """Convert a PyON string to a Python object.
+
+    Results are memoized in a process-wide `CacheLoader`.
+    """
+    return _loader(entry)
@@ -86,6 +86,8 @@ DAEMON_COMMANDS = {
     'eventunmask':    0x65,
     'rearrange':      0x66,
     'keepalive':      0x67,
+    'cachefilter':    0x68,
+    'liveopts':       0x69,
 }
 
 ACTIVE_COMMANDS = {
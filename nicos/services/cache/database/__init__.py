@@ -23,5 +23,5 @@
 
 from nicos.services.cache.database.base import CacheDatabase
 from nicos.services.cache.database.flatfile import FlatfileCacheDatabase
-from nicos.services.cache.database.memory import MemoryCacheDatabase, \
-    MemoryCacheDatabaseWithHistory
+from nicos.services.cache.database.memory import HistoryRingCacheDatabase, \
+    MemoryCacheDatabase, MemoryCacheDatabaseWithHistory
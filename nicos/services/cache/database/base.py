@@ -30,6 +30,45 @@ from nicos.protocols.cache import FLAG_NO_STORE, OP_LOCK, OP_LOCK_LOCK, \
 from nicos.services.cache.entry import CacheEntry
 
 
+def downsample(entries, interval):
+    """Reduce a time-ordered sequence of history entries to at most three
+    entries per time bucket of length *interval*.
+
+    For each bucket, the entries with the minimum and maximum value and the
+    last entry are kept (in the original order), so that peaks survive the
+    downsampling.  Entries with non-numeric values are reduced to the last
+    entry in the bucket; entries without value (expired or deleted keys) are
+    always kept.
+    """
+    def bucket_entries():
+        return sorted({minent, maxent, last} - {None},
+                      key=lambda ent: ent.time)
+
+    bucket = last = minent = maxent = None
+    minval = maxval = 0
+    for entry in entries:
+        this = entry.time // interval if entry.value else None
+        if this is None or this != bucket:
+            if last is not None:
+                yield from bucket_entries()
+            bucket = this
+            last = minent = maxent = None
+            if this is None:
+                yield entry
+                continue
+        last = entry
+        try:
+            value = float(entry.value)
+        except ValueError:
+            continue
+        if minent is None or value < minval:
+            minent, minval = entry, value
+        if maxent is None or value > maxval:
+            maxent, maxval = entry, value
+    if last is not None:
+        yield from bucket_entries()
+
+
 class CacheDatabase(Device):
     """Represents a backend for the NICOS cache.
 
@@ -84,9 +123,18 @@ class CacheDatabase(Device):
         Should also include the last entry *before* the fromtime, so that the
         history during the span is not incomplete (i.e. for keys that change
         rarely).
+
+        If *interval* is given, the entries should be reduced to a few per
+        interval, e.g. using `downsample`.
         """
         raise NotImplementedError
 
+    def coversHistory(self, fromtime):
+        """Return true if the history from *fromtime* on is complete in this
+        database, e.g. to decide if a replica must ask the primary.
+        """
+        return True
+
     # not needed to override:
 
     def ask(self, key, ts):
@@ -149,8 +197,8 @@ class CacheDatabase(Device):
 
     def ask_hist(self, key, fromtime, totime, interval):
         """Query the historical values for a single key between two
-        timestamps. If interval is set, this will be a minimum time between
-        two adjacent values.
+        timestamps. If interval is set, the values are downsampled to a few
+        values (minimum, maximum and last) per interval.
 
         Returns a generator of cache message bunches.
         """
@@ -219,11 +267,9 @@ class CacheDatabase(Device):
 
         # if no_store flag is set, always send an update
         if real_update or no_store:
-            for client in self._server._connected_clients:
-                if client is not from_client:
-                    for cat in newcats:
-                        client.update(f'{cat}/{subkey}', OP_TELL,
-                                      value or '', time, ttl)
+            for cat in newcats:
+                self._server.updateClients(f'{cat}/{subkey}', OP_TELL,
+                                           value or '', time, ttl, from_client)
 
     def rewrite(self, key, value):
         """Rewrite handling."""
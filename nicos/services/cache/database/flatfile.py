@@ -23,18 +23,147 @@
 # *****************************************************************************
 
 import os
+import re
 import shutil
+import sys
 import threading
+import zipfile
+from array import array
+from itertools import chain
 from os import path
 from time import localtime, mktime, sleep, time as currenttime
 
 from nicos import config
-from nicos.core import Param, oneof
+from nicos.core import Param, intrange, oneof
 from nicos.protocols.cache import OP_TELLOLD
-from nicos.services.cache.database.base import CacheDatabase
+from nicos.services.cache.database.base import CacheDatabase, downsample
 from nicos.services.cache.entry import CacheEntry
 from nicos.utils import allDays, createThread, ensureDirectory
 
+STORE_HEADER = '# NICOS cache store file v2'
+INDEX_HEADER = '# NICOS cache index v1'
+
+
+class HistoryIndex:
+    """Index of a history store file.
+
+    Maps each subkey to the byte offsets and timestamps of its lines, so that
+    history queries can seek directly to the relevant lines.
+
+    The index is saved in a separate file with a text header, listing the
+    subkeys and the size of the indexed data, followed by a binary section of
+    offsets and timestamps per subkey.  Sections are only read when requested.
+    """
+
+    def __init__(self, size=0, mtime=0):
+        # size and mtime of the indexed data file
+        self.size = size
+        self.mtime = mtime
+        # subkey -> (offsets, times) arrays
+        self.entries = {}
+        # for loaded indices: subkey -> (count, offset) of not yet read
+        # sections, and the filename to read them from
+        self.sections = {}
+        self.filename = None
+        self._lock = threading.Lock()
+
+    def _get(self, subkey):
+        if subkey in self.sections:
+            count, offset = self.sections.pop(subkey)
+            offsets, times = array('q'), array('d')
+            with open(self.filename, 'rb') as fd:
+                fd.seek(offset)
+                offsets.fromfile(fd, count)
+                times.fromfile(fd, count)
+            self.entries[subkey] = (offsets, times)
+        return self.entries.get(subkey)
+
+    def add(self, subkey, offset, time):
+        with self._lock:
+            arrays = self._get(subkey)
+            if arrays is None:
+                arrays = self.entries[subkey] = (array('q'), array('d'))
+            arrays[0].append(offset)
+            arrays[1].append(time)
+
+    def lookup(self, subkey):
+        """Return copies of the (offsets, times) arrays for a subkey."""
+        with self._lock:
+            arrays = self._get(subkey)
+            if arrays is None:
+                return array('q'), array('d')
+            return arrays[0][:], arrays[1][:]
+
+    def scan(self, filename):
+        """Add all lines after the currently indexed size of the file."""
+        with open(filename, 'rb') as fd:
+            st = os.fstat(fd.fileno())
+            fd.seek(self.size)
+            nsplit = 3
+            if self.size == 0:
+                firstline = fd.readline()
+                if not firstline.startswith(STORE_HEADER.encode()):
+                    nsplit = 2
+                    fd.seek(0)
+            offset = fd.tell()
+            for line in fd:
+                if not line.endswith(b'\n'):
+                    # incomplete line at the end: index it later
+                    break
+                fields = line.split(None, nsplit)
+                if len(fields) == nsplit + 1 and b'\x00' not in line:
+                    try:
+                        self.add(fields[0].decode(), offset, float(fields[1]))
+                    except ValueError:
+                        pass
+                offset += len(line)
+            self.size = offset
+            self.mtime = st.st_mtime
+
+    def save(self, filename):
+        """Write the index to a file."""
+        with self._lock:
+            for subkey in list(self.sections):
+                self._get(subkey)
+        header = [f'{INDEX_HEADER}\t{self.size}\t{self.mtime!r}\t'
+                  f'{sys.byteorder}\n']
+        offset = 0
+        for subkey, (offsets, _) in self.entries.items():
+            header.append(f'{subkey}\t{len(offsets)}\t{offset}\n')
+            offset += len(offsets) * 16
+        header.append('\n')
+        header = ''.join(header).encode()
+        tmpname = filename + '.tmp'
+        with open(tmpname, 'wb') as fd:
+            fd.write(header)
+            for offsets, times in self.entries.values():
+                offsets.tofile(fd)
+                times.tofile(fd)
+        os.replace(tmpname, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """Read the header of an index file; sections are read on demand."""
+        with open(filename, 'rb') as fd:
+            tag, size, mtime, byteorder = \
+                fd.readline().decode().rstrip('\n').split('\t')
+            if tag != INDEX_HEADER or byteorder != sys.byteorder:
+                raise ValueError('unsupported index file %s' % filename)
+            index = cls(int(size), float(mtime))
+            index.filename = filename
+            sections = []
+            for line in fd:
+                if line == b'\n':
+                    break
+                subkey, count, offset = line.decode().split('\t')
+                sections.append((subkey, int(count), int(offset)))
+            else:
+                raise ValueError('truncated index file %s' % filename)
+            start = fd.tell()
+        for subkey, count, offset in sections:
+            index.sections[subkey] = (count, start + offset)
+        return index
+
 
 class FlatfileCacheDatabase(CacheDatabase):
     """Cache database which writes historical values to disk in a flatfile
@@ -69,6 +198,16 @@ class FlatfileCacheDatabase(CacheDatabase):
     cache server, rather by the NICOS clients.  The value can also a single
     dash, this indicates that at the given timestamp the latest value for this
     key expired.
+
+    To speed up history queries, an index of the lines for each subkey is kept
+    per file in a separate directory (see `HistoryIndex`).  The index of the
+    current day is updated while writing, indices for older files are created
+    when they are first queried.  Index files can be deleted at any time.
+
+    If *compactafter* is set, a background job moves the files of days older
+    than that into compressed archives, one zip file per category and month
+    with a member per day, in a separate directory.  History queries read the
+    archives transparently.
     """
 
     parameters = {
@@ -78,6 +217,15 @@ class FlatfileCacheDatabase(CacheDatabase):
                            'store hierarchy (auto meaning none on Windows, '
                            'hard else)', default='auto',
                            type=oneof('auto', 'hard', 'soft', 'none')),
+        'indexpath': Param('Directory where the history store index should '
+                           'be saved, by default the storepath with "-index" '
+                           'appended', type=str, default=''),
+        'compactafter': Param('Move history files older than this number of '
+                              'days into compressed archives (0 = never)',
+                              type=intrange(0, 100000), default=0),
+        'archivepath': Param('Directory where the compressed history archives '
+                             'should be saved, by default the storepath with '
+                             '"-archive" appended', type=str, default=''),
     }
 
     def doInit(self, mode):
@@ -99,11 +247,24 @@ class FlatfileCacheDatabase(CacheDatabase):
             self._make_link = lambda a, b: None
 
         self._basepath = path.join(config.nicos_root, self.storepath)
+        self._indexpath = path.join(
+            config.nicos_root,
+            self.indexpath or path.normpath(self.storepath) + '-index')
+        # history indices of the current day's files, by file name
+        self._index = {}
+        self._archivepath = path.join(
+            config.nicos_root,
+            self.archivepath or path.normpath(self.storepath) + '-archive')
+        # serializes modifications and reads of the archive files
+        self._archive_lock = threading.Lock()
+        self._compactor = None
         ltime = localtime()
         self._year = str(ltime[0])
         self._currday = '%02d-%02d' % ltime[1:3]
         self._midnight = mktime(ltime[:3] + (0,) * (8-3) + (ltime[8],))
         self._nextmidnight = self._midnight + 86400
+        # the day of the files in self._index
+        self._indexday = (self._year, self._currday)
 
         self._stoprequest = False
         self._cleaner = createThread('cleaner', self._clean)
@@ -111,6 +272,10 @@ class FlatfileCacheDatabase(CacheDatabase):
     def doShutdown(self):
         self._stoprequest = True
         self._cleaner.join()
+        if self._compactor:
+            self._compactor.join()
+        with self._cat_lock:
+            self._save_indices()
 
     def _read_one_storefile(self, filename):
         with open(filename, 'r+', encoding='utf-8') as fd:
@@ -164,6 +329,7 @@ class FlatfileCacheDatabase(CacheDatabase):
             self.log.info('no previous values found, setting "lastday" link '
                           'to %s/%s', self._year, self._currday)
             self._set_lastday()
+            self._start_compactor()
             return
         with self._cat_lock:
             for fn in os.listdir(curdir):
@@ -178,10 +344,22 @@ class FlatfileCacheDatabase(CacheDatabase):
             if do_rollover:
                 self._rollover()
         self.log.info('loaded %d keys from files in %s', nkeys, curdir)
+        self._start_compactor()
+
+    def _start_compactor(self):
+        # only start now, the "lastday" directory must not be archived before
+        # it has been read
+        if self.compactafter:
+            self._compactor = createThread('compactor', self._compact)
 
     def clearDatabase(self):
         self.log.info('clearing database from %s', self._basepath)
         self._clearDatabaseDir(self._basepath)
+        if path.isdir(self._indexpath):
+            self._clearDatabaseDir(self._indexpath)
+        if path.isdir(self._archivepath):
+            with self._archive_lock:
+                self._clearDatabaseDir(self._archivepath)
 
     def _clearDatabaseDir(self, _path):
         for fn in os.listdir(_path):
@@ -208,11 +386,14 @@ class FlatfileCacheDatabase(CacheDatabase):
                 fd.close()
                 # pylint: disable=unnecessary-dict-index-lookup
                 self._cat[category][0] = None
+        self._save_indices()
+        for category, (_, _, db) in self._cat.items():
             fd = self._create_fd(category)
             for subkey, entry in db.items():
                 if entry.value:
                     ttl = (entry.ttl or entry.expired) and '-' or '+'
-                    fd.write(f'{subkey}\t{entry.time}\t{ttl}\t{entry.value}\n')
+                    self._write_entry(category, fd, subkey, entry.time, ttl,
+                                      entry.value)
             # don't keep fds open for *all* files with keys, rather reopen
             # those that are necessary when new updates come in
             fd.close()
@@ -220,6 +401,25 @@ class FlatfileCacheDatabase(CacheDatabase):
         self._set_lastday()
         # old files could be compressed here, but it is probably not worth it
 
+    def _save_indices(self):
+        """Save the indices of the current day's files and forget them.
+
+        Must be called with self._cat_lock held.
+        """
+        bydate = path.join(self._indexpath, self._indexday[0],
+                           self._indexday[1]) if self._index else None
+        for category, index in self._index.items():
+            try:
+                filename = path.join(self._basepath, self._indexday[0],
+                                     self._indexday[1], category)
+                index.mtime = os.stat(filename).st_mtime
+                ensureDirectory(bydate)
+                index.save(path.join(bydate, category))
+            except Exception:
+                self.log.warning('could not save history index for %s',
+                                 category, exc=1)
+        self._index = {}
+
     def _set_lastday(self):
         if not hasattr(os, 'symlink'):
             return
@@ -244,7 +444,14 @@ class FlatfileCacheDatabase(CacheDatabase):
         fd.seek(0, os.SEEK_END)
         # write version identification, but only for empty files
         if fd.tell() == 0:
-            fd.write('# NICOS cache store file v2\n')
+            fd.write(STORE_HEADER + '\n')
+            fd.flush()
+        # set up the index for the file, which is then updated on every write
+        if category not in self._index:
+            self._indexday = (self._year, self._currday)
+            self._index[category] = self._load_index(
+                filename, path.join(self._indexpath, self._year,
+                                    self._currday, category), save=False)
         bycat = path.join(self._basepath, category, self._year)
         ensureDirectory(bycat)
         linkname = path.join(bycat, self._currday)
@@ -255,6 +462,43 @@ class FlatfileCacheDatabase(CacheDatabase):
                 self.log.exception('linking %s -> %s', linkname, filename)
         return fd
 
+    def _write_entry(self, category, fd, subkey, time, ttlcol, value):
+        """Write a line to the history file of the category and update the
+        index of the file.
+        """
+        line = f'{subkey}\t{time}\t{ttlcol}\t{value}\n'
+        fd.write(line)
+        index = self._index.get(category.replace('/', '-'))
+        if index is not None:
+            index.add(subkey, index.size, time)
+            index.size += len(line.encode())
+
+    def _load_index(self, filename, indexname, save=True):
+        """Return the index for the given history file.
+
+        The index is read from disk if possible, otherwise (re)built.
+        """
+        st = os.stat(filename)
+        try:
+            index = HistoryIndex.load(indexname)
+        except Exception:
+            index = None
+        if index is not None and index.size == st.st_size and \
+           index.mtime == st.st_mtime:
+            return index
+        if index is None or index.size > st.st_size:
+            index = HistoryIndex()
+        # else: lines have been appended since the index was saved
+        index.scan(filename)
+        if save:
+            try:
+                ensureDirectory(path.dirname(indexname))
+                index.save(indexname)
+            except Exception:
+                self.log.debug('could not save history index %s', indexname,
+                               exc=1)
+        return index
+
     def getEntry(self, dbkey):
         with self._cat_lock:
             if dbkey[0] not in self._cat:
@@ -269,42 +513,136 @@ class FlatfileCacheDatabase(CacheDatabase):
                 for subkey, entry in db.items():
                     yield (cat, subkey), entry
 
-    def _read_one_histfile(self, year, monthday, category, subkey):
+    def _read_one_histfile(self, year, monthday, category, subkey,
+                           fromtime, totime):
+        """Yield (time, value) for the lines of a subkey in a history file
+        that are relevant for a query between fromtime and totime.
+
+        These are the lines within the time range, and the last line with a
+        value before the first line within the range.
+        """
         fn = path.join(self._basepath, year, monthday, category)
         if not path.isfile(fn):
+            yield from self._read_archived_histfile(year, monthday, category,
+                                                    subkey)
             return
+        try:
+            index = None
+            if (year, monthday) == self._indexday:
+                index = self._index.get(category)
+            if index is None:
+                index = self._load_index(
+                    fn, path.join(self._indexpath, year, monthday, category))
+            offsets, times = index.lookup(subkey)
+            entries = self._read_indexed_lines(fn, subkey, offsets, times,
+                                               fromtime, totime)
+        except Exception:
+            self.log.warning('could not use history index for %s/%s/%s, '
+                             'reading the whole file', year, monthday,
+                             category, exc=1)
+            entries = self._scan_histfile(fn, subkey)
+        yield from entries
+
+    def _read_indexed_lines(self, fn, subkey, offsets, times, fromtime,
+                            totime):
+        n = len(times)
+        inrange = [i for i in range(n) if fromtime <= times[i] <= totime]
+        first = inrange[0] if inrange else n
+        entries = []
+        with open(fn, 'rb') as fd:
+            nsplit = 3 if fd.readline().startswith(STORE_HEADER.encode()) \
+                else 2
+
+            def read(i):
+                fd.seek(offsets[i])
+                line = fd.readline()
+                if not line.endswith(b'\n'):
+                    # indexed, but not yet completely flushed to disk
+                    return None
+                fields = line.decode('utf-8').rstrip().split(None, nsplit)
+                if len(fields) != nsplit + 1 or fields[0] != subkey or \
+                   float(fields[1]) != times[i]:
+                    raise ValueError('history index does not match file')
+                value = fields[-1]
+                return (times[i], '' if value == '-' else value)
+
+            # find the last entry with a value before the range
+            for i in range(first - 1, -1, -1):
+                if times[i] < fromtime:
+                    entry = read(i)
+                    if entry and entry[1]:
+                        entries.append(entry)
+                        break
+            for i in inrange:
+                entry = read(i)
+                if entry:
+                    entries.append(entry)
+        return entries
+
+    def _scan_histfile(self, fn, subkey):
+        """Yield (time, value) for all lines of a subkey in a history file,
+        without using the index.
+        """
         with open(fn, 'r', encoding='utf-8') as fd:
-            firstline = fd.readline()
-            nsplit = 2
-            if firstline.startswith('# NICOS cache store file v2'):
-                nsplit = 3
-            else:
-                fd.seek(0, os.SEEK_SET)
-            for line in fd:
-                if '\x00' in line:
-                    self.log.warning('found null byte in file %s', fn)
-                    continue
-                fields = line.rstrip().split(None, nsplit)
-                if len(fields) != nsplit + 1:
-                    self.log.warning(
-                        'found a corrupted line in file %s: %s', fn, line)
+            yield from self._scan_histlines(fd, fn, subkey)
+
+    def _scan_histlines(self, lines, fn, subkey):
+        lines = iter(lines)
+        firstline = next(lines, '')
+        nsplit = 2
+        if firstline.startswith(STORE_HEADER):
+            nsplit = 3
+        else:
+            lines = chain([firstline], lines)
+        for line in lines:
+            if '\x00' in line:
+                self.log.warning('found null byte in file %s', fn)
+                continue
+            fields = line.rstrip().split(None, nsplit)
+            if len(fields) != nsplit + 1:
+                self.log.warning(
+                    'found a corrupted line in file %s: %s', fn, line)
+                continue
+            if fields[0] == subkey:
+                try:
+                    time = float(fields[1])
+                except Exception:
+                    self.log.exception('Error converting timestamp in '
+                                       'cache file %s, subkey %s',
+                                       fn, subkey)
                     continue
-                if fields[0] == subkey:
-                    try:
-                        time = float(fields[1])
-                    except Exception:
-                        self.log.exception('Error converting timestamp in '
-                                           'cache file %s/%s/%s-%s',
-                                           year, monthday, category, subkey)
-                        continue
-                    value = fields[-1]
-                    if value == '-':
-                        value = ''
-                    yield (time, value)
+                value = fields[-1]
+                if value == '-':
+                    value = ''
+                yield (time, value)
+
+    def _archive_name(self, year, monthday, category):
+        return path.join(self._archivepath, f'{year}-{monthday[:2]}',
+                         category + '.zip')
+
+    def _read_archived_histfile(self, year, monthday, category, subkey):
+        """Yield (time, value) for all lines of a subkey in an archived
+        history file.
+        """
+        fn = self._archive_name(year, monthday, category)
+        if not path.isfile(fn):
+            return
+        with self._archive_lock:
+            with zipfile.ZipFile(fn) as zf:
+                try:
+                    data = zf.read(monthday)
+                except KeyError:
+                    return
+        yield from self._scan_histlines(
+            data.decode('utf-8').splitlines(True), f'{fn}:{monthday}', subkey)
 
     def queryHistory(self, dbkey, fromtime, totime, interval):
-        # TODO: implement cache queries with interval here if possible
-        _ = interval
+        entries = self._queryHistory(dbkey, fromtime, totime)
+        if interval:
+            entries = downsample(entries, interval)
+        return entries
+
+    def _queryHistory(self, dbkey, fromtime, totime):
         category, subkey = dbkey[0].replace('/', '-'), dbkey[1]
         if fromtime >= self._midnight:
             days = [(self._year, self._currday)]
@@ -315,8 +653,8 @@ class FlatfileCacheDatabase(CacheDatabase):
         inrange = False
         for year, monthday in days:
             try:
-                for time, value in self._read_one_histfile(year, monthday,
-                                                           category, subkey):
+                for time, value in self._read_one_histfile(
+                        year, monthday, category, subkey, fromtime, totime):
                     if fromtime <= time <= totime:
                         if not inrange and last_before:
                             yield last_before
@@ -341,15 +679,15 @@ class FlatfileCacheDatabase(CacheDatabase):
                             time = currenttime()
                             if entry.ttl and (entry.time + entry.ttl < time):
                                 entry.expired = True
-                                for client in self._server._connected_clients:
-                                    client.update(f'{cat}/{subkey}',
-                                                  OP_TELLOLD, entry.value,
-                                                  time, None)
+                                self._server.updateClients(
+                                    f'{cat}/{subkey}', OP_TELLOLD, entry.value,
+                                    time, None)
                                 if fd is None:
                                     fd = self._create_fd(cat)
                                     # pylint: disable=unnecessary-dict-index-lookup
                                     self._cat[cat][0] = fd
-                                fd.write(f'{subkey}\t{time}\t-\t-\n')
+                                self._write_entry(cat, fd, subkey, time, '-',
+                                                  '-')
                                 fd.flush()
 
         error_logged = False
@@ -366,6 +704,79 @@ class FlatfileCacheDatabase(CacheDatabase):
                     self.log.exception('error during periodic cleanup')
                     error_logged = True
 
+    def _compact(self):
+        """Move old history files into the archive, checking every hour."""
+        error_logged = False
+        while not self._stoprequest:
+            nextrun = currenttime() + 3600
+            try:
+                self._compact_once()
+                error_logged = False
+            except Exception:
+                if not error_logged:
+                    self.log.exception('error during history compaction')
+                    error_logged = True
+            while not self._stoprequest and currenttime() < nextrun:
+                sleep(self._long_loop_delay)
+
+    def _compact_once(self):
+        limit = self._midnight - self.compactafter * 86400
+        lastday = path.realpath(path.join(self._basepath, 'lastday'))
+        for year in sorted(os.listdir(self._basepath)):
+            if not re.match(r'\d{4}$', year):
+                continue
+            for monthday in sorted(os.listdir(path.join(self._basepath,
+                                                        year))):
+                if self._stoprequest:
+                    return
+                m = re.match(r'(\d\d)-(\d\d)$', monthday)
+                if not m:
+                    continue
+                daydir = path.join(self._basepath, year, monthday)
+                daystart = mktime((int(year), int(m.group(1)),
+                                   int(m.group(2)), 0, 0, 0, 0, 0, -1))
+                if daystart >= limit or path.realpath(daydir) == lastday:
+                    continue
+                self._compact_day(year, monthday)
+
+    def _compact_day(self, year, monthday):
+        """Move the history files of one day into the archives."""
+        daydir = path.join(self._basepath, year, monthday)
+        self.log.info('moving history files of %s/%s into the archive',
+                      year, monthday)
+        for category in os.listdir(daydir):
+            filename = path.join(daydir, category)
+            archive = self._archive_name(year, monthday, category)
+            ensureDirectory(path.dirname(archive))
+            # append to a copy, so that the archive is never left corrupted
+            tmpname = archive + '.tmp'
+            with self._archive_lock:
+                if path.isfile(archive):
+                    shutil.copyfile(archive, tmpname)
+                with zipfile.ZipFile(tmpname, 'a', zipfile.ZIP_DEFLATED) as zf:
+                    # the day can already be there, if compaction was
+                    # interrupted before removing the file
+                    if monthday not in zf.namelist():
+                        zf.write(filename, monthday)
+                os.replace(tmpname, archive)
+            os.unlink(filename)
+            for other in (path.join(self._basepath, category, year, monthday),
+                          path.join(self._indexpath, year, monthday, category)):
+                if path.lexists(other):
+                    os.unlink(other)
+            self._remove_empty_dirs(path.join(self._basepath, category, year),
+                                    path.join(self._basepath, category))
+        self._remove_empty_dirs(path.join(self._indexpath, year, monthday),
+                                path.join(self._indexpath, year),
+                                daydir, path.join(self._basepath, year))
+
+    def _remove_empty_dirs(self, *dirs):
+        for dirname in dirs:
+            try:
+                os.rmdir(dirname)
+            except OSError:
+                pass
+
     def updateEntries(self, categories, subkey, no_store, entry):
         now = currenttime()
         real_update = True
@@ -400,8 +811,8 @@ class FlatfileCacheDatabase(CacheDatabase):
                             fd = self._create_fd(cat)
                             self._cat[cat][0] = fd
                         ttlcol = entry.ttl and '-' or (entry.value and '+' or '-')
-                        fd.write(f'{subkey}\t{entry.time}\t{ttlcol}'
-                                 f'\t{entry.value or "-"}\n')
+                        self._write_entry(cat, fd, subkey, entry.time, ttlcol,
+                                          entry.value or '-')
                         fd.flush()
 
         return real_update
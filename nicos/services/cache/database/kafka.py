@@ -142,9 +142,8 @@ class KafkaCacheDatabase(MemoryCacheDatabase):
                     time = currenttime()
                     if entry.ttl and (entry.time + entry.ttl < time):
                         entry.expired = True
-                        for client in self._server._connected_clients:
-                            client.update(key, OP_TELLOLD, entry.value, time,
-                                          None)
+                        self._server.updateClients(key, OP_TELLOLD,
+                                                   entry.value, time, None)
 
         error_logged = False
         while not self._stoprequest:
@@ -22,10 +22,13 @@
 # *****************************************************************************
 
 import threading
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import deque
+from time import time as currenttime
 
-from nicos.core import Param, intrange
-from nicos.services.cache.database.base import CacheDatabase
+from nicos.core import Attach, Param, floatrange, intrange
+from nicos.services.cache.database.base import CacheDatabase, downsample
 from nicos.services.cache.entry import CacheEntry
 
 
@@ -92,7 +95,12 @@ class MemoryCacheDatabaseWithHistory(MemoryCacheDatabase):
         return real_update
 
     def queryHistory(self, dbkey, fromtime, totime, interval):
-        _ = interval
+        entries = self._queryHistory(dbkey, fromtime, totime)
+        if interval:
+            entries = downsample(entries, interval)
+        return entries
+
+    def _queryHistory(self, dbkey, fromtime, totime):
         inrange = False
         # return the first value before the range too
         last_before = None
@@ -111,3 +119,215 @@ class MemoryCacheDatabaseWithHistory(MemoryCacheDatabase):
                 yield last_before
         except Exception:
             self.log.exception('error reading store for history query')
+
+
+class HistoryRing:
+    """In-memory history of cache entries, bounded by age and memory.
+
+    The history is partitioned by time: each partition holds, for every key
+    updated within its time span, arrays of times and values.  Old partitions
+    are dropped as a whole when they exceed the maximum age or the memory
+    limit.  The last value of each key in a dropped partition is kept, so that
+    queries can return the last value before the start of the range.
+
+    Only entries since `since` (the creation of the ring or the end of the
+    last dropped partition) are complete; older entries are not kept.
+    """
+
+    def __init__(self, maxage, maxmemory, partitions=48):
+        self.maxage = maxage
+        self.maxmemory = maxmemory
+        self.since = currenttime()
+        self._span = max(maxage / partitions, 1)
+        self._lock = threading.Lock()
+        # ordered list of (partition number, {dbkey: (times, values)}), and
+        # the list of partition numbers for bisection
+        self._parts = []
+        self._partnos = []
+        # last value of each key before self.since
+        self._before = {}
+        self._memory = 0
+        self._partmemory = {}
+
+    def setBefore(self, dbkey, entry):
+        """Set the last value of a key before the start of the ring."""
+        with self._lock:
+            self._before[dbkey] = CacheEntry(entry.time, None, entry.value)
+
+    def add(self, dbkey, time, value):
+        if time < self.since:
+            return
+        partno = int(time // self._span)
+        with self._lock:
+            parts = self._parts
+            if not parts or partno > self._partnos[-1]:
+                part = {}
+                parts.append((partno, part))
+                self._partnos.append(partno)
+                self._expire(time - self.maxage)
+            else:
+                i = bisect_left(self._partnos, partno)
+                if self._partnos[i] != partno:
+                    parts.insert(i, (partno, {}))
+                    self._partnos.insert(i, partno)
+                part = parts[i][1]
+            if dbkey not in part:
+                part[dbkey] = (array('d'), [])
+            times, values = part[dbkey]
+            if not times or time >= times[-1]:
+                times.append(time)
+                values.append(value)
+            else:
+                i = bisect_right(times, time)
+                times.insert(i, time)
+                values.insert(i, value)
+            # approximate size of the time, list slot and string
+            size = 64 + len(value)
+            self._memory += size
+            self._partmemory[partno] = self._partmemory.get(partno, 0) + size
+            while self._memory > self.maxmemory and len(parts) > 1:
+                self._drop()
+
+    def _expire(self, limit):
+        while self._parts and (self._parts[0][0] + 1) * self._span < limit:
+            self._drop()
+
+    def _drop(self):
+        partno, part = self._parts.pop(0)
+        self._partnos.pop(0)
+        for dbkey, (times, values) in part.items():
+            for i in range(len(times) - 1, -1, -1):
+                if values[i]:
+                    self._before[dbkey] = CacheEntry(times[i], None,
+                                                     values[i])
+                    break
+        self._memory -= self._partmemory.pop(partno, 0)
+        self.since = max(self.since, (partno + 1) * self._span)
+
+    def query(self, dbkey, fromtime, totime):
+        """Return a list of CacheEntries for the given key and timespan,
+        including the last entry with a value before the start.
+        """
+        last_before = None
+        entries = []
+        with self._lock:
+            last_before = self._before.get(dbkey)
+            for partno, part in self._parts:
+                if partno * self._span > totime:
+                    break
+                if dbkey not in part:
+                    continue
+                times, values = part[dbkey]
+                start = bisect_left(times, fromtime)
+                for i in range(start - 1, -1, -1):
+                    if values[i]:
+                        last_before = CacheEntry(times[i], None, values[i])
+                        break
+                end = bisect_right(times, totime)
+                entries.extend(CacheEntry(times[i], None, values[i])
+                               for i in range(start, end))
+        if last_before is not None:
+            entries.insert(0, last_before)
+        return entries
+
+
+class HistoryRingCacheDatabase(MemoryCacheDatabase):
+    """Cache database that keeps the recent history in memory.
+
+    The history is kept in a `HistoryRing`, bounded by the *maxage* and
+    *maxmemory* parameters.  History queries that start within the kept
+    span are answered from memory, using binary search.
+
+    If a *store* database (e.g. flatfile or InfluxDB) is attached, all
+    updates are passed through to it, and it is used for current values and
+    for history queries reaching further back.  On startup, the ring is filled
+    with the history of the last *maxage* from the store.  Otherwise, current
+    values are kept in memory.
+    """
+
+    attached_devices = {
+        'store': Attach('Database to store values and query older history',
+                        CacheDatabase, optional=True),
+    }
+
+    parameters = {
+        'maxage':    Param('Maximum age of history entries kept in memory',
+                           type=floatrange(60), default=86400, unit='s'),
+        'maxmemory': Param('Approximate maximum memory used for the history '
+                           'entries', type=intrange(1 << 20, 1 << 40),
+                           default=100 << 20, unit='bytes'),
+    }
+
+    def doInit(self, mode):
+        MemoryCacheDatabase.doInit(self, mode)
+        self._ring = HistoryRing(self.maxage, self.maxmemory)
+
+    def initDatabase(self):
+        store = self._attached_store
+        if store:
+            store._server = self._server
+            store.initDatabase()
+            self._fillRing(store)
+
+    def _fillRing(self, store):
+        now = currenttime()
+        since = self._ring.since = now - self.maxage
+        nentries = 0
+        for dbkey, entry in list(store.iterEntries()):
+            try:
+                history = list(store.queryHistory(dbkey, since, now, 0))
+            except Exception:
+                self.log.warning('could not read history of %s from store',
+                                 dbkey, exc=1)
+                history = []
+            if not history:
+                # the current value is the last value before the ring starts
+                if entry.value and not entry.expired:
+                    self._ring.setBefore(dbkey, entry)
+                continue
+            for hentry in history:
+                if hentry.time < since:
+                    if hentry.value:
+                        self._ring.setBefore(dbkey, hentry)
+                else:
+                    self._ring.add(dbkey, hentry.time, hentry.value or '')
+                    nentries += 1
+        self.log.info('read %d history entries from the store', nentries)
+
+    def clearDatabase(self):
+        if self._attached_store:
+            self._attached_store.clearDatabase()
+
+    def getEntry(self, dbkey):
+        if self._attached_store:
+            return self._attached_store.getEntry(dbkey)
+        return MemoryCacheDatabase.getEntry(self, dbkey)
+
+    def iterEntries(self):
+        if self._attached_store:
+            return self._attached_store.iterEntries()
+        return MemoryCacheDatabase.iterEntries(self)
+
+    def updateEntries(self, categories, subkey, no_store, entry):
+        if self._attached_store:
+            real_update = self._attached_store.updateEntries(
+                categories, subkey, no_store, entry)
+        else:
+            real_update = MemoryCacheDatabase.updateEntries(
+                self, categories, subkey, no_store, entry)
+        if real_update and not no_store:
+            for cat in categories:
+                self._ring.add((cat, subkey), entry.time, entry.value or '')
+        return real_update
+
+    def coversHistory(self, fromtime):
+        return bool(self._attached_store) or fromtime >= self._ring.since
+
+    def queryHistory(self, dbkey, fromtime, totime, interval):
+        if fromtime < self._ring.since and self._attached_store:
+            return self._attached_store.queryHistory(dbkey, fromtime, totime,
+                                                     interval)
+        entries = self._ring.query(dbkey, fromtime, totime)
+        if interval:
+            return downsample(entries, interval)
+        return entries
@@ -0,0 +1,185 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""Replication of a primary cache server's data to a replica server."""
+
+import select
+import threading
+from time import sleep, time as currenttime
+
+from nicos.protocols.cache import BUFSIZE, CYCLETIME, DEFAULT_CACHE_PORT, \
+    END_MARKER, OP_ASK, OP_SUBSCRIBE, OP_TELL, OP_TELLOLD, OP_WILDCARD, \
+    line_pattern, msg_pattern
+from nicos.utils import closeSocket, createThread, tcpSocket
+
+
+class CacheReplicator:
+    """Keeps the database of a replica cache server in sync with a primary.
+
+    A connection to the primary server subscribes to all updates and then
+    requests all current values.  Every received update is told to the local
+    database, which also sends it to the local subscribers.
+
+    Modifications received by the replica from its clients are forwarded to
+    the primary over the same connection (see `forward`); lock requests and
+    history queries are sent over a second connection (see `request`).
+    """
+
+    def __init__(self, db, primary, log):
+        self.db = db
+        self.primary = primary
+        self.log = log
+        self._stoprequest = False
+        self._sock = None
+        self._sock_lock = threading.Lock()
+        self._reqsock = None
+        self._req_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = createThread('replicator', self._replicate)
+
+    def stop(self):
+        self._stoprequest = True
+        if self._thread:
+            self._thread.join()
+        with self._req_lock:
+            closeSocket(self._reqsock)
+            self._reqsock = None
+
+    def is_connected(self):
+        return self._sock is not None
+
+    def forward(self, line):
+        """Forward a line that modifies the database to the primary."""
+        with self._sock_lock:
+            if self._sock is None:
+                self.log.warning('not connected to primary, cannot forward '
+                                 'update %r', line)
+                return
+            try:
+                self._sock.sendall(line.encode() + b'\n')
+            except OSError as err:
+                self.log.warning('could not forward update %r: %s', line, err)
+
+    def request(self, line, timeout=5, history=False):
+        """Send a request to the primary and return the reply, or None if
+        the primary is not reachable.
+
+        If *history* is true, the request is a history query whose reply can
+        span many lines; it is terminated by requesting the end marker.
+        """
+        end = f'{END_MARKER}{OP_TELLOLD}\n'.encode() if history else b'\n'
+        with self._req_lock:
+            try:
+                if self._reqsock is None:
+                    self._reqsock = tcpSocket(self.primary, DEFAULT_CACHE_PORT,
+                                              timeout=timeout)
+                if history:
+                    line += f'\n{END_MARKER}{OP_ASK}'
+                self._reqsock.sendall(line.encode() + b'\n')
+                data = b''
+                while not data.endswith(end):
+                    newdata = self._reqsock.recv(BUFSIZE)
+                    if not newdata:
+                        raise OSError('primary closed connection')
+                    data += newdata
+                if history:
+                    data = data[:-len(end)]
+                return data.decode()
+            except OSError as err:
+                self.log.warning('request %r to primary failed: %s', line,
+                                 err)
+                closeSocket(self._reqsock)
+                self._reqsock = None
+                return None
+
+    def _replicate(self):
+        while not self._stoprequest:
+            try:
+                sock = tcpSocket(self.primary, DEFAULT_CACHE_PORT)
+            except OSError as err:
+                self.log.warning('unable to connect to primary %s: %s',
+                                 self.primary, err)
+                for _ in range(int(10 / CYCLETIME)):
+                    if self._stoprequest:
+                        return
+                    sleep(CYCLETIME)
+                continue
+            self.log.info('connected to primary %s', self.primary)
+            try:
+                # subscribe first, so that no update is missed between
+                # getting the current values and subscribing
+                sock.sendall(f'@{OP_SUBSCRIBE}\n@{OP_WILDCARD}\n'.encode())
+                with self._sock_lock:
+                    self._sock = sock
+                self._receive(sock)
+            except Exception:
+                self.log.warning('error in connection to primary', exc=1)
+            with self._sock_lock:
+                self._sock = None
+            closeSocket(sock)
+            if not self._stoprequest:
+                self.log.warning('disconnected from primary %s, reconnecting',
+                                 self.primary)
+
+    def _receive(self, sock):
+        data = b''
+        while not self._stoprequest:
+            res = select.select([sock], [], [], CYCLETIME)
+            if not res[0]:
+                continue
+            newdata = sock.recv(BUFSIZE)
+            if not newdata:
+                return
+            data += newdata
+            i = 0
+            match = line_pattern.match(data)
+            while match:
+                self._apply(match.group(1).decode())
+                i = match.end()
+                match = line_pattern.match(data, i)
+            data = data[i:]
+
+    def _apply(self, line):
+        match = msg_pattern.match(line)
+        if not match:
+            self.log.warning('garbled line from primary: %r', line)
+            return
+        time, _, ttl, _, key, op, value = match.groups()
+        if op not in (OP_TELL, OP_TELLOLD):
+            return
+        time = float(time) if time else currenttime()
+        ttl = float(ttl) if ttl else None
+        try:
+            category, subkey = key.rsplit('/', 1)
+        except ValueError:
+            category, subkey = 'nocat', key
+        # an update can overtake the reply of the request for all values
+        entry = self.db.getEntry((category, subkey))
+        if entry is not None and entry.time and entry.time > time:
+            return
+        if op == OP_TELLOLD:
+            # expired on the primary: expire locally as soon as possible
+            ttl = 0.01
+        self.db.tell(key, value or None, time, ttl, None)
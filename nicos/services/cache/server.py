@@ -36,40 +36,70 @@ line protocol.
 
 import queue
 import select
+import selectors
 import socket
 import threading
 from time import sleep, time as currenttime
 
 from nicos import config, session
-from nicos.core import Attach, Device, Param, host
+from nicos.core import Attach, Device, Param, host, none_or
 from nicos.protocols.cache import BUFSIZE, CYCLETIME, DEFAULT_CACHE_PORT, \
     OP_ASK, OP_LOCK, OP_REWRITE, OP_SUBSCRIBE, OP_TELL, OP_TELLOLD, \
     OP_UNSUBSCRIBE, OP_WILDCARD, line_pattern, msg_pattern
 from nicos.services.cache.database import CacheDatabase
+from nicos.services.cache.replica import CacheReplicator
+from nicos.services.cache.subscriptions import SubscriptionIndex
 from nicos.utils import closeSocket, createThread, getSysInfo, loggers, \
     parseHostPort
 
+# timeout for sending data to a client
+SEND_TIMEOUT = 5
+# maximum number of queued messages to send at once
+SEND_BATCH = 1000
+
 
 class CacheWorker:
     """Worker thread class for the cache server.
 
     One worker starts two threads: one for receiving data from the connection,
-    and one for sending.  Data to send must be posited in `self.send_queue`.
+    and one for sending.  Data to send must be posited in `self.send_queue`
+    using `send`.  The sender thread sends everything queued at once.
+
+    If *coalescelimit* is nonzero and more messages are waiting to be sent,
+    updates are coalesced: only the newest update per key is kept until the
+    client has caught up.
+
+    If the server is a replica, *replicator* is the `CacheReplicator` that
+    modifications, lock requests and history queries it can't answer are
+    forwarded to.
     """
 
-    def __init__(self, db, sock, name, loglevel):
+    def __init__(self, db, sock, name, loglevel, index=None, coalescelimit=0,
+                 replicator=None):
         self.name = name
         # actual value handling is done by the database object
         self.db = db
+        # replicator to forward modifications to, if this is a replica
+        self.replicator = replicator
+        # the server's subscription index, if present
+        self.index = index
         # the socket object
         self.sock = sock
         # timeout for send (recv is covered by select timeout)
-        self.sock.settimeout(5)
+        self.sock.settimeout(SEND_TIMEOUT)
         # list of subscriptions
         self.updates_on = set()
         # list of subscriptions with timestamp requested
         self.ts_updates_on = set()
         self.stoprequest = False
+        # coalesced updates: key -> message
+        self.coalescelimit = coalescelimit
+        self.coalesced = {}
+        self.coalesce_lock = threading.Lock()
+        # replies held back until forwarded requests are answered, as
+        # [complete, data] pairs in order of the requests
+        self.held_replies = []
+        self.reply_lock = threading.Lock()
 
         self.log = session.getLogger(name)
         self.log.setLevel(loggers.loglevels[loglevel])
@@ -78,12 +108,80 @@ class CacheWorker:
         self.start_sender(name)
 
         # start receiver thread
-        self.receiver = createThread('receiver %s' % name, self._receiver_thread)
+        self.start_receiver(name)
 
     def start_sender(self, name):
         self.send_queue = queue.Queue()
         self.sender = createThread('sender %s' % name, self._sender_thread)
 
+    def start_receiver(self, name):
+        self.receiver = createThread('receiver %s' % name, self._receiver_thread)
+
+    def send(self, data):
+        """Queue a string for sending to the client."""
+        self.send_queue.put(data)
+
+    def send_reply(self, data):
+        """Queue a direct reply to a request of the client.
+
+        Coalesced updates are older than the reply, so they are queued first,
+        otherwise the client could overwrite the reply with a stale value.
+
+        While requests forwarded to the primary are outstanding, the reply is
+        held back to keep the order of replies.
+        """
+        with self.reply_lock:
+            if self.held_replies:
+                self.held_replies.append([True, data])
+                return
+            self._send_reply(data)
+
+    def _send_reply(self, data):
+        if self.coalesced:
+            self.send(''.join(self.take_coalesced()))
+        self.send(data)
+
+    def _forward(self, line, fallback, history=False):
+        """Forward a request to the primary in a separate thread, so that
+        a slow primary doesn't block the handling of other requests.
+
+        The reply is sent once it arrives; *fallback* is called to get the
+        reply if the primary is not reachable.
+        """
+        slot = [False, None]
+        with self.reply_lock:
+            self.held_replies.append(slot)
+        createThread('forwarder %s' % self.name, self._forward_thread,
+                     (line, fallback, history, slot))
+        return []
+
+    def _forward_thread(self, line, fallback, history, slot):
+        reply = self.replicator.request(line, history=history)
+        if reply is None:
+            try:
+                reply = ''.join(fallback())
+            except Exception as err:
+                self.log.warning('error handling line %r', line, exc=err)
+                reply = ''
+        with self.reply_lock:
+            slot[:] = [True, reply]
+            # send all replies that are complete now, in order
+            while self.held_replies and self.held_replies[0][0]:
+                data = self.held_replies.pop(0)[1]
+                if data:
+                    self._send_reply(data)
+
+    def backlog(self):
+        """Return the number of messages waiting to be sent."""
+        return self.send_queue.qsize()
+
+    def take_coalesced(self):
+        """Return and clear the list of coalesced update messages."""
+        with self.coalesce_lock:
+            msgs = list(self.coalesced.values())
+            self.coalesced = {}
+        return msgs
+
     def __str__(self):
         return 'worker(%s)' % self.name
 
@@ -107,13 +205,13 @@ class CacheWorker:
 
     def _sender_thread(self):
         while not self.stoprequest:
-            data = self.send_queue.get()
+            data = self._collect_data()
             # self.log.debug('sending: %r', data)
             if self.sock is None:  # connection already closed
                 return
             while True:
                 try:
-                    self.sock.sendall(data.encode())
+                    self.sock.sendall(data)
                 except socket.timeout:
                     self.log.warning('send timed out, shutting down')
                     self.closedown()
@@ -130,10 +228,24 @@ class CacheWorker:
                     self.closedown()
                 break
 
+    def _collect_data(self):
+        # wait for data, then take everything else queued at the moment, to
+        # send it with a single call
+        msgs = [self.send_queue.get()]
+        try:
+            while len(msgs) < SEND_BATCH:
+                msgs.append(self.send_queue.get_nowait())
+        except queue.Empty:
+            # coalesced updates are newer than everything in the queue, since
+            # replies take the coalesced updates along
+            if self.coalesced:
+                msgs.extend(self.take_coalesced())
+        return ''.join(msgs).encode()
+
     def _receiver_thread(self):
         data = b''
         while not self.stoprequest:
-            data = self._process_data(data, self.send_queue.put)
+            data = self._process_data(data, self.send_reply)
             # wait for data with 3 times the client timeout
             try:
                 res = select.select([self.sock], [], [], CYCLETIME * 3)
@@ -210,6 +322,22 @@ class CacheWorker:
         if ttlop == '-' and ttl:
             ttl = ttl - time
 
+        # on a replica, modifications are also sent to the primary; they are
+        # applied locally as well since the primary doesn't send them back
+        if self.replicator is not None:
+            if op in (OP_TELL, OP_TELLOLD, OP_REWRITE):
+                self.replicator.forward(line)
+            elif op == OP_LOCK:
+                # if the primary is not reachable, deny the lock
+                return self._forward(line, lambda: [key + OP_LOCK +
+                                                    'primary\n'])
+            elif op == OP_ASK and ttl is not None and \
+                    not self.db.coversHistory(time):
+                # history from before the replica started is only available
+                # on the primary; answer locally if it is not reachable
+                return self._forward(line, lambda: self.db.ask_hist(
+                    key, time, time + ttl, interval=value), history=True)
+
         # dispatch operations to database object
         if op == OP_TELL:
             self.db.tell(key, value, time, ttl, self)
@@ -227,11 +355,15 @@ class CacheWorker:
                 self.ts_updates_on.add(key)
             else:
                 self.updates_on.add(key)
+            if self.index is not None:
+                self.index.add(self, key, bool(tsop))
         elif op == OP_UNSUBSCRIBE:
             if tsop:
                 self.ts_updates_on.discard(key)  # note: discard does not raise
             else:
                 self.updates_on.discard(key)
+            if self.index is not None:
+                self.index.discard(self, key, bool(tsop))
         elif op == OP_TELLOLD:
             # doesn't happen with normal clients, but e.g. the cache collector
             self.db.tell(key, value, time, 0.01, self)
@@ -243,36 +375,56 @@ class CacheWorker:
 
     def update(self, key, op, value, time, ttl):
         """Check if we need to send the update given."""
-        # make sure line has at least a default timestamp
         for mykey in self.ts_updates_on:
             # do a substring match on key
             if mykey in key:
-                if not time:
-                    time = currenttime()
-                # self.log.debug('sending update of %s to %s', key, value)
-                if ttl is not None:
-                    msg = f'{time}+{ttl}@{key}{op}{value}\n'
-                else:
-                    msg = f'{time}@{key}{op}{value}\n'
-                self.send_queue.put(msg)
+                self.send_update(key, op, value, time, ttl, True)
                 return  # send at most one update
         # same for requested updates without timestamp
         for mykey in self.updates_on:
             if mykey in key:
-                # self.log.debug('sending update of %s to %s', key, value)
-                self.send_queue.put(key + op + value + '\n')
+                self.send_update(key, op, value, time, ttl, False)
                 return  # send at most one update
 
+    def send_update(self, key, op, value, time, ttl, ts):
+        """Send an update the client is subscribed to."""
+        # self.log.debug('sending update of %s to %s', key, value)
+        if ts:
+            # make sure line has at least a default timestamp
+            if not time:
+                time = currenttime()
+            if ttl is not None:
+                msg = f'{time}+{ttl}@{key}{op}{value}\n'
+            else:
+                msg = f'{time}@{key}{op}{value}\n'
+        else:
+            msg = key + op + value + '\n'
+        if self.coalescelimit and (self.coalesced or
+                                   self.backlog() > self.coalescelimit):
+            # the client is falling behind: keep only the newest update per
+            # key until everything queued before has been sent
+            with self.coalesce_lock:
+                wakeup = not self.coalesced
+                # remove first, so that the key moves to the end
+                self.coalesced.pop(key, None)
+                self.coalesced[key] = msg
+            if wakeup:
+                self.send('')
+        else:
+            self.send(msg)
+
 
 class CacheUDPWorker(CacheWorker):
     """Special subclass for handling UDP requests."""
 
-    def __init__(self, db, sock, name, data, remoteaddr, loglevel):
+    def __init__(self, db, sock, name, data, remoteaddr, loglevel,
+                 replicator=None):
         # "data" is what we received over the UDP socket, "remoteaddr" is the
         # address for replies
         self.data = data
         self.remoteaddr = remoteaddr
-        CacheWorker.__init__(self, db, sock, name, loglevel)
+        CacheWorker.__init__(self, db, sock, name, loglevel,
+                             replicator=replicator)
 
     def start_sender(self, name):
         pass
@@ -295,6 +447,13 @@ class CacheUDPWorker(CacheWorker):
             self.log.warning('error handling UDP data %r', self.data, exc=err)
         self.closedown()
 
+    def _forward(self, line, fallback, history=False):
+        # replies are sent synchronously, so wait for the primary
+        reply = self.replicator.request(line, history=history)
+        if reply is None:
+            return fallback()
+        return [reply]
+
     def _sendall(self, data, maxsize=1496):
         """Replacement for sendall() on TCP sockets: send all data via UDP
         in as many packets as needed.
@@ -313,9 +472,145 @@ class CacheUDPWorker(CacheWorker):
         return datalen
 
 
+class CacheLoopWorker(CacheWorker):
+    """Worker class for the event loop mode of the cache server.
+
+    No threads are started: the connection is served by the event loop of the
+    server, which calls `handle_read` and `handle_write` when the socket is
+    ready.  Replies and updates are collected in an output buffer.
+    """
+
+    def __init__(self, db, sock, name, loglevel, server):
+        self.server = server
+        # received, but not yet processed data
+        self.data = b''
+        # messages not yet sent, the data currently being sent, and the time
+        # when both were last empty
+        self.outqueue = []
+        self.outbuf = b''
+        self.outlock = threading.Lock()
+        self.lastsend = currenttime()
+        # events the socket is registered for in the event loop
+        self.mask = selectors.EVENT_READ
+        CacheWorker.__init__(self, db, sock, name, loglevel,
+                             server._subscriptions, server.coalescelimit,
+                             server._replicator)
+        self.sock.setblocking(False)
+
+    def start_sender(self, name):
+        pass
+
+    def start_receiver(self, name):
+        pass
+
+    def is_active(self):
+        return not self.stoprequest
+
+    def join(self):
+        pass
+
+    def closedown(self):
+        # the socket must be unregistered from the event loop before closing,
+        # so leave the actual work to the loop
+        self.stoprequest = True
+        self.server._wakeup(self)
+
+    def send(self, data):
+        with self.outlock:
+            if not self.outbuf and not self.outqueue:
+                self.lastsend = currenttime()
+            self.outqueue.append(data)
+        self.server._wakeup(self)
+
+    def backlog(self):
+        return len(self.outqueue)
+
+    def send_timed_out(self):
+        """Return true if pending output could not be sent for too long."""
+        return bool(self.outbuf or self.outqueue) and \
+            currenttime() > self.lastsend + SEND_TIMEOUT
+
+    def handle_read(self):
+        try:
+            newdata = self.sock.recv(BUFSIZE)
+        except BlockingIOError:
+            return
+        except Exception:
+            newdata = b''
+        if not newdata:
+            # connection closed by the other end
+            self.closedown()
+            return
+        self.data = self._process_data(self.data + newdata,
+                                       self.send_reply)
+
+    def handle_write(self):
+        """Send as much of the output buffer as possible.
+
+        Returns true if data is left over for the next write event.
+        """
+        with self.outlock:
+            if not self.outbuf:
+                if self.outqueue:
+                    self.outqueue.extend(self.take_coalesced())
+                    self.outbuf = ''.join(self.outqueue).encode()
+                    self.outqueue = []
+                if not self.outbuf:
+                    return False
+            try:
+                sent = self.sock.send(self.outbuf)
+            except BlockingIOError:
+                sent = 0
+            except OSError as err:
+                self.log.warning('other end closed, shutting down', exc=err)
+                self.stoprequest = True
+                return False
+            if sent:
+                self.outbuf = self.outbuf[sent:]
+                self.lastsend = currenttime()
+            if self.send_timed_out():
+                self.log.warning('send timed out, shutting down')
+                self.stoprequest = True
+                return False
+            return bool(self.outbuf)
+
+
+class CacheLoopUDPWorker(CacheUDPWorker):
+    """UDP worker for the event loop mode, handling the data synchronously.
+
+    On a replica, requests may have to wait for the primary, so the data is
+    handled in a thread as in threaded mode.
+    """
+
+    def start_receiver(self, name):
+        if self.replicator is not None:
+            CacheUDPWorker.start_receiver(self, name)
+        else:
+            self._receiver_thread()
+
+    def join(self):
+        pass
+
+
 class CacheServer(Device):
     """
     The server class.
+
+    By default, every connected client is served by two threads.  With the
+    *eventloop* parameter set, all TCP and UDP clients are instead handled by
+    a single thread using an event loop, which scales better with a large
+    number of connections.
+
+    To protect the server against slow clients, *coalescelimit* can be set:
+    if more messages are waiting to be sent to a client, only the newest
+    update for each key is kept.
+
+    If *primary* is set, the server is a replica of the given primary server:
+    it receives all values and updates from the primary, and serves reads
+    from its own database.  Modifications by its clients are forwarded to the
+    primary, and locks are only granted by the primary.  The attached
+    database of a replica should normally be kept in memory, e.g. a
+    `HistoryRingCacheDatabase` to also serve recent history.
     """
 
     parameters = {
@@ -323,6 +618,16 @@ class CacheServer(Device):
                         type=host(defaultport=DEFAULT_CACHE_PORT),
                         mandatory=True,
                         ext_desc='The default port is ``14869``.'),
+        'eventloop': Param('Serve all clients from a single event loop '
+                           'instead of two threads per client',
+                           type=bool, default=False),
+        'coalescelimit': Param('Number of pending messages for a client above '
+                               'which only the newest update per key is '
+                               'kept, 0 to disable', type=int, default=0),
+        'primary': Param('Address of the primary server (host or host:port) '
+                         'if this server is a read replica',
+                         type=none_or(host(defaultport=DEFAULT_CACHE_PORT)),
+                         default=None),
     }
 
     attached_devices = {
@@ -344,12 +649,26 @@ class CacheServer(Device):
         self._connected_clients = []
         self._attached_db._server = self
         self._connectionLock = threading.Lock()
+        # for the event loop mode: workers with pending output or closedown,
+        # and the socket pair used to wake up the loop from other threads
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._loop_ident = None
+        self._waker = None
+        # index of the subscriptions of all clients
+        self._subscriptions = SubscriptionIndex()
+        # replication from the primary server, if this is a replica
+        self._replicator = None
 
     def start(self, *startargs):
         if config.instrument == 'demo' and 'clear' in startargs:
             self._attached_db.clearDatabase()
         self._attached_db.initDatabase()
         self.storeSysInfo()
+        if self.primary:
+            self._replicator = CacheReplicator(self._attached_db,
+                                               self.primary, self.log)
+            self._replicator.start()
         self._worker = createThread('server', self._server_thread)
 
     def storeSysInfo(self):
@@ -400,6 +719,15 @@ class CacheServer(Device):
                           self._boundto[0], self._boundto[1])
 
         # now enter main serving loop
+        if self.eventloop:
+            self._event_loop()
+        else:
+            self._threaded_loop()
+        if self._serversocket:
+            closeSocket(self._serversocket)
+        self._serversocket = None
+
+    def _threaded_loop(self):
         while not self._stoprequest:
             # loop through connections, first to remove dead ones,
             # secondly to try to reconnect
@@ -408,6 +736,7 @@ class CacheServer(Device):
                     self.log.info('client connection %s closed', addr)
                     client.closedown()
                     client.join()  # wait for threads to end
+                    self._subscriptions.remove_client(client)
                     with self._connectionLock:
                         del self._connected[addr]
                         self._connected_clients = list(self._connected.values())
@@ -434,7 +763,10 @@ class CacheServer(Device):
                     addr = 'tcp://%s:%d' % addr
                     self.log.info('new connection from %s', addr)
                     self._connected[addr] = CacheWorker(
-                        self._attached_db, conn, name=addr, loglevel=self.loglevel)
+                        self._attached_db, conn, name=addr,
+                        loglevel=self.loglevel, index=self._subscriptions,
+                        coalescelimit=self.coalescelimit,
+                        replicator=self._replicator)
                     self._connected_clients = list(self._connected.values())
                 elif self._serversocket_udp in res[0]:
                     # UDP data came in
@@ -443,11 +775,123 @@ class CacheServer(Device):
                     self.log.info('new connection from %s', nice_addr)
                     self._connected[nice_addr] = CacheUDPWorker(
                         self._attached_db, self._serversocket_udp, name=nice_addr,
-                        data=data, remoteaddr=addr, loglevel=self.loglevel)
+                        data=data, remoteaddr=addr, loglevel=self.loglevel,
+                        replicator=self._replicator)
                     self._connected_clients = list(self._connected.values())
+
+    def _event_loop(self):
+        sel = selectors.DefaultSelector()
+        self._waker = socket.socketpair()
+        for sock in self._waker:
+            sock.setblocking(False)
+        self._loop_ident = threading.get_ident()
+        sel.register(self._waker[0], selectors.EVENT_READ)
         if self._serversocket:
-            closeSocket(self._serversocket)
-        self._serversocket = None
+            sel.register(self._serversocket, selectors.EVENT_READ)
+        if self._serversocket_udp:
+            sel.register(self._serversocket_udp, selectors.EVENT_READ)
+
+        lastcheck = currenttime()
+        while not self._stoprequest:
+            for key, events in sel.select(CYCLETIME * 3):
+                if key.fileobj is self._waker[0]:
+                    try:
+                        self._waker[0].recv(BUFSIZE)
+                    except OSError:
+                        pass
+                elif key.fileobj is self._serversocket:
+                    # TCP connection came in
+                    try:
+                        conn, addr = self._serversocket.accept()
+                    except OSError:
+                        continue
+                    addr = 'tcp://%s:%d' % addr
+                    self.log.info('new connection from %s', addr)
+                    client = CacheLoopWorker(self._attached_db, conn, name=addr,
+                                             loglevel=self.loglevel,
+                                             server=self)
+                    sel.register(conn, client.mask, client)
+                    with self._connectionLock:
+                        self._connected[addr] = client
+                        self._connected_clients = list(self._connected.values())
+                elif key.fileobj is self._serversocket_udp:
+                    # UDP data came in: handled right away, the worker doesn't
+                    # need to be kept around
+                    data, addr = self._serversocket_udp.recvfrom(3072)
+                    nice_addr = 'udp://%s:%d' % addr
+                    self.log.info('new connection from %s', nice_addr)
+                    CacheLoopUDPWorker(
+                        self._attached_db, self._serversocket_udp,
+                        name=nice_addr, data=data, remoteaddr=addr,
+                        loglevel=self.loglevel, replicator=self._replicator)
+                else:
+                    client = key.data
+                    if events & selectors.EVENT_READ and not client.stoprequest:
+                        client.handle_read()
+                    if events & selectors.EVENT_WRITE:
+                        with self._pending_lock:
+                            self._pending.add(client)
+            # clients that are stuck get no more write events, so check for
+            # timed out output here
+            if currenttime() > lastcheck + CYCLETIME:
+                lastcheck = currenttime()
+                for client in self._connected_clients:
+                    if not client.stoprequest and client.send_timed_out():
+                        client.log.warning('send timed out, shutting down')
+                        client.stoprequest = True
+                        with self._pending_lock:
+                            self._pending.add(client)
+            # now flush output of the clients that got new data, and remove
+            # dead connections
+            with self._pending_lock:
+                pending, self._pending = self._pending, set()
+            for client in pending:
+                if client.sock is None:
+                    continue  # already removed
+                more = not client.stoprequest and client.handle_write()
+                if client.stoprequest:
+                    self._remove_loop_client(sel, client)
+                    continue
+                mask = selectors.EVENT_READ
+                if more:
+                    mask |= selectors.EVENT_WRITE
+                if mask != client.mask:
+                    client.mask = mask
+                    sel.modify(client.sock, mask, client)
+
+        for client in list(self._connected.values()):
+            self._remove_loop_client(sel, client)
+        for sock in self._waker:
+            closeSocket(sock)
+        sel.close()
+
+    def _remove_loop_client(self, sel, client):
+        self.log.info('client connection %s closed', client.name)
+        sel.unregister(client.sock)
+        CacheWorker.closedown(client)
+        self._subscriptions.remove_client(client)
+        with self._connectionLock:
+            self._connected.pop(client.name, None)
+            self._connected_clients = list(self._connected.values())
+
+    def updateClients(self, key, op, value, time, ttl, from_client=None):
+        """Send an update to all clients subscribed to the key, except the
+        client it came from.
+        """
+        for client, ts in self._subscriptions.match(key).items():
+            if client is not from_client:
+                client.send_update(key, op, value, time, ttl, ts)
+
+    def _wakeup(self, client):
+        """Mark a client of the event loop for sending or closedown."""
+        with self._pending_lock:
+            self._pending.add(client)
+        if threading.get_ident() != self._loop_ident:
+            try:
+                self._waker[1].send(b'\x00')
+            except OSError:
+                # loop is finished or the wakeup is already pending
+                pass
 
     def wait(self):
         while not self._stoprequest:
@@ -468,6 +912,9 @@ class CacheServer(Device):
                 self.log.info('waiting for %s', client)
                 client.closedown()  # make sure, the connection closes down
                 client.join()
+        if self._replicator:
+            self.log.info('waiting for replicator')
+            self._replicator.stop()
         self.log.info('waiting for server')
         self._worker.join()
         self.log.info('server finished')
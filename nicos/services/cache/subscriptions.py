@@ -0,0 +1,145 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""Index of client subscriptions for the cache server."""
+
+import threading
+
+
+class SubscriptionIndex:
+    """Maps cache keys to the clients subscribed to them.
+
+    Subscriptions are substrings of the key.  All subscription strings are
+    compiled into an Aho-Corasick automaton, so that finding the subscribers
+    for a key takes time proportional to the key length and the number of
+    matching subscriptions, not to the total number of subscriptions.
+
+    The automaton is rebuilt lazily when the set of subscription strings
+    changes; adding or removing a client for an existing string is cheap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # map subscription string -> frozenset of (client, with_timestamp);
+        # the sets are replaced, not modified, so that lookups need no lock
+        self._subs = {}
+        # (goto, fail, output) tables of the automaton, None if outdated
+        self._automaton = None
+
+    def __len__(self):
+        return sum(len(clients) for clients in self._subs.values())
+
+    def add(self, client, key, ts):
+        """Subscribe *client* to all keys containing *key*."""
+        with self._lock:
+            clients = self._subs.get(key)
+            if clients is None:
+                self._subs[key] = frozenset([(client, ts)])
+                self._automaton = None
+            else:
+                self._subs[key] = clients | {(client, ts)}
+
+    def discard(self, client, key, ts):
+        """Remove a subscription, if present."""
+        with self._lock:
+            clients = self._subs.get(key)
+            if clients is None or (client, ts) not in clients:
+                return
+            clients = clients - {(client, ts)}
+            if clients:
+                self._subs[key] = clients
+            else:
+                del self._subs[key]
+                self._automaton = None
+
+    def remove_client(self, client):
+        """Remove all subscriptions of the given client."""
+        with self._lock:
+            for key, clients in list(self._subs.items()):
+                remaining = frozenset(c for c in clients if c[0] is not client)
+                if remaining == clients:
+                    continue
+                if remaining:
+                    self._subs[key] = remaining
+                else:
+                    del self._subs[key]
+                    self._automaton = None
+
+    def match(self, key):
+        """Return a dictionary of client -> with_timestamp for all clients
+        that have a subscription matching *key*.
+
+        If a client has a matching subscription with timestamp, the value is
+        true.
+        """
+        automaton = self._automaton
+        if automaton is None:
+            automaton = self._build()
+        goto, fail, output = automaton
+        subs = self._subs
+        result = {}
+        matched = set(output[0])
+        state = 0
+        for char in key:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                matched.update(output[state])
+        for sub in matched:
+            for client, ts in subs.get(sub, ()):
+                if ts or client not in result:
+                    result[client] = ts
+        return result
+
+    def _build(self):
+        with self._lock:
+            if self._automaton is not None:
+                return self._automaton
+            goto = [{}]
+            output = [[]]
+            for sub in self._subs:
+                state = 0
+                for char in sub:
+                    nextstate = goto[state].get(char)
+                    if nextstate is None:
+                        nextstate = goto[state][char] = len(goto)
+                        goto.append({})
+                        output.append([])
+                    state = nextstate
+                output[state].append(sub)
+            # compute failure links breadth-first, merging the outputs of
+            # the failure state into each state
+            fail = [0] * len(goto)
+            queue = list(goto[0].values())
+            for state in queue:
+                for char, nextstate in goto[state].items():
+                    queue.append(nextstate)
+                    failstate = fail[state]
+                    while failstate and char not in goto[failstate]:
+                        failstate = fail[failstate]
+                    failstate = goto[failstate].get(char, 0)
+                    fail[nextstate] = failstate
+                    output[nextstate] = output[nextstate] + output[failstate]
+            self._automaton = (goto, fail, [tuple(o) for o in output])
+            return self._automaton
@@ -212,7 +212,11 @@ class WebhookForwarder(ForwarderBase, Device):
 
 
 class Collector(CacheKeyFilter, BaseCacheClient):
-    """The main service that enables cache update forwarding."""
+    """The main service that enables cache update forwarding.
+
+    If the *keyfilters* only consist of prefixes (like ``'dev/.*'``), the
+    collector only subscribes to these keys.
+    """
 
     attached_devices = {
         'forwarders': Attach('The services to submit keys to',
@@ -226,6 +230,8 @@ class Collector(CacheKeyFilter, BaseCacheClient):
     def doInit(self, mode):
         BaseCacheClient.doInit(self, mode)
         self._initFilters()
+        if self._prefixfilters and not self._regexfilters:
+            self._set_subscriptions(self._prefixfilters)
         for service in self._attached_forwarders:
             service._startWorker()
 
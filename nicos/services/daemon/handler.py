@@ -107,14 +107,31 @@ class ConnectionHandler:
     respectively.
     """
 
+    # whether the transport can skip superseded live data frames
+    can_drop_frames = False
+
     def __init__(self, daemon):
         self.daemon = daemon
         self.controller = daemon._controller
         # limit memory usage to 100 Megs
         self.event_queue = SizedQueue(100*1024*1024)
         self.event_mask = set()
+        # tuple of key prefixes of the cache events to send, None for all
+        self.cache_filter = None
+        # live data transfer options, see the "liveopts" command
+        self.blob_codec = None
+        self.drop_frames = False
+        # map detector -> sequence number of the latest queued live frame
+        self.live_frames = {}
         self.log = LoggerWrapper(self.daemon.log, '[new handler] ')
 
+    def blob_codecs(self):
+        """Return the blob compression codecs usable on this connection.
+
+        Transports that can compress live data blobs override this.
+        """
+        return ()
+
     def setIdent(self, ident):
         self.ident = ident
         self.log.setPrefix('[handler #%s] ' % ident)
@@ -240,19 +257,31 @@ class ConnectionHandler:
 
     # -- Event thread entry point ---------------------------------------------
 
+    def wants_event(self, event, data):
+        """Return true if the event should be sent to the client.
+
+        Called for every event before serializing and queueing it, so this
+        must be fast.
+        """
+        if event in self.event_mask:
+            return False
+        if event == 'cache' and self.cache_filter is not None:
+            return data[1].startswith(self.cache_filter)
+        return True
+
     def event_sender(self):
         """Take events from the handler instance's event queue and send them
         to the client.
         """
         self.log.info('event sender started')
         queue_get = self.event_queue.get
-        event_mask = self.event_mask
         while 1:
             item = queue_get()
             if item is stop_queue:
                 break
-            event, data, blobs = item
-            if event in event_mask:
+            event, data, blobs, frame = item
+            if frame is not None and self.live_frames.get(frame[0]) != frame[1]:
+                # superseded by a newer frame of the same detector
                 continue
             try:
                 self.send_event(event, data, blobs)
@@ -766,6 +795,49 @@ class ConnectionHandler:
         self.event_mask.difference_update(events)
         self.send_ok_reply(None)
 
+    @command()
+    def cachefilter(self, prefixes):
+        """Only send cache events for keys starting with one of the given
+        prefixes to the client.
+
+        :param prefixes: a serialized list of key prefixes (like ``'dev/'``
+           or ``'dev/value'``), or None to get all cache events again
+        :returns: ack
+        """
+        if prefixes is None:
+            self.cache_filter = None
+        else:
+            self.cache_filter = tuple(prefix.lower() for prefix in prefixes)
+        self.send_ok_reply(None)
+
+    @command()
+    def liveopts(self, opts):
+        """Set options for the transfer of live data (the blobs of
+        ``livedata`` events) to the client.
+
+        :param opts: a serialized dictionary with the keys
+
+           * ``'compress'`` -- a list of codec names the client can decode, in
+             order of preference; the blobs are then compressed with the first
+             one the connection supports
+           * ``'dropframes'`` -- if true, live frames that are superseded by a
+             newer frame of the same detector before they could be sent are
+             dropped instead of being sent late
+
+        :returns: a dictionary with the options in effect; ``'compress'`` is
+           the selected codec or None
+        """
+        codecs = self.blob_codecs()
+        self.blob_codec = None
+        for codec in opts.get('compress') or ():
+            if codec in codecs:
+                self.blob_codec = codec
+                break
+        self.drop_frames = bool(opts.get('dropframes')) and \
+            self.can_drop_frames
+        self.send_ok_reply({'compress': self.blob_codec,
+                            'dropframes': self.drop_frames})
+
     @command()
     def transfer(self, content):
         """Transfer a file to the server, encoded in base64.
@@ -23,6 +23,8 @@
 
 """Implementation of the "classic" daemon protocol: pickling, plain sockets."""
 
+import ipaddress
+import itertools
 import queue
 import socket
 import socketserver
@@ -36,6 +38,30 @@ from nicos.protocols.daemon.classic import ACK, ENQ, LENGTH, NAK, \
     PROTO_VERSION, READ_BUFSIZE, STX, code2command, event2code
 from nicos.services.daemon.handler import ConnectionHandler
 from nicos.utils import closeSocket, createThread
+from nicos.utils.compression import blobCodecs, compressBlob
+
+
+class CompressedBlobs(list):
+    """List of live data blobs that are sent compressed with *codec*.
+
+    The list items are the uncompressed blobs, so that the event queue size
+    accounting sees the same size on put and get.  Compression happens only
+    when the first event sender actually sends the blobs, and the result is
+    shared among all handlers using the same codec.
+    """
+
+    def __init__(self, codec, blobs):
+        list.__init__(self, blobs)
+        self.codec = codec
+        self._lock = threading.Lock()
+        self._compressed = None
+
+    def compressed(self):
+        with self._lock:
+            if self._compressed is None:
+                self._compressed = [compressBlob(self.codec, blob)
+                                    for blob in self]
+            return self._compressed
 
 
 class Server(BaseServer, socketserver.TCPServer):
@@ -48,6 +74,7 @@ class Server(BaseServer, socketserver.TCPServer):
         self._handlers = weakref.WeakValueDictionary()
         self._handler_ident = 0
         self._pending_clients = {}
+        self._frame_seq = itertools.count()
         socketserver.TCPServer.__init__(self, address, ServerTransport)
 
     # BaseServer methods
@@ -62,11 +89,36 @@ class Server(BaseServer, socketserver.TCPServer):
         self.server_close()
 
     def emit(self, event, data, blobs, handler=None):
-        data = self.serializer.serialize_event(event, data)
-        for hdlr in (handler,) if handler else self._handlers.values():
+        handlers = [hdlr for hdlr in
+                    ((handler,) if handler else self._handlers.values())
+                    if hdlr.wants_event(event, data)]
+        if not handlers:
+            return
+        frame = None
+        if event == 'livedata' and blobs:
+            frame = (data.get('det'), next(self._frame_seq))
+        # serialized data and blobs, per blob codec
+        payloads = {None: (self.serializer.serialize_event(event, data),
+                           blobs)}
+        for hdlr in handlers:
+            codec = frame and hdlr.blob_codec
+            if codec not in payloads:
+                payloads[codec] = (self.serializer.serialize_event(
+                    event, dict(data, blobcodec=codec)),
+                    CompressedBlobs(codec, blobs))
+            hdlr_frame = frame if frame and hdlr.drop_frames else None
+            if hdlr_frame:
+                # must be set before queueing, see event_sender()
+                prev = hdlr.live_frames.get(frame[0])
+                hdlr.live_frames[frame[0]] = frame[1]
             try:
-                hdlr.event_queue.put((event, data, blobs), True, 0.1)
+                hdlr.event_queue.put((event,) + payloads[codec] +
+                                     (hdlr_frame,), True, 0.1)
             except queue.Full:
+                if hdlr_frame:
+                    # the client falls behind; skip this frame
+                    hdlr.live_frames[frame[0]] = prev
+                    continue
                 # close event socket to let the connection get
                 # closed by the handler
                 self.daemon.log.warning('handler %s: queue full, '
@@ -180,6 +232,8 @@ class ServerTransport(ConnectionHandler, BaseServerTransport,
     done while the constructor runs, i.e. the `__init__` method calls `handle`.
     """
 
+    can_drop_frames = True
+
     def __init__(self, request, client_address, client_id, server):
         self.serializer = server.serializer
         self.event_sock = None  # set later by server
@@ -220,6 +274,15 @@ class ServerTransport(ConnectionHandler, BaseServerTransport,
     def get_version(self):
         return PROTO_VERSION
 
+    def blob_codecs(self):
+        try:
+            if ipaddress.ip_address(self.client_address[0]).is_loopback:
+                # compressing costs more than it saves for local clients
+                return ()
+        except ValueError:
+            pass
+        return blobCodecs()
+
     def recv_command(self):
         # receive: ENQ (1 byte) + commandcode (2) + length (4)
         try:
@@ -278,6 +341,8 @@ class ServerTransport(ConnectionHandler, BaseServerTransport,
                                 err) from err
 
     def send_event(self, evtname, payload, blobs):
+        if isinstance(blobs, CompressedBlobs):
+            blobs = blobs.compressed()
         self.event_sock.sendall(STX +
                                 event2code[evtname] +
                                 (b'%c' % len(blobs)) +
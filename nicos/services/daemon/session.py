@@ -208,8 +208,10 @@ class DaemonSession(NoninteractiveSession):
         return NoninteractiveSession.checkAccess(self, required)
 
     def checkParallel(self):
-        return self.script_thread_id and \
-            self.script_thread_id != threading.current_thread().ident
+        # device creation threads work on behalf of the script thread
+        ident = threading.current_thread().ident
+        return self.script_thread_id and self.script_thread_id != ident and \
+            ident not in self._create_workers
 
     def showHelp(self, obj=None):
         try:
@@ -34,19 +34,33 @@ from time import sleep, time as currenttime
 
 from nicos import config, session
 from nicos.core import ConfigurationError, Device, DeviceAlias, Param, \
-    Readable, listof, status
+    Readable, dictof, floatrange, intrange, listof, status, tupleof
 from nicos.devices.generic.cache import CacheReader
+from nicos.services.poller.adaptive import AdaptiveInterval
+from nicos.services.poller.scheduler import POLL_BUSY_INTERVAL, \
+    POLL_MIN_VALID_TIME, POLL_MIN_WAIT, DevicePoller, PollScheduler
 from nicos.utils import createSubprocess, createThread, loggers, \
-    watchFileContent, whyExited
+    number_types, watchFileContent, whyExited
 from nicos.utils.files import findSetup
 
-POLL_MIN_VALID_TIME = 0.15  # latest time slot to poll before value times out due to maxage
-POLL_BUSY_INTERVAL = 0.5    # if dev is busy, poll this often
-POLL_MIN_WAIT = 0.1         # minimum amount of time between two calls to poll()
-                            # POLL_MIN_WAIT < POLL_BUSY_INTERVAL / 2 !!!
-
 
 class Poller(Device):
+    """
+    The poller service.
+
+    By default, every polled device gets a dedicated thread.  With *workers*
+    set, all devices of a setup are instead polled by a pool of that many
+    threads, driven by a scheduler that services each device when its next
+    poll is due or when it receives an event.  The dispatch latency and
+    jitter of every device are logged on request (SIGUSR2) and at shutdown.
+
+    With *adaptive* set, the poll interval of idle devices follows the
+    observed change of their value: it grows while the value is stable
+    within the device's precision (or *adaptivetolerance* relative to the
+    value), and shrinks when the value changes faster, within the bounds
+    given by *adaptivebounds*.  The effective interval is written to the
+    ``effpollinterval`` cache key of the device.
+    """
 
     parameters = {
         'autosetup':  Param('True if all master setups should always be polled',
@@ -60,11 +74,31 @@ class Poller(Device):
                             'master setup', type=listof(str)),
         'blacklist':  Param('Devices that should never be polled',
                             type=listof(str)),
+        'workers':    Param('Number of threads polling the devices of a '
+                            'setup, 0 for one thread per device',
+                            type=intrange(0, 1000), default=0),
+        'busyinterval': Param('Poll interval of devices while they or their '
+                              'attached devices are busy', unit='s',
+                              type=floatrange(2 * POLL_MIN_WAIT),
+                              default=POLL_BUSY_INTERVAL),
+        'adaptive':   Param('Adapt the poll interval of idle devices to the '
+                            'change of their value', type=bool, default=False),
+        'adaptivetolerance': Param('Change of a value relative to its '
+                                   'magnitude below which it counts as stable, '
+                                   'for devices without precision',
+                                   type=floatrange(0), default=1e-3),
+        'adaptivebounds': Param('Minimum and maximum adaptive poll interval '
+                                'per device; the default is (pollinterval/5, '
+                                '10*pollinterval), but not below the busy '
+                                'interval', type=dictof(str, tupleof(
+                                    floatrange(POLL_MIN_WAIT),
+                                    floatrange(POLL_MIN_WAIT)))),
     }
 
     def doInit(self, mode):
         self._stoprequest = False
         self._workers = {}
+        self._scheduler = None
         self._creation_lock = threading.Lock()
 
     def doUpdateLoglevel(self, value):
@@ -72,7 +106,36 @@ class Poller(Device):
         # a poller session
         self.log.setLevel(loggers.loglevels[value])
 
-    def _worker_thread(self, devname, work_queue):
+    def _adaptive_interval(self, dev):
+        """Return an `AdaptiveInterval` for the device, or None if its poll
+        interval is fixed.
+        """
+        if not self.adaptive or not dev.pollinterval:
+            return None
+        interval = dev.pollinterval
+        bounds = self.adaptivebounds.get(dev.name.lower())
+        if bounds is None:
+            bounds = (min(interval, max(interval / 5, self.busyinterval)),
+                      interval * 10)
+        precision = getattr(dev, 'precision', None)
+        if not isinstance(precision, number_types) or precision <= 0:
+            precision = 0
+        return AdaptiveInterval(interval, bounds[0], bounds[1], precision,
+                                self.adaptivetolerance)
+
+    def _publish_interval(self, dev, interval, published):
+        """Write the effective poll interval to the cache if it changed.
+
+        *published* is a one-element list with the last written interval.
+        """
+        if interval != published[0]:
+            published[0] = interval
+            session.cache.put(dev, 'effpollinterval', interval)
+
+    def _register_callbacks(self, dev, work_queue):
+        """Register cache callbacks that put events for the device into the
+        given queue.
+        """
         # pylint: disable=dangerous-default-value
 
         def reconfigure_dev_target(key, value, time, oldvalues={}):
@@ -109,6 +172,21 @@ class Poller(Device):
         def reconfigure_param(key, value, time):
             work_queue.put('param', False)
 
+        # keep track of some parameters via cache callback
+        # session.cache.addCallback(dev, 'value', reconfigure_dev_value)  # spams events
+        session.cache.addCallback(dev, 'target', reconfigure_dev_target)
+        session.cache.addCallback(dev, 'status', reconfigure_dev_status)  # may spam events
+        session.cache.addCallback(dev, 'maxage', reconfigure_param)
+        session.cache.addCallback(dev, 'pollinterval', reconfigure_param)
+        # also subscribe to value and status updates of attached devices.
+        for adev in dev._adevs.values():
+            if not isinstance(adev, Readable):
+                continue
+            session.cache.addCallback(adev, 'value', reconfigure_adev_value)
+            session.cache.addCallback(adev, 'target', reconfigure_adev_target)
+            session.cache.addCallback(adev, 'status', reconfigure_adev_status)
+
+    def _worker_thread(self, devname, work_queue):
         def poll_loop(dev):
             """
             Polling a device and react to updates received via cache
@@ -126,6 +204,9 @@ class Poller(Device):
             interval = dev.pollinterval
             maxage = interval - POLL_MIN_VALID_TIME if interval else (
                 dev.maxage or 0)
+            busyinterval = self.busyinterval
+            adaptive = self._adaptive_interval(dev)
+            published = [None]
 
             i = 0
             lastpoll = 0  # last timestamp of successful poll
@@ -152,26 +233,26 @@ class Poller(Device):
                         # handle events....
                         # use pass to trigger a poll or continue to just fetch the next event
                         if event == 'adev_busy':  # one of our attached_devices went busy
-                            interval = POLL_BUSY_INTERVAL
+                            interval = busyinterval
                             maxage = interval / 2.
                             # also poll
                         elif event == 'adev_normal':  # one of our attached_devices is no more busy
                             pass  # just poll
                         elif event == 'adev_target':  # one of our attached_devices got new target
-                            interval = POLL_BUSY_INTERVAL
+                            interval = busyinterval
                             maxage = interval / 2.
                             continue
                         elif event == 'adev_value':  # one of our attached_devices changed value
-                            maxage = POLL_BUSY_INTERVAL / 2
+                            maxage = busyinterval / 2
                             # just poll
                         elif event == 'dev_busy':  # our device went busy
-                            interval = POLL_BUSY_INTERVAL
+                            interval = busyinterval
                             maxage = interval / 2.
                             continue
                         elif event == 'dev_normal':  # our device is no more busy
                             continue
                         elif event == 'dev_target':  # our device got new target
-                            interval = POLL_BUSY_INTERVAL
+                            interval = busyinterval
                             maxage = interval / 2.
                             continue
                         elif event == 'dev_value':  # our device changed value
@@ -180,6 +261,7 @@ class Poller(Device):
                             interval = dev.pollinterval
                             maxage = interval - POLL_MIN_VALID_TIME \
                                 if interval else (dev.maxage or 0)
+                            adaptive = self._adaptive_interval(dev)
                             continue
                         elif event == 'quit':  # stop doing anything
                             return
@@ -213,7 +295,11 @@ class Poller(Device):
                     # adjust timing if we are no longer busy
                     if stval is not None and stval[0] != status.BUSY:
                         interval = dev.pollinterval
+                        if adaptive:
+                            interval = adaptive.update(rdval, currenttime())
                         maxage = interval - POLL_MIN_VALID_TIME
+                    if adaptive:
+                        self._publish_interval(dev, interval, published)
                 # keep track of when we last (tried to) poll
                 lastpoll = currenttime()
                 # reset error count and waittime after first successful poll
@@ -242,19 +328,7 @@ class Poller(Device):
 
                 if not registered:
                     self.log.debug('%-10s: registering callbacks', dev)
-                    # keep track of some parameters via cache callback
-                    # session.cache.addCallback(dev, 'value', reconfigure_dev_value)  # spams events
-                    session.cache.addCallback(dev, 'target', reconfigure_dev_target)
-                    session.cache.addCallback(dev, 'status', reconfigure_dev_status)  # may spam events
-                    session.cache.addCallback(dev, 'maxage', reconfigure_param)
-                    session.cache.addCallback(dev, 'pollinterval', reconfigure_param)
-                    # also subscribe to value and status updates of attached devices.
-                    for adev in dev._adevs.values():
-                        if not isinstance(adev, Readable):
-                            continue
-                        session.cache.addCallback(adev, 'value', reconfigure_adev_value)
-                        session.cache.addCallback(adev, 'target', reconfigure_adev_target)
-                        session.cache.addCallback(adev, 'status', reconfigure_adev_status)
+                    self._register_callbacks(dev, work_queue)
                 registered = True
 
                 poll_loop(dev)
@@ -307,6 +381,8 @@ class Poller(Device):
 
         try:
             session.loadSetup(setup, allow_startupcode=False)
+            if self.workers:
+                self._scheduler = PollScheduler(self.log, self.workers)
             for devname in session.getSetupInfo()[setup]['devices']:
                 if devname in self.blacklist:
                     self.log.debug('not polling %s, it is blacklisted', devname)
@@ -328,6 +404,13 @@ class Poller(Device):
                                   'not polling', devname)
                     continue
 
+                if self._scheduler:
+                    self.log.debug('scheduling polling of %s', devname)
+                    devpoller = DevicePoller(self, self._scheduler, devname)
+                    self._workers[devname.lower()] = devpoller
+                    self._scheduler.add(devpoller)
+                    continue
+
                 self.log.debug('starting thread for %s', devname)
                 work_queue = queue.Queue()
                 worker = createThread('%s poller' % devname,
@@ -338,6 +421,10 @@ class Poller(Device):
                 # start staggered to not poll all devs at once....
                 # use just a small delay, exact value does not matter
                 sleep(0.0719)
+            if self._scheduler:
+                self.log.info('polling %d devices with %d threads',
+                              len(self._workers), self.workers)
+                self._scheduler.start()
             session.cache.addPrefixCallback('poller', self.command_callback)
 
         except ConfigurationError as err:
@@ -369,6 +456,9 @@ class Poller(Device):
             return self._wait_master()
         while not self._stoprequest:
             sleep(1)
+        if self._scheduler:
+            self._scheduler.join()
+            return
         for worker in self._workers.values():
             worker.join()
 
@@ -379,12 +469,26 @@ class Poller(Device):
             return  # already quitting
         self.log.info('poller quitting on signal %s...', signum)
         self._stoprequest = True
+        if self._scheduler:
+            self._scheduler.stop()
+            self._scheduler.join()
+            self._log_statistics()
+            self.log.info('poller finished')
+            return
         for worker in self._workers.values():
             worker.work_queue.put('quit', False)  # wake up to quit
         for worker in self._workers.values():
             worker.join()
         self.log.info('poller finished')
 
+    def _log_statistics(self):
+        for devname, stats in sorted(self._scheduler.statistics().items()):
+            self.log.info('%-10s: %d polls, latency %.3f s (max %.3f s), '
+                          'jitter %.3f s, duration %.3f s', devname,
+                          stats['count'], stats['latency'],
+                          stats['maxlatency'], stats['jitter'],
+                          stats['duration'])
+
     def reload(self):
         if self._setup is not None:
             # do nothing for single pollers
@@ -399,8 +503,14 @@ class Poller(Device):
     def statusinfo(self):
         self.log.info('got SIGUSR2')
         if self._setup is not None:
+            if self._scheduler:
+                self._log_statistics()
+                # the device pollers are serviced by the scheduler's threads
+                threads = self._scheduler.threads
+            else:
+                threads = self._workers.values()
             info = []
-            for worker in self._workers.values():
+            for worker in threads:
                 wname = worker.getName()
                 if worker.is_alive():
                     info.append('%s: alive' % wname)
@@ -0,0 +1,85 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""Adaptation of poll intervals to the observed change of device values."""
+
+from nicos.utils import number_types
+
+# factor by which the interval grows after every poll with a stable value
+GROW_FACTOR = 1.5
+
+
+class AdaptiveInterval:
+    """Computes the poll interval of a device from its recent values.
+
+    While the value stays within *tolerance* from poll to poll, the interval
+    grows by `GROW_FACTOR` per poll up to *maxinterval*.  When the value
+    changes by more, the interval is shortened at once, so that the change
+    expected within one interval at the observed rate is about *tolerance*,
+    but not below *mininterval*.  A *reltolerance* is used relative to the
+    magnitude of the value if no absolute *tolerance* is given.
+
+    Values that are not numbers or sequences of numbers do not change the
+    interval.
+    """
+
+    def __init__(self, interval, mininterval, maxinterval, tolerance=0,
+                 reltolerance=0):
+        self.mininterval = mininterval
+        self.maxinterval = max(mininterval, maxinterval)
+        self.tolerance = tolerance
+        self.reltolerance = reltolerance
+        self.interval = min(max(interval, self.mininterval), self.maxinterval)
+        self._last = None
+
+    def _change(self, value, last):
+        """Return the largest absolute change and the tolerance for it."""
+        if isinstance(value, number_types):
+            value, last = (value,), (last,)
+        elif not isinstance(value, (list, tuple)) or \
+                len(value) != len(last) or \
+                not all(isinstance(v, number_types) for v in value):
+            return None, None
+        change = max(abs(v - l) for (v, l) in zip(value, last))
+        tolerance = self.tolerance or \
+            self.reltolerance * max(abs(v) for v in value)
+        return change, tolerance
+
+    def update(self, value, time):
+        """Account for a newly polled value; return the new interval."""
+        last, self._last = self._last, (value, time)
+        if last is None or time <= last[1]:
+            return self.interval
+        try:
+            change, tolerance = self._change(value, last[0])
+        except TypeError:
+            return self.interval
+        if change is None:
+            return self.interval
+        if change <= tolerance:
+            self.interval = min(self.interval * GROW_FACTOR, self.maxinterval)
+        else:
+            rate = change / (time - last[1])
+            self.interval = max(min(self.interval / 2, tolerance / rate),
+                                self.mininterval)
+        return self.interval
@@ -0,0 +1,386 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""Deadline scheduler for polling many devices with a few threads."""
+
+import heapq
+import queue
+import threading
+from collections import deque
+from time import time as currenttime
+
+from nicos import session
+from nicos.core import status
+from nicos.utils import createThread
+
+POLL_MIN_VALID_TIME = 0.15  # latest time slot to poll before value times out due to maxage
+POLL_BUSY_INTERVAL = 0.5    # default: if dev is busy, poll this often
+POLL_MIN_WAIT = 0.1         # minimum amount of time between two calls to poll()
+                            # POLL_MIN_WAIT < POLL_BUSY_INTERVAL / 2 !!!
+
+
+class PollStats:
+    """Statistics of the dispatch latency and jitter for one device.
+
+    The latency is the time between the moment a device should have been
+    serviced and the moment a worker actually started doing so.  The jitter
+    is the mean difference between consecutive latencies.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.latency_sum = 0.
+        self.latency_max = 0.
+        self.jitter_sum = 0.
+        self.duration_sum = 0.
+        self._last_latency = None
+
+    def add(self, latency, duration):
+        self.count += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        if self._last_latency is not None:
+            self.jitter_sum += abs(latency - self._last_latency)
+        self._last_latency = latency
+        self.duration_sum += duration
+
+    def summary(self):
+        """Return a dictionary with the mean and maximum values."""
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'latency': self.latency_sum / count,
+            'maxlatency': self.latency_max,
+            'jitter': self.jitter_sum / max(self.count - 1, 1),
+            'duration': self.duration_sum / count,
+        }
+
+
+class EventQueue:
+    """Event queue of a `DevicePoller`.
+
+    It provides the ``put`` method of `queue.Queue`, so that the same cache
+    callbacks can be used as for the threaded poller, but instead of waking
+    up a dedicated thread, the device is scheduled for immediate service.
+    """
+
+    def __init__(self, devpoller):
+        self._devpoller = devpoller
+        self._events = deque()
+
+    def __len__(self):
+        return len(self._events)
+
+    def put(self, event, block=True, timeout=None):
+        self._events.append(event)
+        self._devpoller.scheduler.wakeup(self._devpoller)
+
+    def pop(self):
+        """Return the oldest event, or None if there is none."""
+        try:
+            return self._events.popleft()
+        except IndexError:
+            return None
+
+
+class DevicePoller:
+    """Polling state of a single device, serviced by a `PollScheduler`.
+
+    This follows the same logic as the dedicated poller threads: events
+    received from the cache adjust the poll interval and may trigger a poll,
+    and errors lead to retries with exponential back-off.  Instead of waiting
+    for the next event or poll, `run` returns the time when the device needs
+    to be serviced again.
+    """
+
+    def __init__(self, poller, scheduler, devname):
+        self.poller = poller
+        self.scheduler = scheduler
+        self.devname = devname
+        self.log = poller.log
+        self.work_queue = EventQueue(self)
+        self.stats = PollStats()
+        self.dev = None
+        self.registered = False
+        self.errstate = [0, 10]  # number of errors, current wait time
+        self.failed = False
+        # scheduling state, protected by the scheduler's lock
+        self.due = None
+        self.running = False
+        self.woken = False
+        self._reset()
+
+    def __str__(self):
+        return self.devname
+
+    def _reset(self):
+        self.started = False
+        self.interval = None
+        self.adaptive = None
+        self.published = [None]
+        self.maxage = 0
+        self.i = 0
+        self.lastpoll = 0  # last timestamp of successful poll
+
+    def _setup(self):
+        if self.dev is None:
+            # device creation should be serialized due to the many global
+            # state updates in the session object
+            with self.poller._creation_lock:
+                self.dev = session.getDevice(self.devname)
+            for name, info in self.dev.parameters.items():
+                if info.volatile:
+                    self.work_queue.put('pollparam:%s' % name)
+        if not self.registered:
+            self.log.debug('%-10s: registering callbacks', self.dev)
+            self.poller._register_callbacks(self.dev, self.work_queue)
+            self.registered = True
+
+    def _next_deadline(self):
+        dev = self.dev
+        # default for the next poll is 1h if polling is disabled
+        nextpoll = self.lastpoll + (self.interval or 3600)
+        # note: dev.maxage is intended here!
+        timesout = self.lastpoll + (dev.maxage - POLL_MIN_VALID_TIME
+                                    if dev.maxage else POLL_MIN_VALID_TIME)
+        return min(nextpoll, timesout)
+
+    def _handle_event(self, event):
+        """Handle one event; return True if the device should be polled."""
+        dev = self.dev
+        busyinterval = self.poller.busyinterval
+        self.log.debug('%-10s: event %s', dev, event)
+        if event == 'adev_busy':  # one of our attached_devices went busy
+            self.interval = busyinterval
+            self.maxage = self.interval / 2.
+            return True
+        elif event == 'adev_normal':  # one of our attached_devices is no more busy
+            return True
+        elif event in ('adev_target', 'dev_busy', 'dev_target'):
+            self.interval = busyinterval
+            self.maxage = self.interval / 2.
+        elif event == 'adev_value':  # one of our attached_devices changed value
+            self.maxage = busyinterval / 2
+            return True
+        elif event == 'param':  # update local vars
+            self.interval = dev.pollinterval
+            self.maxage = self.interval - POLL_MIN_VALID_TIME \
+                if self.interval else (dev.maxage or 0)
+            self.adaptive = self.poller._adaptive_interval(dev)
+        elif event.startswith('pollparam:'):
+            try:
+                dev._pollParam(event[10:])
+            except Exception:
+                dev.log.warning('error polling parameter %s', event[10:],
+                                exc=True)
+            return True
+        elif event == 'retry':  # just triggers a poll
+            return True
+        return False
+
+    def run(self):
+        """Handle pending events and poll the device if it is due.
+
+        Returns the time when the device must be serviced next.  Errors are
+        raised to the caller, which should call `handle_error`.
+        """
+        if self.failed:
+            # like an event that ends the wait after an error: it is consumed
+            self.work_queue.pop()
+            self.failed = False
+        if self.dev is None or not self.registered:
+            self._setup()
+        dev = self.dev
+        if not self.started:
+            # get the initial values
+            self.interval = dev.pollinterval
+            self.maxage = self.interval - POLL_MIN_VALID_TIME \
+                if self.interval else (dev.maxage or 0)
+            self.adaptive = self.poller._adaptive_interval(dev)
+            self.started = True
+        while True:
+            deadline = self._next_deadline()
+            if deadline > currenttime():
+                # only handle events if there is time, otherwise just poll
+                event = self.work_queue.pop()
+                if event is None:
+                    return deadline
+                if not self._handle_event(event):
+                    continue
+            else:
+                self.log.debug('%-10s: ignoring events for one round', dev)
+
+            # also do rate-limiting if too many events occur which would
+            # retrigger this device
+            if self.lastpoll + POLL_MIN_WAIT > currenttime():
+                self.log.debug('%-10s: rate-limiting poll()', dev)
+                return self.lastpoll + POLL_MIN_WAIT
+
+            # only poll if enabled
+            if dev.pollinterval is not None:
+                self.i += 1
+                stval, rdval = dev.poll(self.i, maxage=self.maxage)
+                self.log.debug('%-10s: status = %-25s, value = %s',
+                               dev, stval, rdval)
+                # adjust timing if we are no longer busy
+                if stval is not None and stval[0] != status.BUSY:
+                    self.interval = dev.pollinterval
+                    if self.adaptive:
+                        self.interval = self.adaptive.update(rdval,
+                                                             currenttime())
+                    self.maxage = self.interval - POLL_MIN_VALID_TIME
+                if self.adaptive:
+                    self.poller._publish_interval(dev, self.interval,
+                                                  self.published)
+            # keep track of when we last (tried to) poll
+            self.lastpoll = currenttime()
+            # reset error count and waittime after first successful poll
+            if self.i == 1:
+                self.errstate[:] = [0, 10]
+                self.log.info('%-10s: polled successfully', dev)
+
+    def handle_error(self):
+        """Handle an error raised by `run`; return the time of the retry."""
+        errstate = self.errstate
+        errstate[0] += 1
+        if self.dev is None:
+            self.log.warning('%-10s: error creating device, retrying in '
+                             '%d sec', self.devname, errstate[1], exc=True)
+        else:
+            self.log.warning('%-10s: error polling, retrying in %d sec',
+                             self.dev, errstate[1], exc=True)
+        retry = currenttime() + errstate[1]
+        if errstate[0] % 5 == 0:
+            # use exponential back-off for the wait time; in the worst case
+            # wait 10 minutes between attempts
+            errstate[1] = min(2 * errstate[1], 600)
+        # the next event ends the wait, and polling starts afresh
+        self.failed = True
+        self._reset()
+        return retry
+
+
+class PollScheduler:
+    """Services many `DevicePoller` instances with a pool of worker threads.
+
+    The device pollers are kept in a heap, ordered by the time when they need
+    to be serviced next.  A scheduler thread hands due devices to the worker
+    threads; events for a device make it due immediately.  A device is never
+    serviced by two workers at the same time.
+    """
+
+    def __init__(self, log, nworkers):
+        self.log = log
+        self.nworkers = nworkers
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._heap = []
+        self._seq = 0
+        self._ready = queue.Queue()
+        self._stoprequest = False
+        self.threads = []
+        self.devpollers = []
+
+    def add(self, devpoller):
+        """Add a device poller, to be serviced as soon as possible."""
+        self.devpollers.append(devpoller)
+        self.wakeup(devpoller)
+
+    def start(self):
+        for i in range(self.nworkers):
+            self.threads.append(createThread('poll worker %d' % (i + 1),
+                                             self._worker_thread))
+        self.threads.append(createThread('poll scheduler',
+                                         self._scheduler_thread))
+
+    def stop(self):
+        with self._lock:
+            self._stoprequest = True
+            self._wakeup.notify()
+        for _ in range(self.nworkers):
+            self._ready.put(None)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def _schedule(self, devpoller, due):
+        # must be called with the lock held
+        devpoller.due = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, devpoller))
+        if self._heap[0][2] is devpoller:
+            self._wakeup.notify()
+
+    def wakeup(self, devpoller):
+        """Make the device due now, e.g. because it received an event."""
+        now = currenttime()
+        with self._lock:
+            if devpoller.running:
+                devpoller.woken = True
+            elif devpoller.due is None or devpoller.due > now:
+                self._schedule(devpoller, now)
+
+    def _scheduler_thread(self):
+        heap = self._heap
+        with self._lock:
+            while not self._stoprequest:
+                # skip entries that have been superseded
+                while heap and (heap[0][2].running or
+                                heap[0][2].due != heap[0][0]):
+                    heapq.heappop(heap)
+                now = currenttime()
+                if heap and heap[0][0] <= now:
+                    due, _, devpoller = heapq.heappop(heap)
+                    devpoller.running = True
+                    devpoller.woken = False
+                    self._ready.put((devpoller, due))
+                    continue
+                self._wakeup.wait(min(heap[0][0] - now, 1) if heap else 1)
+
+    def _worker_thread(self):
+        while True:
+            item = self._ready.get()
+            if item is None:
+                return
+            devpoller, due = item
+            start = currenttime()
+            try:
+                nextdue = devpoller.run()
+            except Exception:
+                nextdue = devpoller.handle_error()
+            end = currenttime()
+            devpoller.stats.add(max(start - due, 0), end - start)
+            with self._lock:
+                devpoller.running = False
+                if devpoller.woken:
+                    nextdue = min(nextdue, end)
+                if not self._stoprequest:
+                    self._schedule(devpoller, nextdue)
+
+    def statistics(self):
+        """Return a dictionary of poll statistics for each device."""
+        return {str(dp): dp.stats.summary() for dp in self.devpollers}
@@ -82,8 +82,31 @@ class Entry:
         return res
 
 
+def cache_subscriptions(key):
+    """Return cache keys (below the prefix) to subscribe to for a key of the
+    watchdog's key map.
+
+    In the key map, slashes are replaced by underscores, so a subscription
+    is needed for every possible position of the slashes.  With many
+    underscores, the part before the first one is used instead, which is
+    also contained in the original key.
+    """
+    parts = key.split('_')
+    if len(parts) > 5:
+        return [parts[0]]
+    keys = [parts[0]]
+    for part in parts[1:]:
+        keys = [k + sep + part for k in keys for sep in '_/']
+    return keys
+
+
 class Watchdog(BaseCacheClient):
-    """Main device for running the watchdog service."""
+    """Main device for running the watchdog service.
+
+    The watchdog only subscribes to the cache keys that are used by its
+    conditions, and updates the subscriptions when conditions are added or
+    removed.
+    """
 
     parameters = {
         'watch': Param('The configuration of things to watch',
@@ -138,6 +161,7 @@ class Watchdog(BaseCacheClient):
         # process entries in the default watch_conditions
         for entry_dict in self.watch:
             self._add_entry(entry_dict, 'watchdog')
+        self._update_subscriptions()
 
         # start a thread checking for modification of the setup file
         createThread('refresh checker', self._checker)
@@ -216,6 +240,16 @@ class Watchdog(BaseCacheClient):
         if entry:
             for key in entry.cond_obj.interesting_keys():
                 self._keymap[key].discard(entry)
+                if not self._keymap[key] and key not in (
+                        'session_mastersetup', self._mailreceiverkey):
+                    del self._keymap[key]
+
+    def _update_subscriptions(self):
+        """Subscribe to the cache keys needed for the current key map."""
+        keys = set()
+        for key in self._keymap:
+            keys.update(cache_subscriptions(key))
+        self._set_subscriptions(keys)
 
     # cache client API
 
@@ -322,6 +356,7 @@ class Watchdog(BaseCacheClient):
                 self.log.info('adding conditions from setup %s', new_setup)
                 for entry_dict in info['watch_conditions']:
                     self._add_entry(entry_dict, new_setup)
+        self._update_subscriptions()
         # trigger an update of all conditions
         for entry in self._entries.values():
             entry.cond_obj.new_setups(self._setups)
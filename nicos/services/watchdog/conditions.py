@@ -27,6 +27,10 @@ import ast
 
 from nicos.utils import checkSetupSpec
 
+# markers for a missing value, and for the result of a failed evaluation
+_MISSING = object()
+_FAILED = object()
+
 
 class Condition:
     """Represents the current state of a watchdog condition.
@@ -78,7 +82,12 @@ class Condition:
 
 
 class Expression(Condition):
-    """A condition that evaluates an expression made up of cache keys."""
+    """A condition that evaluates an expression made up of cache keys.
+
+    The expression is compiled once.  It is evaluated in a namespace that only
+    contains the values of its own keys, and only if one of these values has
+    changed since the last evaluation.
+    """
 
     def __init__(self, log, expr, setup_expr):
         Condition.__init__(self, log)
@@ -89,10 +98,20 @@ class Expression(Condition):
         # otherwise wait for new_setups() to be called
         self.setup_enabled = not self.setup_expr
         self.expires_at = 0
-        cond_parse = ast.parse(expr)
+        cond_parse = ast.parse(expr, mode='eval')
+        names = set()
         for node in ast.walk(cond_parse):
             if isinstance(node, ast.Name):
+                names.add(node.id)
                 self.keys.add(node.id.lower())
+        self._code = compile(cond_parse, '<condition %r>' % expr, 'eval')
+        # names as used in the expression, and the keys of their values
+        self._names = sorted(names)
+        self._namekeys = [name.lower() for name in self._names]
+        # input values of the last evaluation, and its outcome: the result
+        # of the expression, _MISSING if a value was missing, or _FAILED
+        self._values = None
+        self._result = _FAILED
 
     def is_expired(self, time):
         return self.expires_at and time > self.expires_at
@@ -104,18 +123,34 @@ class Expression(Condition):
         self.setup_enabled = checkSetupSpec(self.setup_expr, setups)
         self.expires_at = 0
 
-    def update(self, time, keydict):
+    def _evaluate(self, values):
+        namespace = {name: value for (name, value) in zip(self._names, values)
+                     if value is not _MISSING}
         try:
-            value = eval(self.expr, keydict)
+            return bool(eval(self._code, namespace))
         except NameError:
-            if self.setup_enabled and self.enabled and not self.expires_at:
-                self.expires_at = time + 6
+            return _MISSING
         except Exception:
             self.log.warning('error evaluating %r warning '
                              'condition', self.expr, exc=1)
-        else:
+            return _FAILED
+
+    def update(self, time, keydict):
+        values = tuple(keydict.get(key, _MISSING) for key in self._namekeys)
+        try:
+            changed = values != self._values
+        except Exception:
+            changed = True
+        if changed:
+            self._values = values
+            self._result = self._evaluate(values)
+        result = self._result
+        if result is _MISSING:
+            if self.setup_enabled and self.enabled and not self.expires_at:
+                self.expires_at = time + 6
+        elif result is not _FAILED:
             self.expires_at = 0
-            self.triggered = bool(value) and self.enabled and self.setup_enabled
+            self.triggered = result and self.enabled and self.setup_enabled
 
 
 class DelayedTrigger(Condition):
@@ -21,12 +21,18 @@
 #
 # *****************************************************************************
 
-"""Utilities for (de-)compressing files."""
+"""Utilities for (de-)compressing files and data blobs."""
 
 import os
 import zipfile
+import zlib
 from os import path
 
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
 
 def zipFiles(zipfilename, rootdir, logger=None):
     """Create a zipfile named <zipfile> containing all files from <rootdir>
@@ -72,3 +78,31 @@ def zipFiles(zipfilename, rootdir, logger=None):
         if remove_zip:
             os.unlink(zipfilename)
     return zipfilename
+
+
+def blobCodecs():
+    """Return the names of the available codecs for `compressBlob`, in order
+    of preference (fastest first).
+    """
+    if lz4frame is not None:
+        return ['lz4', 'zlib']
+    return ['zlib']
+
+
+def compressBlob(codec, data):
+    """Compress *data* (any contiguous buffer) with the given codec."""
+    if codec == 'zlib':
+        # speed is more important than size for data that is sent on
+        return zlib.compress(data, 1)
+    elif codec == 'lz4' and lz4frame is not None:
+        return lz4frame.compress(data)
+    raise ValueError('unsupported blob codec: %r' % codec)
+
+
+def decompressBlob(codec, data):
+    """Decompress *data* that was compressed with `compressBlob`."""
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    elif codec == 'lz4' and lz4frame is not None:
+        return lz4frame.decompress(data)
+    raise ValueError('unsupported blob codec: %r' % codec)
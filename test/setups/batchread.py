@@ -0,0 +1,43 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+description = 'test setup for batch reading devices of a controller'
+
+devices = dict(
+    crate = device('test.test_simple.test_batchread.BatchController'),
+    ch1 = device('test.test_simple.test_batchread.BatchChannel',
+        controller = 'crate',
+        channel = 1,
+        unit = 'V',
+    ),
+    ch2 = device('test.test_simple.test_batchread.BatchChannel',
+        controller = 'crate',
+        channel = 2,
+        unit = 'V',
+    ),
+    ch3 = device('test.test_simple.test_batchread.BatchChannel',
+        controller = 'crate',
+        channel = 3,
+        unit = 'V',
+    ),
+)
@@ -20,4 +20,9 @@ devices = dict(
         target = 3,
     ),
     dev4 = device('nicos.core.device.Device'),
+    vmot = device('nicos.devices.generic.VirtualMotor',
+        unit = 'mm',
+        abslimits = (-5, 5),
+        speed = 10,
+    ),
 )
@@ -0,0 +1,40 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+description = 'test setup for parallel device creation'
+
+devices = dict(
+    slow1 = device('test.test_simple.test_parallelcreate.SlowDevice'),
+    slow2 = device('test.test_simple.test_parallelcreate.SlowDevice'),
+    slow3 = device('test.test_simple.test_parallelcreate.SlowDevice'),
+    slow4 = device('test.test_simple.test_parallelcreate.SlowDevice'),
+    combined = device('test.test_simple.test_parallelcreate.SlowDevice',
+        parts = ['slow1', 'slow2'],
+    ),
+    toplevel = device('test.test_simple.test_parallelcreate.SlowDevice',
+        parts = ['combined', 'broken'],
+    ),
+    broken = device('test.test_simple.test_parallelcreate.SlowDevice',
+        fail = True,
+    ),
+)
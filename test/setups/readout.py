@@ -0,0 +1,22 @@
+description = 'test setup for parallel readout of the scan environment'
+
+includes = ['scanning']
+
+devices = dict(
+    slowread1 = device('test.test_simple.test_readout.SlowReadable',
+        unit = 'K',
+        retval = 1,
+    ),
+    slowread2 = device('test.test_simple.test_readout.SlowReadable',
+        unit = 'K',
+        retval = 2,
+    ),
+    slowread3 = device('test.test_simple.test_readout.SlowReadable',
+        unit = 'K',
+        retval = 3,
+    ),
+    slowfail = device('test.test_simple.test_readout.SlowReadable',
+        unit = 'K',
+        fail = True,
+    ),
+)
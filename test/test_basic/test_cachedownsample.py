@@ -0,0 +1,50 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""NICOS tests for downsampling of cache history queries."""
+
+from nicos.services.cache.database.base import downsample
+from nicos.services.cache.entry import CacheEntry
+
+
+def run(values, interval):
+    entries = [CacheEntry(time, None, value) for (time, value) in values]
+    return [(entry.time, entry.value)
+            for entry in downsample(entries, interval)]
+
+
+def test_min_max_last():
+    values = [(0, '5'), (1, '9'), (2, '1'), (3, '4'), (4, '6'),
+              (10, '3'), (11, '2.5'),
+              (25, '7')]
+    assert run(values, 10) == [(1, '9'), (2, '1'), (4, '6'),
+                               (10, '3'), (11, '2.5'),
+                               (25, '7')]
+
+
+def test_non_numeric_and_expired():
+    values = [(0, "'a'"), (1, "'b'"), (2, '(1, 2)'),
+              (3, '1'), (4, ''), (5, '2'), (6, '3'),
+              (12, "'c'")]
+    assert run(values, 10) == [(3, '1'), (4, ''), (5, '2'), (6, '3'),
+                               (12, "'c'")]
@@ -0,0 +1,79 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""NICOS tests for the flatfile cache history index."""
+
+from nicos.services.cache.database.flatfile import STORE_HEADER, HistoryIndex
+
+LINES = [
+    'value\t1000.0\t+\t1.5\n',
+    'status\t1000.5\t+\t(200, \'idle\')\n',
+    'value\t1001.0\t-\t-\n',
+    'value\t1002.25\t+\t2.5\n',
+]
+
+
+def read_lines(filename, subkey, index):
+    offsets, times = index.lookup(subkey)
+    result = []
+    with open(filename, 'rb') as fd:
+        for offset, time in zip(offsets, times):
+            fd.seek(offset)
+            fields = fd.readline().decode().split(None, 3)
+            assert fields[0] == subkey
+            assert float(fields[1]) == time
+            result.append(fields[3].rstrip())
+    return result
+
+
+def test_scan_and_append(tmp_path):
+    datafile = tmp_path / 'nicos-dev'
+    datafile.write_text(STORE_HEADER + '\n' + ''.join(LINES[:3]) + 'val')
+    index = HistoryIndex()
+    index.scan(datafile)
+    assert read_lines(datafile, 'value', index) == ['1.5', '-']
+    assert read_lines(datafile, 'status', index) == ["(200, 'idle')"]
+    assert read_lines(datafile, 'missing', index) == []
+
+    # the incomplete line is indexed once it is complete
+    datafile.write_text(STORE_HEADER + '\n' + ''.join(LINES))
+    index.scan(datafile)
+    assert read_lines(datafile, 'value', index) == ['1.5', '-', '2.5']
+    assert index.size == datafile.stat().st_size
+
+
+def test_save_and_load(tmp_path):
+    datafile = tmp_path / 'nicos-dev'
+    datafile.write_text(STORE_HEADER + '\n' + ''.join(LINES))
+    index = HistoryIndex()
+    index.scan(datafile)
+    index.save(str(tmp_path / 'index'))
+
+    loaded = HistoryIndex.load(str(tmp_path / 'index'))
+    assert (loaded.size, loaded.mtime) == (index.size, index.mtime)
+    assert read_lines(datafile, 'value', loaded) == ['1.5', '-', '2.5']
+    # new entries are appended to the entries read from the file
+    loaded.add('status', 2000, 1003.0)
+    offsets, times = loaded.lookup('status')
+    assert list(offsets) == [len(STORE_HEADER) + 1 + len(LINES[0]), 2000]
+    assert list(times) == [1000.5, 1003.0]
@@ -0,0 +1,120 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""NICOS tests for the in-memory cache history ring."""
+
+import logging
+from time import time as currenttime
+from types import SimpleNamespace
+
+from nicos.services.cache.database.memory import HistoryRing, \
+    HistoryRingCacheDatabase
+from nicos.services.cache.entry import CacheEntry
+
+
+def query(ring, fromtime, totime, dbkey=('dev', 'value')):
+    return [(e.time, e.value) for e in ring.query(dbkey, fromtime, totime)]
+
+
+def test_query():
+    ring = HistoryRing(maxage=100, maxmemory=1 << 20, partitions=10)
+    t0 = ring.since
+    ring.setBefore(('dev', 'value'), CacheEntry(t0 - 1000, None, '0'))
+    for i in range(1, 51):
+        ring.add(('dev', 'value'), t0 + i, str(i))
+    # entries out of order are inserted at the right place
+    ring.add(('dev', 'value'), t0 + 20.5, '20.5')
+    ring.add(('dev', 'status'), t0 + 5, '(200, "")')
+
+    assert query(ring, t0 + 19.9, t0 + 21) == [
+        (t0 + 19, '19'), (t0 + 20, '20'), (t0 + 20.5, '20.5'), (t0 + 21, '21')]
+    # last value before an empty range
+    assert query(ring, t0 + 30.1, t0 + 30.9) == [(t0 + 30, '30')]
+    # last value before the ring
+    assert query(ring, t0, t0 + 1) == [(t0 - 1000, '0'), (t0 + 1, '1')]
+    assert query(ring, t0, t0 + 10, ('dev', 'status')) == [
+        (t0 + 5, '(200, "")')]
+    assert query(ring, t0, t0 + 10, ('dev', 'other')) == []
+    # entries older than the ring are ignored
+    ring.add(('dev', 'value'), t0 - 10, 'old')
+    assert query(ring, t0 - 20, t0 + 1) == [(t0 - 1000, '0'), (t0 + 1, '1')]
+
+
+def test_expire():
+    ring = HistoryRing(maxage=100, maxmemory=1 << 20, partitions=10)
+    t0 = ring.since
+    for i in range(0, 1000, 5):
+        ring.add(('dev', 'value'), t0 + i, str(i))
+        # an expired value is not returned as the last value before
+        ring.add(('dev', 'value'), t0 + i + 1, '')
+    assert t0 + 1000 - 130 < ring.since < t0 + 1000 - 100
+    last = max(i for i in range(0, 1000, 5) if t0 + i < ring.since)
+    assert query(ring, t0, t0 + 1) == [(t0 + last, str(last))]
+
+
+def test_memory_limit():
+    ring = HistoryRing(maxage=1000, maxmemory=10000, partitions=100)
+    t0 = ring.since
+    for i in range(1000):
+        ring.add(('dev', 'value'), t0 + i, 'x' * 36)
+    assert ring._memory <= 10000
+    entries = ring.query(('dev', 'value'), t0, t0 + 1000)
+    assert 50 < len(entries) <= 101
+    assert entries[-1].time == t0 + 999
+
+
+class FakeStore:
+
+    def __init__(self, history):
+        self.history = history
+
+    def iterEntries(self):
+        for dbkey, entries in self.history.items():
+            yield dbkey, entries[-1]
+
+    def queryHistory(self, dbkey, fromtime, totime, interval):
+        entries = self.history[dbkey]
+        before = [e for e in entries if e.time < fromtime]
+        return before[-1:] + [e for e in entries
+                              if fromtime <= e.time <= totime]
+
+
+def test_fill_from_store():
+    t0 = currenttime()
+    store = FakeStore({
+        ('dev', 'value'): [CacheEntry(t0 - 500, None, '1'),
+                           CacheEntry(t0 - 50, None, '2'),
+                           CacheEntry(t0 - 10, None, '3')],
+        ('dev', 'status'): [CacheEntry(t0 - 500, None, '(200, "")')],
+    })
+    db = SimpleNamespace(_ring=HistoryRing(100, 1 << 20), maxage=100,
+                         log=logging.getLogger('test'))
+    HistoryRingCacheDatabase._fillRing(db, store)
+    ring = db._ring
+    # the ring now covers the last maxage seconds
+    assert ring.since <= t0 - 100 + 1
+    assert query(ring, t0 - 60, t0) == [
+        (t0 - 500, '1'), (t0 - 50, '2'), (t0 - 10, '3')]
+    assert query(ring, t0 - 20, t0) == [(t0 - 50, '2'), (t0 - 10, '3')]
+    assert query(ring, t0 - 60, t0, ('dev', 'status')) == [
+        (t0 - 500, '(200, "")')]
@@ -0,0 +1,91 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""NICOS tests for the cache value serialization."""
+
+import pytest
+
+from nicos.protocols.cache import CacheLoader, _cache_load_ast, cache_dump, \
+    cache_load
+from nicos.utils import readonlydict, readonlylist
+
+
+@pytest.mark.parametrize('entry', [
+    '1', '-5', '0', '007', '01.5', '1e5', '-1.5e-3', '.5', '5.', '1_000',
+    '+5', 'nan', '-inf', 'None', 'True', '[1, 2.5, -3,]', '[]', '()', '(1)',
+    '(1,)', '(1, 2)', '[,]', '[1,,2]', "'abc'", "{'a': 1}", '[[1, 2], [3]]',
+    '(nan, -inf)', '[None, True]', '{1, 2}', '1+2j', ' 1', '[ 1 , 2 ]',
+])
+def test_load_fast_path(entry):
+    # the results must be the same as with the plain parser
+    try:
+        expected = _cache_load_ast(entry)
+    except ValueError:
+        pytest.raises(ValueError, cache_load, entry)
+        return
+    result = cache_load(entry)
+    assert type(result) is type(expected)
+    assert repr(result) == repr(expected)
+    # again, with the memoized result
+    assert repr(cache_load(entry)) == repr(expected)
+
+
+@pytest.mark.parametrize('obj', [
+    [1, 2.5], [], (), (1,), ('a', b'x'), [[1], 2], {'a': (1,)},
+    (True, None), frozenset([1]),
+])
+def test_dump_roundtrip(obj):
+    assert cache_load(cache_dump(obj)) == obj
+
+
+def test_memoized_containers():
+    first = cache_load('[1, 2, 3]')
+    first += [4]
+    assert isinstance(cache_load('[1, 2, 3]'), readonlylist)
+    assert cache_load('[1, 2, 3]') == [1, 2, 3]
+    assert isinstance(cache_load("{'a': [1]}"), readonlydict)
+    assert cache_load("{'a': [1]}") is not cache_load("{'a': [1]}")
+    # nested mutable containers are not shared between callers
+    inner = cache_load("([1, 2], 3)")[0]
+    inner += [3]
+    assert cache_load("([1, 2], 3)") == ([1, 2], 3)
+    inner = cache_load("{'a': [1]}")['a']
+    inner += [2]
+    assert cache_load("{'a': [1]}") == {'a': [1]}
+
+
+def test_loader_stats():
+    load = CacheLoader(2)
+    assert load("(200, 'idle')") == (200, 'idle')
+    assert load("(200, 'idle')") == (200, 'idle')
+    # numbers and pickled objects are not memoized
+    assert load('1.5') == 1.5
+    load(cache_dump(object))
+    assert load.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+    load('[1, 2]')
+    load("'abc'")
+    # the least recently used value is evicted
+    load("(200, 'idle')")
+    assert load.stats() == {'hits': 1, 'misses': 4, 'size': 2}
+    load.clear()
+    assert load.stats() == {'hits': 0, 'misses': 0, 'size': 0}
@@ -0,0 +1,69 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""NICOS tests for the cache server subscription index."""
+
+from nicos.services.cache.subscriptions import SubscriptionIndex
+
+
+def test_substring_match():
+    index = SubscriptionIndex()
+    index.add('c1', 'nicos/', False)
+    index.add('c2', 'motor', False)
+    index.add('c3', 'mot', True)
+    index.add('c4', 'tor/val', False)
+    index.add('c5', 'nicos/slit', False)
+
+    assert index.match('nicos/motor/value') == {
+        'c1': False, 'c2': False, 'c3': True, 'c4': False}
+    assert index.match('nicos/slit/status') == {'c1': False, 'c5': False}
+    assert index.match('other/key') == {}
+
+    # everything matches the empty string
+    index.add('c6', '', False)
+    assert index.match('other/key') == {'c6': False}
+
+
+def test_timestamp_precedence():
+    index = SubscriptionIndex()
+    index.add('c1', 'nicos/', False)
+    index.add('c1', 'motor', True)
+    assert index.match('nicos/motor/value') == {'c1': True}
+    assert index.match('nicos/slit/value') == {'c1': False}
+
+
+def test_discard_and_remove():
+    index = SubscriptionIndex()
+    index.add('c1', 'nicos/', False)
+    index.add('c2', 'nicos/', False)
+    index.add('c2', 'slit', True)
+    assert len(index) == 3
+
+    index.discard('c1', 'nicos/', False)
+    # discarding a nonexisting subscription is ignored
+    index.discard('c1', 'nicos/', True)
+    assert index.match('nicos/slit/value') == {'c2': True}
+
+    index.remove_client('c2')
+    assert index.match('nicos/slit/value') == {}
+    assert len(index) == 0
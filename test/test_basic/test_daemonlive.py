@@ -0,0 +1,120 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""NICOS tests for live data compression and frame dropping in the daemon."""
+
+import itertools
+import logging
+import pickle
+
+import numpy as np
+import pytest
+
+from nicos.protocols.daemon.classic import ClassicSerializer
+from nicos.services.daemon.handler import ConnectionHandler
+from nicos.services.daemon.proto.classic import CompressedBlobs, Server
+from nicos.utils import byteBuffer
+from nicos.utils.compression import blobCodecs, compressBlob, decompressBlob
+
+
+class FakeDaemon:
+    _controller = None
+    log = logging.getLogger('test')
+
+
+class FakeHandler(ConnectionHandler):
+    can_drop_frames = True
+
+    def __init__(self, codec=None, dropframes=False):
+        ConnectionHandler.__init__(self, FakeDaemon())
+        self.blob_codec = codec
+        self.drop_frames = dropframes
+        self.sent = []
+
+    def send_event(self, evtname, payload, blobs):
+        if isinstance(blobs, CompressedBlobs):
+            blobs = blobs.compressed()
+        self.sent.append((evtname, pickle.loads(payload), blobs))
+
+
+def make_server(*handlers):
+    server = Server.__new__(Server)
+    server.daemon = FakeDaemon()
+    server.serializer = ClassicSerializer()
+    server._handlers = dict(enumerate(handlers))
+    server._frame_seq = itertools.count()
+    return server
+
+
+def run_sender(handler):
+    handler.close()
+    handler.event_sender()
+    return handler.sent
+
+
+@pytest.mark.parametrize('codec', blobCodecs())
+def test_blob_roundtrip(codec):
+    arr = np.arange(10000, dtype='<u4').reshape((100, 100))
+    compressed = compressBlob(codec, byteBuffer(arr))
+    assert len(compressed) < arr.nbytes
+    assert decompressBlob(codec, compressed) == arr.tobytes()
+    with pytest.raises(ValueError):
+        compressBlob('nonexisting', b'')
+
+
+def test_emit_compressed():
+    plain, zlib1, zlib2 = FakeHandler(), FakeHandler('zlib'), \
+        FakeHandler('zlib')
+    server = make_server(plain, zlib1, zlib2)
+    blob = byteBuffer(np.zeros(10000, '<u4'))
+    server.emit('livedata', {'det': 'det', 'tag': 'live'}, [blob])
+    server.emit('livedata', {'tag': 'file'}, [])
+
+    events = run_sender(plain)
+    assert events[0][1] == {'det': 'det', 'tag': 'live'}
+    assert events[0][2] == [blob]
+    assert events[1][1] == {'tag': 'file'}
+    events1, events2 = run_sender(zlib1), run_sender(zlib2)
+    assert events1[0][1] == {'det': 'det', 'tag': 'live',
+                             'blobcodec': 'zlib'}
+    assert len(events1[0][2][0]) < len(blob)
+    assert decompressBlob('zlib', events1[0][2][0]) == blob.tobytes()
+    # compressed only once for both handlers
+    assert events1[0][2] is events2[0][2]
+    # events without blobs are unchanged
+    assert events1[1][1] == {'tag': 'file'}
+
+
+def test_drop_frames():
+    dropping, normal = FakeHandler(dropframes=True), FakeHandler()
+    server = make_server(dropping, normal)
+    for i in range(3):
+        for det in ('det1', 'det2'):
+            server.emit('livedata', {'det': det, 'frame': i}, [b'x'])
+    server.emit('livedata', {'tag': 'file'}, [])
+
+    assert len(run_sender(normal)) == 7
+    # only the latest frame of each detector is sent
+    assert [evt[1] for evt in run_sender(dropping)] == [
+        {'det': 'det1', 'frame': 2}, {'det': 'det2', 'frame': 2},
+        {'tag': 'file'}]
@@ -0,0 +1,69 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+
+"""NICOS tests for the adaptive poll intervals of the poller."""
+
+from pytest import approx
+
+from nicos.services.poller.adaptive import AdaptiveInterval
+
+
+def test_stable_value():
+    adaptive = AdaptiveInterval(10, 2, 100, tolerance=0.1)
+    assert adaptive.update(5.0, 0) == 10
+    # stable values lengthen the interval up to the maximum
+    intervals = [adaptive.update(5.0 + 0.01 * i, 10 * i) for i in range(1, 20)]
+    assert intervals[0] == 15
+    assert intervals == sorted(intervals)
+    assert intervals[-1] == 100
+
+
+def test_changing_value():
+    adaptive = AdaptiveInterval(10, 2, 100, tolerance=0.1)
+    adaptive.update(5.0, 0)
+    # at 0.02 per second, the tolerance is reached in five seconds
+    assert adaptive.update(5.2, 10) == approx(5)
+    # at 0.1 per second, the tolerance is reached in one second, but the
+    # minimum applies
+    assert adaptive.update(5.7, 15) == 2
+    # relative tolerance if none is given
+    adaptive = AdaptiveInterval(10, 1, 100, reltolerance=0.01)
+    adaptive.update(100, 0)
+    assert adaptive.update(100.5, 10) == 15
+    # shortened to at most half of the interval
+    assert adaptive.update(102.5, 25) == 7.5
+    assert adaptive.update(110.5, 40) == approx(1.105 / (8 / 15))
+
+
+def test_value_types():
+    adaptive = AdaptiveInterval(10, 2, 100, tolerance=0.1)
+    adaptive.update([1, 2], 0)
+    assert adaptive.update([1, 2.05], 10) == 15
+    assert adaptive.update([1, 2.25], 20) == approx(5)
+    # non-numeric values don't change the interval
+    assert adaptive.update('on', 30) == approx(5)
+    assert adaptive.update('off', 40) == approx(5)
+    assert adaptive.update(None, 50) == approx(5)
+    # the interval stays within the bounds initially
+    assert AdaptiveInterval(1, 2, 100).interval == 2
@@ -0,0 +1,154 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+
+"""NICOS tests for the deadline scheduler of the poller."""
+
+import threading
+from time import sleep
+
+from nicos.core import status
+from nicos.services.poller.scheduler import DevicePoller, PollScheduler
+from nicos.utils.loggers import NicosLogger
+
+
+class FakeDevice:
+
+    maxage = 3600
+
+    def __init__(self, name, pollinterval, fail=False):
+        self.name = name
+        self.pollinterval = pollinterval
+        self.fail = fail
+        self.log = NicosLogger(name)
+        self.polls = 0
+        self.params = []
+        self._active = threading.Lock()
+        self.concurrent = False
+
+    def __str__(self):
+        return self.name
+
+    def poll(self, n, maxage=0):
+        if not self._active.acquire(blocking=False):
+            self.concurrent = True
+            return None, None
+        try:
+            if self.fail:
+                raise RuntimeError('communication failed')
+            self.polls += 1
+            sleep(0.001)
+            return (status.OK, ''), n
+        finally:
+            self._active.release()
+
+    def _pollParam(self, name):
+        self.params.append(name)
+
+
+class FakePoller:
+
+    busyinterval = 0.5
+
+    def __init__(self):
+        self.log = NicosLogger('poller')
+        self._creation_lock = threading.Lock()
+
+    def _adaptive_interval(self, dev):
+        return None
+
+
+def make_scheduler(devices, nworkers=2):
+    poller = FakePoller()
+    scheduler = PollScheduler(poller.log, nworkers)
+    devpollers = {}
+    for dev in devices:
+        devpoller = DevicePoller(poller, scheduler, dev.name)
+        # device is already created and needs no cache callbacks
+        devpoller.dev = dev
+        devpoller.registered = True
+        devpollers[dev.name] = devpoller
+        scheduler.add(devpoller)
+    return scheduler, devpollers
+
+
+def test_periodic_polls():
+    devices = [FakeDevice('dev%d' % i, 0.2) for i in range(20)]
+    scheduler, _ = make_scheduler(devices)
+    scheduler.start()
+    try:
+        sleep(1.1)
+    finally:
+        scheduler.stop()
+        scheduler.join()
+    for dev in devices:
+        # first poll at once, then every 0.2 seconds
+        assert 4 <= dev.polls <= 7
+        assert not dev.concurrent
+    stats = scheduler.statistics()
+    assert set(stats) == {dev.name for dev in devices}
+    assert all(s['count'] >= 4 for s in stats.values())
+    assert all(s['latency'] >= 0 and s['jitter'] >= 0 for s in stats.values())
+
+
+def test_events():
+    dev = FakeDevice('slow', 3600)
+    scheduler, devpollers = make_scheduler([dev], nworkers=1)
+    scheduler.start()
+    try:
+        sleep(0.3)
+        assert dev.polls == 1
+        # an event triggering a poll is handled right away
+        devpollers['slow'].work_queue.put('pollparam:speed', False)
+        sleep(0.3)
+        assert dev.params == ['speed']
+        assert dev.polls == 2
+        # the busy interval applies after the device went busy, until a
+        # poll shows that it is no longer busy
+        devpollers['slow'].work_queue.put('dev_busy', False)
+        sleep(1.2)
+        assert dev.polls == 3
+    finally:
+        scheduler.stop()
+        scheduler.join()
+
+
+def test_error_backoff():
+    dev = FakeDevice('broken', 0.1, fail=True)
+    scheduler, devpollers = make_scheduler([dev], nworkers=1)
+    devpoller = devpollers['broken']
+    scheduler.start()
+    try:
+        sleep(0.3)
+        # first failure: the retry is delayed
+        assert devpoller.errstate[0] == 1
+        assert devpoller.failed
+        # any event ends the wait
+        dev.fail = False
+        devpoller.work_queue.put('retry', False)
+        sleep(0.3)
+        assert dev.polls >= 1
+        assert devpoller.errstate == [0, 10]
+    finally:
+        scheduler.stop()
+        scheduler.join()
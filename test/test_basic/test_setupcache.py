@@ -0,0 +1,82 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""NICOS tests for the persistent setup info cache."""
+
+from nicos.core.sessions.setups import readSetups, setupCacheFile
+
+
+class DummyLog:
+    def __init__(self):
+        self.messages = []
+
+    def _log(self, msg, *args, **kwds):
+        self.messages.append(msg % args)
+
+    debug = warning = error = exception = _log
+
+    def stats(self):
+        return [m for m in self.messages if m.startswith('setup cache:')][-1]
+
+
+def write(dirname, name, code):
+    (dirname / (name + '.py')).write_text(code)
+
+
+def test_setup_cache(tmp_path):
+    setups = tmp_path / 'setups'
+    setups.mkdir()
+    write(setups, 'cfg', 'value = 1\n')
+    write(setups, 'a', 'description = "A"\n'
+          'devices = dict(m = device("Moveable", unit=configdata("cfg.value")))\n')
+    write(setups, 'b', 'includes = ["a"]\n')
+    write(setups, 'broken', 'devices = dict(x = \n')
+    paths = [str(setups)]
+    cachefile = setupCacheFile(str(tmp_path / 'cache'), paths)
+
+    log = DummyLog()
+    info = readSetups(paths, log, cachefile)
+    assert log.stats() == 'setup cache: 0 setups cached, 4 read'
+    assert info['a']['devices']['m'][1]['unit'] == 1
+    assert 'broken' not in info
+
+    log = DummyLog()
+    cached = readSetups(paths, log, cachefile)
+    # setups with errors are always read again, to report the error
+    assert log.stats() == 'setup cache: 3 setups cached, 1 read'
+    assert cached == info
+    assert any('broken' in m for m in log.messages[:-1])
+
+    # changing a configdata() file also invalidates the dependent setup
+    write(setups, 'cfg', 'value = 42\n')
+    log = DummyLog()
+    info = readSetups(paths, log, cachefile)
+    assert log.stats() == 'setup cache: 1 setups cached, 3 read'
+    assert info['a']['devices']['m'][1]['unit'] == 42
+
+    # a removed setup is noticed
+    (setups / 'a.py').unlink()
+    log = DummyLog()
+    info = readSetups(paths, log, cachefile)
+    assert 'a' not in info
+    assert info['b'] is None
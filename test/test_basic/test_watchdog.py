@@ -23,6 +23,7 @@
 
 """NICOS tests for the watchdog condition primitives."""
 
+from nicos.services.watchdog import cache_subscriptions
 from nicos.services.watchdog.conditions import ConditionWithPrecondition, \
     DelayedTrigger, Expression
 
@@ -181,3 +182,47 @@ def test_pre_with_cooldown():
     combined.update(126, {'pre': 0, 'cond': 1})
     assert not combined.pre.triggered
     assert not combined.triggered
+
+
+def test_expression_inputs():
+    expr = Expression(DummyLog(), 'T_value > LIMIT and dev_status[0] == busy',
+                      '')
+    assert expr.interesting_keys() == {'t_value', 'limit', 'dev_status',
+                                       'busy'}
+    keydict = {'t_value': 5, 'limit': 3, 'dev_status': (220, ''),
+               'busy': 220, 'other': 1}
+    expr.update(0, keydict)
+    assert expr.triggered
+
+    # the expression is only evaluated again when its inputs change
+    keydict['t_value'] = None
+    expr.update(1, keydict)
+    assert len(expr.log.warnings) == 1
+    keydict['other'] = 2
+    expr.update(2, keydict)
+    assert len(expr.log.warnings) == 1
+    keydict['t_value'] = 1
+    expr.update(3, keydict)
+    assert not expr.triggered
+
+    # changed enable state applies without new values
+    keydict['t_value'] = 5
+    expr.update(4, keydict)
+    assert expr.triggered
+    expr.enabled = False
+    expr.update(5, keydict)
+    assert not expr.triggered
+
+    # the namespace only contains the inputs and the builtins
+    expr = Expression(DummyLog(), 'abs(a) > 1 and other', '')
+    expr.update(0, {'a': -2})
+    assert expr.is_expired(10)
+
+
+def test_cache_subscriptions():
+    assert cache_subscriptions('session_mastersetup') == [
+        'session_mastersetup', 'session/mastersetup']
+    assert sorted(cache_subscriptions('a_b_c')) == [
+        'a/b/c', 'a/b_c', 'a_b/c', 'a_b_c']
+    assert cache_subscriptions('t') == ['t']
+    assert cache_subscriptions('a_b_c_d_e_f') == ['a']
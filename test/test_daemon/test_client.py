@@ -242,3 +242,33 @@ def test_devices_values(client):
     load_setup(client, 'daemontest')
     assert client.getDeviceValuetype('dm1') == float
     assert client.getDeviceValue('dm1') == 0.
+
+
+def test_cachefilter(client):
+    load_setup(client, 'daemontest')
+    client.tell('cachefilter', ['dm1/'])
+    idx = len(client._signals)
+    client.run_and_wait('maw(dm1, 1); maw(dm2, 1); maw(dm1, 2)')
+    keys = set()
+    for name, data, _exc in client.iter_signals(idx, timeout=2.0):
+        if name == 'cache':
+            keys.add(data[1])
+            if data[1] == 'dm1/value' and data[3] == '2.0':
+                break
+    assert 'dm1/value' in keys
+    assert all(key.startswith('dm1/') for key in keys)
+    # reset the filter (and the devices)
+    client.tell('cachefilter', None)
+    idx = len(client._signals)
+    client.run_and_wait('maw(dm1, 0); maw(dm2, 0)')
+    for name, data, _exc in client.iter_signals(idx, timeout=5.0):
+        if name == 'cache' and data[1].startswith('dm2/'):
+            break
+
+
+def test_liveopts(client):
+    # no compression for clients on the same host
+    assert client.ask('liveopts', {'compress': ['zlib'], 'dropframes': True}) \
+        == {'compress': None, 'dropframes': True}
+    assert client.ask('liveopts', {}) == {'compress': None,
+                                          'dropframes': False}
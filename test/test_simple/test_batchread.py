@@ -0,0 +1,87 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+
+"""Test the CanReadBatch mixin."""
+
+from time import sleep
+
+from nicos.core import Attach, CanReadBatch, Device, Param, Readable, status
+
+session_setup = 'batchread'
+
+
+class BatchController(CanReadBatch, Device):
+
+    parameters = {
+        'roundtrips': Param('Number of hardware round trips', type=int,
+                            settable=True, internal=True),
+    }
+
+    def doReadBatch(self, devices):
+        self._setROParam('roundtrips', self.roundtrips + 1)
+        return {dev.name: ((status.OK, ''), dev.channel * 1.5 + 1)
+                for dev in devices}
+
+
+class BatchChannel(Readable):
+
+    attached_devices = {
+        'controller': Attach('Controller reading the channels',
+                             BatchController),
+    }
+
+    parameters = {
+        'channel': Param('Channel number', type=int),
+    }
+
+    def doInit(self, mode):
+        self._attached_controller.addBatchMember(self)
+
+    def doRead(self, maxage=0):
+        return self._attached_controller.readBatch(self, maxage)[1]
+
+    def doStatus(self, maxage=0):
+        return self._attached_controller.readBatch(self, maxage)[0]
+
+
+def test_batch_poll(session):
+    crate = session.getDevice('crate')
+    channels = [session.getDevice('ch%d' % i) for i in (1, 2, 3)]
+    crate._setROParam('roundtrips', 0)
+    # polling all channels within their maxage needs one round trip
+    for ch in channels:
+        assert ch.poll(maxage=10) == ((status.OK, ''), ch.channel * 1.5 + 1)
+    assert crate.roundtrips == 1
+    # the values of the other channels were distributed to the cache
+    for ch in channels:
+        assert ch.read() == ch.channel * 1.5 + 1
+    assert crate.roundtrips == 1
+    # outdated results are read again
+    sleep(0.2)
+    assert channels[1].poll(maxage=0.1)[1] == 4.0
+    assert crate.roundtrips == 2
+    # requests for fresh values within the batch window use the results
+    assert channels[2].read(0) == 5.5
+    assert channels[2].status(0) == (status.OK, '')
+    assert crate.roundtrips == 2
@@ -25,12 +25,15 @@
 
 """Tests for the cache."""
 
+import queue
+import socket
 from time import sleep
 
 import pytest
 
 from nicos.core.errors import CacheLockError, CommunicationError, LimitError
 from nicos.devices.cacheclient import CacheClient
+from nicos.services.cache.server import CacheWorker
 from nicos.utils import readonlydict, readonlylist
 
 from test.utils import cache_addr
@@ -134,6 +137,11 @@ class TestCache:
         cc.flush()
         assert cc.get_raw('some/strange/key') == [1, 2]
 
+    def test_loadcache_stats(self, session):
+        stats = session.cache.loadcachestats
+        assert set(stats) == {'hits', 'misses', 'size'}
+        assert stats['size'] <= session.cache.loadcachesize
+
     def test_lock(self, session):
         cc = session.cache
         key = 'lock'
@@ -232,6 +240,32 @@ class TestCache:
         finally:
             cc2.shutdown()
 
+    def test_subscriptions(self, session):
+        cc = session.cache
+        cc.put('subtest', 'a', 1)
+        cc.put('subtest', 'b', 2)
+        cc.flush()
+        cc2 = CacheClient(name='cache2', prefix='nicos', cache=cache_addr)
+        try:
+            for _ in range(50):
+                if cc2.get('subtest', 'b') is not None:
+                    break
+                sleep(0.1)
+            # now only get updates for subtest/a
+            cc2._set_subscriptions(['subtest/a'])
+            sleep(0.2)
+            cc.put('subtest', 'a', 3)
+            cc.put('subtest', 'b', 4)
+            cc.flush()
+            sleep(0.2)
+            assert cc2.get('subtest', 'a') == 3
+            assert cc2.get('subtest', 'b') == 2
+            cc2._set_subscriptions(None)
+            sleep(0.2)
+            assert cc2.get('subtest', 'b') == 4
+        finally:
+            cc2.shutdown()
+
     def test_cache_writer(self, session, log):
         cc = session.cache
         cc2 = CacheClient(name='cache2', prefix='nicos', cache=cache_addr)
@@ -261,3 +295,50 @@ class TestCache:
             pytest.raises(LimitError, wrt1.move, 500)
         finally:
             cc2.shutdown()
+
+
+class UnthreadedWorker(CacheWorker):
+    """Cache worker that does not start threads, to inspect its queue."""
+
+    def start_sender(self, name):
+        self.send_queue = queue.Queue()
+
+    def start_receiver(self, name):
+        pass
+
+
+class TestCacheWorker:
+
+    @pytest.fixture
+    def worker(self, session):
+        socks = socket.socketpair()
+        yield UnthreadedWorker(None, socks[0], 'test', 'info', coalescelimit=2)
+        for sock in socks:
+            sock.close()
+
+    def test_batched_send(self, worker):
+        worker.send('a=1\n')
+        worker.send('b=2\n')
+        worker.send_update('c', '=', '3', 0, None, False)
+        assert worker._collect_data() == b'a=1\nb=2\nc=3\n'
+        assert worker.backlog() == 0
+
+    def test_coalesced_send(self, worker):
+        for i in range(5):
+            worker.send_update('a', '=', str(i), 0, None, False)
+            worker.send_update('b', '=', str(i), 0, None, False)
+        # first messages are queued normally, then only the newest update
+        # per key is kept
+        assert worker._collect_data() == b'a=0\nb=0\na=1\na=4\nb=4\n'
+        assert not worker.coalesced
+        worker.send_update('a', '=', '5', 0, None, False)
+        assert worker._collect_data() == b'a=5\n'
+
+    def test_reply_after_coalesced(self, worker):
+        for i in range(5):
+            worker.send_update('a', '=', str(i), 0, None, False)
+        assert worker.coalesced
+        # a reply must not be overtaken by older coalesced updates
+        worker.send_reply('a=5\n')
+        assert not worker.coalesced
+        assert worker._collect_data() == b'a=0\na=1\na=2\na=4\na=5\n'
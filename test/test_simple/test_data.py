@@ -23,9 +23,15 @@
 
 """NICOS data manager test suite."""
 
+import threading
 from contextlib import contextmanager
 
+import pytest
+
 from nicos.commands.measure import count
+from nicos.core import CommunicationError, ConfigurationError
+
+from test.utils import TestSinkHandler
 
 session_setup = 'data'
 
@@ -139,3 +145,86 @@ def test_force_scandata(session):
         assert session.experiment.lastscan == ds.counter
     finally:
         session.experiment._setROParam('forcescandata', False)
+
+
+def test_metainfo_snapshot(session, log, monkeypatch):
+    dataman = session.experiment.data
+    motor = session.getDevice('motor')
+    with dataset_scope(session, 'point'):
+        # the first collection can put missing values into the cache
+        dataman.updateMetainfo()
+        dataman.updateMetainfo()
+        assert 'metainfo' in dataman._current.timing
+        info = dataman._metainfo['motor'][1]
+        metainfo = dict(dataman._current.metainfo)
+        assert metainfo['motor', 'userlimits'][0] == (-50, 50)
+
+        # not collected again without changes
+        dataman.updateMetainfo()
+        assert dataman._metainfo['motor'][1] is info
+        assert dataman._current.metainfo == metainfo
+
+        # but after a parameter change
+        try:
+            motor.userlimits = (-40, 40)
+            dataman.updateMetainfo()
+            assert dataman._metainfo['motor'][1] is not info
+            assert dataman._current.metainfo['motor', 'userlimits'][0] == \
+                (-40, 40)
+        finally:
+            motor.userlimits = (-50, 50)
+
+        # or on explicit request
+        info = dataman._metainfo['motor'][1]
+        dataman.updateMetainfo(refresh=True)
+        assert dataman._metainfo['motor'][1] is not info
+
+        # info with read errors is not kept
+        def read(self, maxage=None):
+            raise CommunicationError(self, 'read failed')
+
+        monkeypatch.setattr(type(motor), 'read', read)
+        with log.allow_errors():
+            dataman.updateMetainfo(refresh=True)
+        assert 'motor' not in dataman._metainfo
+        assert 'read failed' in dataman._current.metainfo['motor', 'value'][1]
+
+
+def test_async_sink(session, log, monkeypatch):
+    dataman = session.experiment.data
+    sink = session.getDevice('testsink1')
+    # handlers must declare that they can be called asynchronously
+    with pytest.raises(ConfigurationError):
+        sink.doUpdateAsynchronous(True)
+    monkeypatch.setattr(TestSinkHandler, 'async_safe', True)
+    sink.doUpdateAsynchronous(True)
+    sink._setROParam('asynchronous', True)
+    threads = set()
+
+    def end(self):
+        threads.add(threading.current_thread())
+        self._calls.append('end')
+
+    try:
+        monkeypatch.setattr(TestSinkHandler, 'end', end)
+        with dataset_scope(session, 'scan'):
+            for _ in range(3):
+                with dataset_scope(session, 'point'):
+                    pass
+        # all calls have been done when the scan is finished
+        assert sink._handlers[0]._calls == \
+            ['prepare', 'begin'] + 3 * ['addSubset'] + ['end']
+        assert threads and threading.current_thread() not in threads
+
+        # errors in the handlers are reraised at the end of the scan
+        def fail(self):
+            raise ValueError('sink failed')
+        monkeypatch.setattr(TestSinkHandler, 'end', fail)
+        dataman.beginScan()
+        with log.allow_errors():
+            with pytest.raises(ValueError):
+                dataman.finishScan()
+        dataman.flushSinks()
+    finally:
+        sink._setROParam('asynchronous', False)
+        sink.doShutdown()
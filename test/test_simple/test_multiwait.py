@@ -25,10 +25,13 @@
 Test for multiwait
 """
 
+import threading
+import time
+
 import pytest
 
 from nicos.core.errors import ComputationError, MoveError, NicosTimeoutError
-from nicos.core.utils import multiWait
+from nicos.core.utils import completion_notifier, multiWait
 
 session_setup = 'multiwait'
 
@@ -83,3 +86,42 @@ class TestMultiWait:
 
         with log.assert_errors(regex='.*multi_dev1.*', count=1):
             pytest.raises(ComputationError, multiWait, [dev1, dev2, dev3, dev4])
+
+    @pytest.fixture()
+    def realdelay(self, session, monkeypatch):
+        # the test session does not sleep at all
+        def delay(secs, event=None):
+            if event is None:
+                time.sleep(secs)
+            else:
+                event.wait(secs)
+        monkeypatch.setattr(session, 'delay', delay)
+
+    def test_multiwait_notified(self, devices, realdelay, monkeypatch):
+        dev1 = devices[0]
+        done = []
+        monkeypatch.setattr(type(dev1), 'isCompleted', lambda self: bool(done))
+
+        def finish():
+            time.sleep(0.05)
+            done.append(1)
+            completion_notifier.notify(dev1)
+
+        saved = completion_notifier.saved
+        threading.Thread(target=finish).start()
+        started = time.time()
+        assert multiWait([dev1]) == {dev1: 1}
+        # without the notification, this would take the full polling delay
+        assert time.time() - started < 0.25
+        assert completion_notifier.saved > saved
+
+    def test_multiwait_virtual_motor(self, session, realdelay):
+        vmot = session.getDevice('vmot')
+        vmot.maw(0)
+        vmot.start(1)
+        started = time.time()
+        multiWait([vmot])
+        assert vmot.read(0) == 1
+        assert time.time() - started < 0.29
+        # no registered waiters are left behind
+        assert not completion_notifier._waiters
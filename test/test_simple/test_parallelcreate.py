@@ -0,0 +1,83 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""Test parallel creation of devices when loading setups."""
+
+import threading
+import time
+
+import pytest
+
+from nicos import config
+from nicos.core import Attach, Device, NicosError, Param
+
+session_setup = 'empty'
+
+CREATED = []
+
+
+class SlowDevice(Device):
+
+    attached_devices = {
+        'parts': Attach('Devices that must be created before', Device,
+                        multiple=True, optional=True),
+    }
+
+    parameters = {
+        'fail': Param('Fail to create', type=bool, default=False),
+    }
+
+    def doInit(self, mode):
+        time.sleep(0.3)
+        if self.fail:
+            raise NicosError(self, 'cannot connect')
+        CREATED.append((self.name, threading.current_thread().name))
+
+
+@pytest.fixture
+def threads(session, monkeypatch):
+    monkeypatch.setattr(config, 'device_creation_threads', 4)
+    CREATED.clear()
+    yield
+    session.unloadSetup()
+
+
+def test_parallel_create(session, threads, log):
+    started = time.time()
+    with log.allow_errors():
+        session.loadSetup('parallelcreate', autocreate_devices=True)
+    elapsed = time.time() - started
+
+    created = [name for (name, _) in CREATED]
+    assert sorted(created) == ['combined', 'slow1', 'slow2', 'slow3',
+                               'slow4']
+    assert all(thread.startswith('device creation') for (_, thread) in CREATED)
+    # devices are created after their attached devices
+    assert created.index('combined') > created.index('slow1')
+    assert created.index('combined') > created.index('slow2')
+    # one round for slow*/broken, one for combined, one for toplevel
+    assert elapsed < 1.5
+    # failures are reported per device, and not retried
+    assert set(session.device_failures) == {'broken', 'toplevel'}
+    assert 'cannot connect' in session.device_failures['broken']
+    assert 'broken' not in session.devices
@@ -0,0 +1,107 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""NICOS tests for the parallel readout of scan environment devices."""
+
+import time
+
+import pytest
+
+from nicos import config
+from nicos.commands.scan import scan
+from nicos.core import CommunicationError, Param, Readable
+from nicos.core.utils import ReadoutPool, multiRead
+
+session_setup = 'readout'
+
+DELAY = 0.2
+
+
+class SlowReadable(Readable):
+
+    parameters = {
+        'retval': Param('Value to return', type=float),
+        'fail':  Param('Whether reading fails', type=bool),
+    }
+
+    def doRead(self, maxage=0):
+        time.sleep(DELAY)
+        if self.fail:
+            raise CommunicationError(self, 'read failed')
+        return self.retval
+
+
+@pytest.fixture()
+def envdevs(session):
+    session.experiment.setDetectors([session.getDevice('det')])
+    yield [session.getDevice(name) for name in
+           ('slowread1', 'slowread2', 'slowfail', 'slowread3')]
+    session.experiment.detlist = []
+
+
+def run_scan(session, envdevs):
+    scan(session.getDevice('motor'), [0, 1], *envdevs, t=0.)
+    dataset = session.experiment.data.getLastScans()[-1]
+    return dataset.envvaluelists, [point.timing['environment']
+                                   for point in dataset.subsets]
+
+
+def test_parallel_environment(session, log, envdevs, monkeypatch):
+    with log.allow_errors():
+        values, timing = run_scan(session, envdevs)
+    assert values == [[1., 2., None, 3.], [1., 2., None, 3.]]
+    assert min(timing) >= 4 * DELAY
+
+    monkeypatch.setattr(config, 'readout_threads', 4)
+    with log.allow_errors():
+        pvalues, ptiming = run_scan(session, envdevs)
+    # the same data as in the serial case, but faster
+    assert pvalues == values
+    assert max(ptiming) < 2 * DELAY
+
+
+def test_parallel_timeout(session, envdevs, monkeypatch):
+    monkeypatch.setattr(config, 'readout_threads', 4)
+    monkeypatch.setattr(config, 'readout_timeout', DELAY / 4)
+    results = multiRead(envdevs[:2])
+    assert [value for (_, value, _) in results] == [None, None]
+    assert 'timed out' in str(results[0][2])
+    # after the timeout, results are complete again
+    time.sleep(DELAY)
+    monkeypatch.setattr(config, 'readout_timeout', 10)
+    results = multiRead(envdevs[:2])
+    assert [value for (_, value, _) in results] == [1., 2.]
+
+
+def test_pool_running_read(session, envdevs):
+    pool = ReadoutPool(2)
+    dev = envdevs[0]
+    future = pool.read(dev, 0)
+    while not future.running():
+        time.sleep(0.01)
+    # no second read of the device while the first is running
+    assert pool.read(dev, 0) is future
+    assert future.result(10)[1] == 1.
+    newfuture = pool.read(dev, 0)
+    assert newfuture is not future
+    assert newfuture.result(10)[1] == 1.
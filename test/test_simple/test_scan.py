@@ -36,11 +36,13 @@ from nicos.commands.scan import appendscan, contscan, cscan, gridscan, \
 from nicos.core import CommunicationError, ModeError, NicosError, \
     PositionError, UsageError
 from nicos.core.acquire import CountResult
-from nicos.core.scan import ContinuousScan
+from nicos.core.scan import ContinuousScan, Scan
 from nicos.core.sessions.utils import MASTER, SLAVE
 from nicos.core.status import BUSY, OK
 from nicos.core.utils import waitForState
 
+from test.utils import TestDevice
+
 # this can happen during fitting, just don't print it out
 warnings.filterwarnings('ignore', 'Covariance of the parameters could not '
                         'be estimated')
@@ -278,6 +280,67 @@ def test_scan_errorhandling(session, log):
         pytest.raises(RuntimeError, scan, t, [0, 1, 2, 3])
 
 
+def test_scan_pipelined(session, log, monkeypatch):
+    ax = session.getDevice('axis')
+    m2 = session.getDevice('motor2')
+    t = session.getDevice('tdev')
+    session.experiment.setDetectors([session.getDevice('det')])
+    dataman = session.experiment.data
+
+    # record the position of tdev whenever a point is finished
+    positions = []
+    finishPoint = dataman.finishPoint
+
+    def recordingFinishPoint():
+        positions.append(t._value)
+        finishPoint()
+    monkeypatch.setattr(dataman, 'finishPoint', recordingFinishPoint)
+    monkeypatch.setattr(TestDevice, 'pipeline_safe', True)
+
+    try:
+        # the axis is not declared safe
+        assert not Scan([ax], [[0], [1]]).canPipeline()
+        assert Scan([m2, t], [[0, 0], [1, 1]]).canPipeline()
+
+        # nor is a scan that prepares its points specially
+        class PreparingScan(Scan):
+            def preparePoint(self, num, xvalues):
+                Scan.preparePoint(self, num, xvalues)
+        assert not PreparingScan([m2, t], [[0, 0], [1, 1]]).canPipeline()
+
+        with log.assert_msg_matches(r'dead time between points: .* '
+                                    r'\(pipelined\)'):
+            scan(t, [0, 1, 2, 3], t=0.005)
+        dataset = dataman.getLastScans()[-1]
+        assert dataset.devvaluelists == [[0], [1], [2], [3]]
+        # the next move was started before the point was finished
+        assert positions == [1, 2, 3, 3]
+        assert 'deadtime' in dataset.timing
+        assert [('deadtime' in subset.timing) for subset in dataset.subsets] \
+            == [False, True, True, True]
+
+        # errors during the early move are handled for the next point
+        with log.allow_errors():
+            scan(t, [-10, 0, 10, 3], t=0.005)
+            dataset = dataman.getLastScans()[-1]
+            assert dataset.devvaluelists == [[0], [3]]
+
+            t._value = 0
+            t._start_exception = CommunicationError()
+            scan(t, [0, 1, 2, 3], t=0.005)
+            dataset = dataman.getLastScans()[-1]
+            assert dataset.devvaluelists == [[0]]
+
+            t._value = 0
+            t._start_exception = RuntimeError()
+            pytest.raises(RuntimeError, scan, t, [0, 1, 2, 3], t=0.005)
+            dataset = dataman.getLastScans()[-1]
+            assert dataset.devvaluelists == [[0]]
+    finally:
+        t._start_exception = None
+        session.experiment.setDetectors([])
+
+
 def test_cscan(session):
     m = session.getDevice('motor')
     cscan(m, 0, 1, 2)
@@ -0,0 +1,119 @@
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""Test forking dry runs from a simulation zygote."""
+
+import os
+import time
+
+from nicos.core.sessions.simulation import SimulationSupervisor, \
+    SimulationZygote
+from nicos.core.utils import system_user
+
+from test.utils import cache_addr
+
+session_setup = 'empty'
+
+LOG_PARENT = '''\
+import os
+from nicos import session
+session.log.info("parent %d" % os.getppid())
+'''
+
+
+class Request:
+    reqid = None
+
+
+class Emitter:
+    def __init__(self):
+        self.request = Request()
+        self.messages = []
+        self.result = None
+
+    def current_script(self):
+        return self.request
+
+    def emit_event(self, evtype, msg):
+        if evtype == 'simmessage':
+            self.messages.append(msg[3].strip())
+        elif evtype == 'simresult':
+            self.result = msg
+
+
+def run(zygote, code, db):
+    emitter = Emitter()
+    supervisor = SimulationSupervisor(None, 'uuid', code, ['simscan'],
+                                      system_user, emitter, zygote=zygote,
+                                      db=db)
+    supervisor.start()
+    supervisor.join(20)
+    return emitter
+
+
+def test_zygote(session):
+    base = {'session/mastersetupexplicit': ['simscan'], 'motor/value': 1.0}
+    zygote = SimulationZygote(cache_addr, base)
+    try:
+        for _ in range(200):
+            if zygote.ready():
+                break
+            time.sleep(0.1)
+        assert zygote.ready()
+        code = (LOG_PARENT +
+                'session.log.info("motor at %s" % motor.read())\n')
+        # only the changed values are sent to the forked dry run
+        emitter = run(zygote, code, dict(base, **{'motor/value': 2.0}))
+        assert emitter.result is not None
+        assert 'parent %d' % zygote._proc.pid in emitter.messages
+        assert 'motor at 2.0' in emitter.messages
+        # the zygote keeps working for more dry runs, with the old values
+        emitter = run(zygote, code, base)
+        assert 'motor at 1.0' in emitter.messages
+    finally:
+        zygote.shutdown()
+    assert zygote._proc.poll() is not None
+    # without a zygote, a new process is started
+    emitter = run(None, LOG_PARENT, None)
+    assert emitter.result is not None
+    assert 'parent %d' % os.getpid() in emitter.messages
+
+
+def test_zygote_failed(session):
+    base = {'session/mastersetupexplicit': ['nonexisting']}
+    stamps = {'setup.py': (1, 1)}
+    zygote = SimulationZygote(cache_addr, base, stamps=stamps)
+    try:
+        for _ in range(200):
+            if zygote.failed():
+                break
+            time.sleep(0.1)
+        assert zygote.failed()
+        assert not zygote.ready()
+        # the failure is valid as long as the setups are unchanged
+        assert zygote.matches(base, stamps)
+        assert not zygote.matches(base, {'setup.py': (2, 1)})
+        assert not zygote.matches({'session/mastersetupexplicit': ['simscan']},
+                                  stamps)
+    finally:
+        zygote.shutdown()
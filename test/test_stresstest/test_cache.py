@@ -24,22 +24,26 @@
 """NICOS cache tests."""
 
 import os
-from time import sleep, time
+from os import path
+from time import mktime, sleep, time
 
 import numpy
 import pytest
 
 from nicos.devices.cacheclient import CacheError
-from nicos.protocols.cache import FLAG_NO_STORE
+from nicos.protocols.cache import FLAG_NO_STORE, OP_ASK, OP_LOCK, \
+    OP_LOCK_LOCK, OP_TELL, cache_load
+from nicos.utils import tcpSocket
 
 from test.utils import TestCacheClient as CacheClient, alt_cache_addr, \
-    killSubprocess, startCache
+    killSubprocess, replica_cache_addr, runtime_root, startCache
 
 session_setup = 'cachestress'
 
 
 def all_setups():
-    yield from ['cache_db', 'cache_mem', 'cache_mem_hist']
+    yield from ['cache_db', 'cache_mem', 'cache_mem_hist', 'cache_eventloop',
+                'cache_ring']
 
     if os.environ.get('KAFKA_URI', None):
         yield 'cache_kafka'
@@ -170,6 +174,154 @@ def test_history_interval(session, setup):
         assert result, f'interval of {interval}s resulted in {mean}s'
 
 
+@pytest.mark.parametrize('setup', all_setups())
+def test_history_downsampling(session, setup):
+    implemented = ['cache_db', 'cache_mem_hist', 'cache_eventloop',
+                   'cache_ring']
+    if setup not in implemented:
+        pytest.skip('not implemented')
+    cache = startCache(alt_cache_addr, setup)
+    cc = session.cache
+    time0 = int(time()) - 10
+    n = 50
+    for i in range(n):
+        # a single peak, and a slow ramp otherwise
+        cc.put('history_downsampling_test', 'value',
+               100 if i == 23 else i, time0 + i * 0.1)
+    sleep(1)
+    history = cc.history('history_downsampling_test', 'value',
+                         time0 - 1, time0 + 10, 1)
+    killSubprocess(cache)
+    assert [value for (_, value) in history] == [
+        0, 9, 10, 19, 20, 100, 29, 30, 39, 40, 49]
+
+
+def test_history_archive(session):
+    # create history files of an old day, which should be archived
+    storepath = path.join(runtime_root, 'altcache-archive')
+    daydir = path.join(storepath, '2020', '01-15')
+    os.makedirs(daydir, exist_ok=True)
+    time0 = mktime((2020, 1, 15, 12, 0, 0, 0, 0, -1))
+    with open(path.join(daydir, 'nicos-history_archive_test'), 'w',
+              encoding='utf-8') as fp:
+        fp.write('# NICOS cache store file v2\n')
+        for i in range(10):
+            fp.write(f'value\t{time0 + i}\t+\t{i}\n')
+    cache = startCache(alt_cache_addr, 'cache_archive')
+    try:
+        while not session.cache.is_connected():
+            sleep(0.02)
+        for _ in range(100):
+            if not path.exists(daydir):
+                break
+            sleep(0.1)
+        assert not path.exists(daydir)
+        assert path.isfile(path.join(storepath + '-archive', '2020-01',
+                                     'nicos-history_archive_test.zip'))
+        history = session.cache.history('history_archive_test', 'value',
+                                        time0 + 2.5, time0 + 5.5)
+    finally:
+        killSubprocess(cache)
+    assert [value for (_, value) in history] == [2, 3, 4, 5]
+
+
+def raw_request(addr, line, reply=True):
+    sock = tcpSocket(addr, 0, timeout=5)
+    try:
+        sock.sendall(line.encode())
+        data = b''
+        while reply and not data.endswith(b'\n'):
+            data += sock.recv(4096)
+    finally:
+        sock.close()
+    return data.decode()
+
+
+def replica_get(key, default=None, wait=5):
+    # replication is asynchronous, so wait for the value to arrive
+    for _ in range(int(wait / 0.05)):
+        reply = raw_request(replica_cache_addr, f'nicos/{key}{OP_ASK}\n')
+        value = reply.strip().partition(OP_TELL)[2]
+        if value:
+            return cache_load(value)
+        sleep(0.05)
+    return default
+
+
+def test_replica(session):
+    cache = startCache(alt_cache_addr, 'cache_db')
+    # a value from before the start of the replica
+    raw_request(alt_cache_addr, f'{time() - 1000}@nicos/replica_test/old'
+                f'{OP_TELL}5\n', reply=False)
+    replica = startCache(replica_cache_addr, 'cache_replica')
+    try:
+        while not session.cache.is_connected():
+            sleep(0.02)
+        cc = session.cache
+        # values from the primary arrive at the replica
+        cc.put('replica_test', 'value', 1)
+        cc.flush()
+        assert replica_get('replica_test/value') == 1
+        cc.put('replica_test', 'value', 2)
+        cc.flush()
+        for _ in range(100):
+            if replica_get('replica_test/value') == 2:
+                break
+            sleep(0.05)
+        assert replica_get('replica_test/value') == 2
+        # updates sent to the replica are forwarded to the primary
+        raw_request(replica_cache_addr,
+                    f'nicos/replica_test/other{OP_TELL}3\n', reply=False)
+        for _ in range(100):
+            if cc.get_explicit('replica_test', 'other')[2] == 3:
+                break
+            sleep(0.05)
+        assert cc.get_explicit('replica_test', 'other')[2] == 3
+        assert replica_get('replica_test/other') == 3
+        # locks are decided by the primary
+        raw_request(alt_cache_addr,
+                    f'nicos/replica_test/lock{OP_LOCK}{OP_LOCK_LOCK}first\n')
+        reply = raw_request(replica_cache_addr, f'nicos/replica_test/lock'
+                            f'{OP_LOCK}{OP_LOCK_LOCK}second\n')
+        assert reply.strip() == f'nicos/replica_test/lock{OP_LOCK}first'
+        # history queries of a client can be served by the replica
+        cc._setROParam('replica', replica_cache_addr)
+        try:
+            history = cc.history('replica_test', 'value', time() - 60,
+                                 time() + 60)
+            # older history is requested from the primary
+            old_history = cc.history('replica_test', 'old', time() - 2000,
+                                     time())
+        finally:
+            cc._setROParam('replica', None)
+        assert [value for (_, value) in history] == [1, 2]
+        assert [value for (_, value) in old_history] == [5]
+    finally:
+        killSubprocess(replica)
+        killSubprocess(cache)
+
+
+def test_replica_down(session):
+    cache = startCache(alt_cache_addr, 'cache_db')
+    cc = session.cache
+    try:
+        while not cc.is_connected():
+            sleep(0.02)
+        cc.put('replica_test', 'down', 1)
+        cc.flush()
+        cc._setROParam('replica', replica_cache_addr)
+        # the replica is not running: the primary is asked instead
+        history = cc.history('replica_test', 'down', time() - 60, time() + 60)
+        assert [value for (_, value) in history] == [1]
+        # and the replica is not tried again for a while
+        assert cc._rep_retry > time()
+        assert cc._replica_request('', b'\n') is None
+    finally:
+        cc._setROParam('replica', None)
+        cc._rep_retry = 0
+        killSubprocess(cache)
+
+
 @pytest.mark.parametrize('setup', all_setups())
 def test_init(session, setup):
     unsupported = ['cache_mem', 'cache_mem_hist']
@@ -58,6 +58,8 @@ runtime_root = os.environ.get('NICOS_TEST_ROOT',
 # Addresses for services, ports can be allocated by Jenkins.
 cache_addr = 'localhost:%s' % os.environ.get('NICOS_CACHE_PORT', '14877')
 alt_cache_addr = 'localhost:%s' % os.environ.get('NICOS_CACHE_ALT_PORT', '14878')
+replica_cache_addr = 'localhost:%s' % os.environ.get('NICOS_CACHE_REPLICA_PORT',
+                                                    '14880')
 daemon_addr = 'localhost:%s' % os.environ.get('NICOS_DAEMON_PORT', '14874')
 secop_port = int(os.environ.get('NICOS_SECOP_PORT', '14879'))
 
@@ -70,6 +72,7 @@ config.group = None
 config.nicos_root = runtime_root
 config.pid_path = path.join(runtime_root, 'pid')
 config.logging_path = path.join(runtime_root, 'log')
+config.setup_cache_path = path.join(runtime_root, 'setupcache')
 
 
 class ErrorLogged(Exception):
@@ -283,7 +286,7 @@ class TestSession(Session):
             return
         exec(code, self.namespace)
 
-    def delay(self, _secs):
+    def delay(self, _secs, event=None):
         # TODO: this sleep shouldn't be necessary
         sleep(0.0001)
 
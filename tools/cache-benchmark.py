@@ -24,10 +24,17 @@
 
 """
 A benchmarking tool for the NICOS cache.
+
+To compare the threaded and the event loop mode of the cache server, run the
+same benchmark against a server started with ``eventloop = False`` and one with
+``eventloop = True``, e.g.::
+
+    cache-benchmark.py -s 300 -n 1000 fanout
 """
 
 import argparse
 import random
+import select
 import socket
 import threading
 import time
@@ -102,6 +109,25 @@ class Benchmarker:
         assert msg_set == self.all_set
         return t1
 
+    def fanout(self):
+        mains, subs = self.connect(1)
+
+        t1 = time.time()
+        mains[0].sendall(b''.join(self.all_msg))
+        # read all subscriber sockets at once, to not let the server block on
+        # clients that are not read from
+        pending = {s: b'' for s in subs}
+        length = len(b''.join(self.all_msg))
+        while pending and time.time() - t1 < 60:
+            readable, _, _ = select.select(list(pending), [], [], 1)
+            for s in readable:
+                pending[s] += s.recv(65536)
+                if len(pending[s]) >= length:
+                    assert set(pending.pop(s).splitlines()) == self.all_set
+        assert not pending
+        self.nupdates = self.nkeys * len(subs)
+        return t1
+
     def ask_history(self):
         mains, _subs = self.connect(self.nclients, 0)
 
@@ -124,7 +150,7 @@ class Benchmarker:
 
     def create_socket(self, tp=socket.SOCK_STREAM):
         s = socket.socket(socket.AF_INET, tp)
-        s.connect((self.cache_host, 14869))
+        s.connect((self.cache_host, self.cache_port))
         return s
 
     def connect(self, nmain, nsub=None):
@@ -153,6 +179,8 @@ class Benchmarker:
         )
         parser.add_argument('-c', action='store', default='localhost',
                             metavar='HOST', help='cache host')
+        parser.add_argument('-p', action='store', type=int, default=14869,
+                            metavar='PORT', help='cache port')
         parser.add_argument('-n', action='store', type=int, default=10000,
                             metavar='KEYS', help='number of keys')
         parser.add_argument('-s', action='store', type=int, default=10,
@@ -162,6 +190,7 @@ class Benchmarker:
         opts = parser.parse_args()
 
         self.cache_host = opts.c
+        self.cache_port = opts.p
         self.nclients = opts.s
         # make an even number of keys per client
         self.nkeys = opts.n // opts.s * opts.s
@@ -177,11 +206,14 @@ class Benchmarker:
         ]
         self.all_set = set(s.strip() for s in self.all_msg)
 
+        self.nupdates = None
         fn = getattr(self, opts.benchmark)
         t1 = fn()
         t2 = time.time()
         print(f'{opts.benchmark}: {self.nkeys} keys, '
               f'{self.nclients} subscribers: {t2 - t1:.4} sec')
+        if self.nupdates:
+            print(f'{self.nupdates / (t2 - t1):.0f} messages/sec')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""
+A microbenchmark for the PyON value (de)serialization of the NICOS cache.
+
+Compares cache_load with the plain AST based parser, and cache_dump with the
+recursive serializer, for typical parameter values.
+"""
+
+import argparse
+import random
+import sys
+import time
+from os import path
+
+try:
+    from nicos.protocols import cache
+except ImportError:
+    sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+    from nicos.protocols import cache
+
+
+def dump_recursive(obj):
+    # cache_dump without the fast path for flat sequences
+    res = []
+    if isinstance(obj, cache.repr_types):
+        res.append(repr(obj))
+    elif isinstance(obj, (list, tuple)):
+        res.append('[' if isinstance(obj, list) else '(')
+        for item in obj:
+            res.append(dump_recursive(item))
+            res.append(',')
+        res.append(']' if isinstance(obj, list) else ')')
+    else:
+        return cache.cache_dump(obj)
+    return ''.join(res)
+
+
+def bench(func, values, repeat):
+    t1 = time.perf_counter()
+    for _ in range(repeat):
+        for value in values:
+            func(value)
+    return (time.perf_counter() - t1) / (repeat * len(values)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the cache value serialization.')
+    parser.add_argument('-n', type=int, default=200, metavar='DISTINCT',
+                        help='number of distinct values per kind')
+    parser.add_argument('-r', type=int, default=20, metavar='REPEAT',
+                        help='how often each value is received')
+    parser.add_argument('-a', type=int, default=1000, metavar='LENGTH',
+                        help='length of array values')
+    opts = parser.parse_args()
+
+    rnd = random.Random(42)
+    kinds = {
+        'int': [rnd.randrange(-1000, 1000) for _ in range(opts.n)],
+        'float': [rnd.uniform(-100, 100) for _ in range(opts.n)],
+        'status': [(rnd.choice([200, 210, 240]), 'msg %d' % i)
+                   for i in range(opts.n)],
+        'float array': [[rnd.random() for _ in range(opts.a)]
+                        for _ in range(opts.n // 10 or 1)],
+        'dict': [{'a': rnd.random(), 'b': [1, 2, 3], 'c': 'str'}
+                 for _ in range(opts.n)],
+    }
+    print(f'{opts.n} distinct values per kind, each received {opts.r} times'
+          f' (times in usec per value)')
+    print(f'{"kind":12} {"dump old":>10} {"dump new":>10} {"load old":>10} '
+          f'{"load miss":>10} {"load new":>10}')
+    for kind, values in kinds.items():
+        t_dump_old = bench(dump_recursive, values, 1)
+        t_dump_new = bench(cache.cache_dump, values, 1)
+        strings = [cache.cache_dump(v) for v in values]
+        t_load_old = bench(cache._cache_load_ast, strings, opts.r)
+        # every value is seen for the first time
+        t_load_miss = bench(cache.CacheLoader(), strings, 1)
+        t_load_new = bench(cache.CacheLoader(), strings, opts.r)
+        print(f'{kind:12} {t_dump_old:10.2f} {t_dump_new:10.2f} '
+              f'{t_load_old:10.2f} {t_load_miss:10.2f} {t_load_new:10.2f}')
+
+
+if __name__ == '__main__':
+    main()
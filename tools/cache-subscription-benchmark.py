@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""
+A microbenchmark for the update fan-out of the NICOS cache server.
+
+Compares the subscription index against the linear scan over all clients and
+their subscriptions.
+"""
+
+import argparse
+import random
+import sys
+import time
+from os import path
+
+try:
+    from nicos.services.cache.subscriptions import SubscriptionIndex
+except ImportError:
+    sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+    from nicos.services.cache.subscriptions import SubscriptionIndex
+
+
+class Client:
+    def __init__(self, subscriptions):
+        self.updates_on = set(subscriptions)
+        self.ts_updates_on = set()
+        self.sent = 0
+
+    def update(self, key):
+        # the linear scan as done by CacheWorker.update()
+        for mykey in self.ts_updates_on:
+            if mykey in key:
+                self.sent += 1
+                return
+        for mykey in self.updates_on:
+            if mykey in key:
+                self.sent += 1
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the cache update fan-out.')
+    parser.add_argument('-c', type=int, default=500, metavar='CLIENTS',
+                        help='number of clients')
+    parser.add_argument('-s', type=int, default=20, metavar='SUBSCRIPTIONS',
+                        help='number of subscriptions per client')
+    parser.add_argument('-d', type=int, default=400, metavar='DEVICES',
+                        help='number of devices to generate keys for')
+    parser.add_argument('-n', type=int, default=20000, metavar='UPDATES',
+                        help='number of key updates')
+    opts = parser.parse_args()
+
+    rnd = random.Random(42)
+    devices = ['dev%03d' % i for i in range(opts.d)]
+    params = ['value', 'status', 'target', 'speed', 'offset']
+    keys = [f'nicos/{dev}/{param}' for dev in devices for param in params]
+    clients = [Client(f'nicos/{dev}/' for dev in rnd.sample(devices, opts.s))
+               for _ in range(opts.c)]
+    updates = [rnd.choice(keys) for _ in range(opts.n)]
+
+    t1 = time.perf_counter()
+    for key in updates:
+        for client in clients:
+            client.update(key)
+    t_scan = time.perf_counter() - t1
+    sent_scan = sum(c.sent for c in clients)
+
+    index = SubscriptionIndex()
+    for client in clients:
+        client.sent = 0
+        for sub in client.updates_on:
+            index.add(client, sub, False)
+    index.match('')  # build the automaton
+    t1 = time.perf_counter()
+    for key in updates:
+        for client in index.match(key):
+            client.sent += 1
+    t_index = time.perf_counter() - t1
+    sent_index = sum(c.sent for c in clients)
+    assert sent_scan == sent_index
+
+    print(f'{opts.c} clients with {opts.s} subscriptions, {opts.n} updates, '
+          f'{sent_index} messages')
+    print(f'linear scan: {t_scan:.3f} sec, '
+          f'{t_scan / opts.n * 1e6:.1f} usec/update')
+    print(f'index:       {t_index:.3f} sec, '
+          f'{t_index / opts.n * 1e6:.1f} usec/update')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+
+"""
+Compares reading setup info with a cold and a warm setup cache.
+
+By default, reads the setups of all instruments in the tree, i.e. all
+"setups" directories below the facility packages.
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+from os import path
+
+try:
+    from nicos.core.sessions.setups import readSetups, setupCacheFile
+except ImportError:
+    sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+    from nicos.core.sessions.setups import readSetups, setupCacheFile
+
+
+def timed(paths, cachefile, log):
+    t1 = time.perf_counter()
+    info = readSetups(paths, log, cachefile)
+    return time.perf_counter() - t1, len(info)
+
+
+def main():
+    root = path.dirname(path.dirname(path.realpath(__file__)))
+    parser = argparse.ArgumentParser(
+        description='Benchmark reading setups with the setup cache.')
+    parser.add_argument('-n', type=int, default=3, metavar='REPEAT',
+                        help='number of warm reads')
+    parser.add_argument('paths', nargs='*', metavar='PATH',
+                        help='setup directories (default: all in the tree)')
+    opts = parser.parse_args()
+
+    paths = opts.paths or sorted(
+        glob.glob(path.join(root, 'nicos_*', '*', 'setups')))
+    # setups may log lots of errors without their instrument's environment
+    log = logging.getLogger('setups')
+    log.addHandler(logging.NullHandler())
+    log.propagate = False
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cachefile = setupCacheFile(tmpdir, paths)
+        # once to get the files into the OS cache
+        timed(paths, None, log)
+        t_none, nsetups = timed(paths, None, log)
+        t_cold, _ = timed(paths, cachefile, log)
+        size = os.stat(cachefile).st_size
+        t_warm = min(timed(paths, cachefile, log)[0] for _ in range(opts.n))
+
+    print(f'{nsetups} setups in {len(paths)} directories, '
+          f'cache file {size / 1e6:.1f} MB')
+    print(f'no cache:   {t_none:.3f} sec')
+    print(f'cold cache: {t_cold:.3f} sec')
+    print(f'warm cache: {t_warm:.3f} sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# *****************************************************************************
+# NICOS, the Networked Instrument Control System of the MLZ
+# Copyright (c) 2009-present by the NICOS contributors (see AUTHORS)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+# Module authors:
+#   Georg Brandl <g.brandl@fz-juelich.de>
+#
+# *****************************************************************************
+
+"""
+A microbenchmark for the evaluation of watchdog conditions.
+
+Drives several hundred conditions with a synthetic stream of cache updates,
+the way the watchdog does, and compares the compiled conditions against
+evaluating the source of each expression in the namespace of all keys.
+"""
+
+import argparse
+import random
+import sys
+import time
+from os import path
+
+try:
+    from nicos.services.watchdog.conditions import Expression
+except ImportError:
+    sys.path.insert(0, path.dirname(path.dirname(path.realpath(__file__))))
+    from nicos.services.watchdog.conditions import Expression
+
+from nicos.core import status
+from nicos.utils import LCDict
+
+
+class Log:
+    def warning(self, msg, *args, **kwds):
+        pass
+
+
+class SourceExpression(Expression):
+    """Expression evaluated like the watchdog did before compiling them."""
+
+    def update(self, time, keydict):
+        try:
+            value = eval(self.expr, keydict)
+        except NameError:
+            if self.setup_enabled and self.enabled and not self.expires_at:
+                self.expires_at = time + 6
+        except Exception:
+            self.log.warning('error evaluating %r warning '
+                             'condition', self.expr, exc=1)
+        else:
+            self.expires_at = 0
+            self.triggered = bool(value) and self.enabled and self.setup_enabled
+
+
+def make_conditions(rnd, ndevices, nconds):
+    templates = [
+        '{0}_value > {1}',
+        '{0}_value < {1} or {2}_value > {1}',
+        '{0}_status[0] == ERROR',
+        '{0}_status[0] != OK and {2}_value > {1}',
+        'abs({0}_value - {2}_value) > {1}',
+    ]
+    conds = []
+    for _ in range(nconds):
+        devs = rnd.sample(range(ndevices), 2)
+        conds.append(rnd.choice(templates).format(
+            'dev%03d' % devs[0], rnd.randint(50, 100), 'dev%03d' % devs[1]))
+    return conds
+
+
+def run(cls, conds, updates, keydict):
+    keydict = LCDict(keydict)
+    keymap = {}
+    for cond in conds:
+        expr = cls(Log(), cond, '')
+        for key in expr.interesting_keys():
+            keymap.setdefault(key, []).append(expr)
+    triggered = 0
+    t1 = time.perf_counter()
+    for (i, (key, value)) in enumerate(updates):
+        # like Watchdog._handle_msg and _process_key
+        if key not in keymap:
+            continue
+        keydict[key] = value
+        for expr in keymap[key]:
+            expr.update(i, keydict)
+            triggered += expr.triggered
+    return time.perf_counter() - t1, triggered
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the evaluation of watchdog conditions.')
+    parser.add_argument('-c', type=int, default=500, metavar='CONDITIONS',
+                        help='number of conditions')
+    parser.add_argument('-d', type=int, default=300, metavar='DEVICES',
+                        help='number of devices')
+    parser.add_argument('-k', type=int, default=2000, metavar='KEYS',
+                        help='number of other keys seen by the watchdog')
+    parser.add_argument('-n', type=int, default=100000, metavar='UPDATES',
+                        help='number of key updates')
+    parser.add_argument('-r', type=float, default=0.5, metavar='REPEAT',
+                        help='fraction of updates that repeat the last value')
+    opts = parser.parse_args()
+
+    rnd = random.Random(42)
+    conds = make_conditions(rnd, opts.d, opts.c)
+    keydict = {name.lower(): value for (value, name)
+               in status.statuses.items()}
+    keydict.update(('other%05d_value' % i, i) for i in range(opts.k))
+    values = {}
+    updates = []
+    for _ in range(opts.n):
+        dev = 'dev%03d' % rnd.randrange(opts.d)
+        if rnd.random() < 0.2:
+            key, value = dev + '_status', (rnd.choice([200, 200, 220, 240]),
+                                           '')
+        else:
+            key, value = dev + '_value', rnd.uniform(0, 120)
+        if key in values and rnd.random() < opts.r:
+            value = values[key]
+        values[key] = value
+        updates.append((key, value))
+    for key in values:
+        keydict.setdefault(key, 0 if key.endswith('value') else (200, ''))
+
+    t_source, trig_source = run(SourceExpression, conds, updates, keydict)
+    t_compiled, trig_compiled = run(Expression, conds, updates, keydict)
+    assert trig_source == trig_compiled
+
+    print(f'{opts.c} conditions, {opts.n} updates, {len(keydict)} keys')
+    print(f'source:   {t_source:.3f} sec, '
+          f'{t_source / opts.n * 1e6:.1f} usec/update')
+    print(f'compiled: {t_compiled:.3f} sec, '
+          f'{t_compiled / opts.n * 1e6:.1f} usec/update')
+
+
+if __name__ == '__main__':
+    main()